@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Dataset, MLModel, TrainingResult
+from .models import Dataset, FitRecord, FleetWorker, MLModel, TrainingResult, TrainingTask
 
 @admin.register(Dataset)
 class DatasetAdmin(admin.ModelAdmin):
@@ -16,4 +16,19 @@ class MLModelAdmin(admin.ModelAdmin):
 class TrainingResultAdmin(admin.ModelAdmin):
     list_display = ('model', 'dataset', 'created_at')
     list_filter = ('model__model_type',)
-    search_fields = ('model__name', 'dataset__name') 
\ No newline at end of file
+    search_fields = ('model__name', 'dataset__name') 
+
+@admin.register(TrainingTask)
+class TrainingTaskAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'model', 'target_column', 'status', 'worker_id', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('job_id', 'worker_id')
+
+@admin.register(FleetWorker)
+class FleetWorkerAdmin(admin.ModelAdmin):
+    list_display = ('worker_id', 'last_seen')
+
+@admin.register(FitRecord)
+class FitRecordAdmin(admin.ModelAdmin):
+    list_display = ('model_type', 'n_rows', 'n_features', 'fit_seconds', 'created_at')
+    list_filter = ('model_type',)
@@ -0,0 +1,281 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from django.conf import settings
+
+MB = 1024 * 1024
+# Rough in-memory size of one pandas object (string) cell
+OBJECT_CELL_BYTES = 64
+# Simple floating-point operations per second assumed for CPU estimates
+OPS_PER_SECOND = 1e9
+# How often a queued job checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.5
+
+class AdmissionRejected(Exception):
+    """A training job cannot be started now; carries the backpressure details"""
+
+    def __init__(self, message, status_code, retry_after=None, **details):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.details = details
+
+def encoded_width(profile, target_column, cardinality_threshold):
+    """Number of columns the preprocessor will produce for one target"""
+    from .encoding import DATETIME_PARTS, CYCLIC_PARTS
+
+    width = 0
+    for col, info in profile['columns'].items():
+        if col == target_column:
+            continue
+        if info['kind'] == 'numeric':
+            width += 1
+        elif info.get('is_datetime'):
+            width += len(DATETIME_PARTS) + 2 * len(CYCLIC_PARTS)
+        elif info['n_unique'] > cardinality_threshold:
+            width += 1
+        else:
+            # One-hot with drop='first'
+            width += max(info['n_unique'] - 1, 1)
+    return width
+
+def _linear_cost(n, p, params):
+    return n * p * 8 * 2 + p * p * 8, n * p * p
+
+def _forest_cost(n, p, params):
+    trees = params.get('n_estimators', 100)
+    leaf = params.get('min_samples_leaf', 1)
+    nodes = 2 * n / leaf
+    return trees * nodes * 80 + n * p * 4, trees * n * math.log2(max(n, 2)) * p * 2
+
+def _knn_cost(n, p, params):
+    n_test = n / 4
+    # scikit-learn computes distances in chunks of at most ~1 GB
+    return n * p * 8 + min(n_test * n * 8, 1024 * MB), n_test * n * p * 10
+
+def _svr_cost(n, p, params):
+    return n * p * 8 + min(n * n * 8, 200 * MB), n * n * p * 10
+
+def _xgboost_cost(n, p, params):
+    rounds = params.get('n_estimators', 100)
+    depth = params.get('max_depth', 6)
+    return n * p * 10 + rounds * 2 ** depth * 64, rounds * n * p * depth
+
+def _hist_gradient_boosting_cost(n, p, params):
+    rounds = params.get('max_iter', 100)
+    leaves = params.get('max_leaf_nodes', 31)
+    bins = params.get('max_bins', 255)
+    # One byte per binned value, plus gradient/hessian histograms per leaf
+    return n * p + n * 8 * 3 + leaves * p * bins * 24, rounds * n * p * 2
+
+# (peak bytes, floating-point operations) of fitting a model type on n rows
+# of p encoded features; anything unlisted uses a generic allowance
+COST_MODELS = {
+    'linear_regression': _linear_cost,
+    'random_forest': _forest_cost,
+    'knn': _knn_cost,
+    'svr': _svr_cost,
+    'xgboost': _xgboost_cost,
+    'hist_gradient_boosting': _hist_gradient_boosting_cost,
+}
+
+def _default_cost(n, p, params):
+    return n * p * 8 * 4, n * p * 1000
+
+def estimate_job(profile, model_configs, target_columns,
+                 cardinality_threshold=None, quick_compare=False):
+    """
+    Estimate peak memory and CPU time of training model_configs on each target.
+
+    Models are fitted one after another, so peak memory is the loaded data
+    plus the encoded matrices plus the largest single model. A quick
+    comparison also keeps every config's prepared training rows until the
+    config is eliminated.
+    """
+    if cardinality_threshold is None:
+        cardinality_threshold = settings.ML_HIGH_CARDINALITY_THRESHOLD
+
+    rows = profile['row_count']
+    columns = profile['columns'].values()
+    raw_bytes = rows * sum(8 if info['kind'] == 'numeric' else OBJECT_CELL_BYTES
+                           for info in columns)
+    width = max((encoded_width(profile, target, cardinality_threshold)
+                 for target in target_columns), default=0)
+    n_train = int(rows * 0.8)
+    # The frame is copied by cleaning and the feature split; the encoded
+    # matrix exists as per-transformer blocks plus their hstack
+    data_bytes = raw_bytes * 3 + rows * width * 8 * 3
+    if quick_compare:
+        # The prepared frame and its training split, per config of the first rung
+        data_bytes += raw_bytes * 2 * len(model_configs)
+
+    models = []
+    for config in model_configs:
+        cost = COST_MODELS.get(config.get('model_type'), _default_cost)
+        model_bytes, ops = cost(n_train, width, config.get('hyperparameters') or {})
+        models.append({
+            'model_type': config.get('model_type'),
+            'memory_mb': round(model_bytes / MB, 1),
+            'cpu_seconds': round(ops * len(target_columns) / OPS_PER_SECOND, 2)
+        })
+
+    # Wall-clock seconds the runtime estimator learned from recorded fits
+    from .runtime import estimate_cells
+
+    for model in models:
+        model['predicted_seconds'] = 0.0
+    for cell in estimate_cells(profile, model_configs, target_columns, cardinality_threshold):
+        models[cell['index']]['predicted_seconds'] += cell['predicted_seconds']
+    for model in models:
+        model['predicted_seconds'] = round(model['predicted_seconds'], 2)
+
+    peak = data_bytes + max((m['memory_mb'] * MB for m in models), default=0)
+    return {
+        'rows': rows,
+        'encoded_features': width,
+        'memory_mb': round(peak / MB, 3),
+        'cpu_seconds': round(sum(m['cpu_seconds'] for m in models), 2),
+        'predicted_seconds': round(sum(m['predicted_seconds'] for m in models), 2),
+        'models': models
+    }
+
+class Ticket:
+    def __init__(self, job_id, memory_mb, cpu_seconds):
+        self.job_id = job_id
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self.started_at = None
+
+    @property
+    def expected_end(self):
+        return self.started_at + self.cpu_seconds
+
+class AdmissionController:
+    """
+    Admit training jobs against the node's memory budget and job slots.
+
+    A job that fits starts immediately. One that would have to wait is
+    queued (first come, first served) if its estimated start is within
+    the maximum queue wait, and rejected with that estimate otherwise.
+    Jobs larger than the whole budget are rejected outright.
+    """
+
+    def __init__(self, memory_budget_mb=None, max_jobs=None, max_wait=None):
+        self._memory_budget_mb = memory_budget_mb
+        self._max_jobs = max_jobs
+        self._max_wait = max_wait
+        self.running = []
+        self.queue = []
+        self.condition = threading.Condition()
+
+    @property
+    def memory_budget_mb(self):
+        return self._memory_budget_mb or settings.TRAINING_MEMORY_BUDGET_MB
+
+    @property
+    def max_jobs(self):
+        return self._max_jobs or settings.TRAINING_MAX_CONCURRENT_JOBS
+
+    @property
+    def max_wait(self):
+        return self._max_wait if self._max_wait is not None else settings.TRAINING_MAX_QUEUE_SECONDS
+
+    def _fits(self, ticket):
+        used = sum(t.memory_mb for t in self.running)
+        return len(self.running) < self.max_jobs and used + ticket.memory_mb <= self.memory_budget_mb
+
+    def _estimated_start(self, ticket):
+        """Seconds until ticket could start, assuming jobs end when their CPU estimate says"""
+        now = time.monotonic()
+        free = self.memory_budget_mb - sum(t.memory_mb for t in self.running)
+        slots = self.max_jobs - len(self.running)
+        order = itertools.count()
+        ending = [(max(t.expected_end, now), next(order), t.memory_mb) for t in self.running]
+        heapq.heapify(ending)
+        clock = now
+        for job in self.queue + ([ticket] if ticket not in self.queue else []):
+            while (job.memory_mb > free or slots <= 0) and ending:
+                end, _, memory = heapq.heappop(ending)
+                clock = max(clock, end)
+                free += memory
+                slots += 1
+            free -= job.memory_mb
+            slots -= 1
+            heapq.heappush(ending, (clock + job.cpu_seconds, next(order), job.memory_mb))
+            if job is ticket:
+                return clock - now
+        return 0.0
+
+    def snapshot(self):
+        with self.condition:
+            return {
+                'memory_budget_mb': self.memory_budget_mb,
+                'memory_reserved_mb': round(sum(t.memory_mb for t in self.running), 1),
+                'running_jobs': len(self.running),
+                'queued_jobs': len(self.queue),
+                'max_jobs': self.max_jobs,
+            }
+
+    def admit(self, job_id, estimate, on_queued=None, cancelled=None):
+        """
+        Block until the job may start and return its ticket, or raise AdmissionRejected.
+
+        A queued job leaves the queue (with a 409) once `cancelled()` is true.
+        """
+        # Queue waits are projected from learned runtimes when the estimate has them
+        ticket = Ticket(job_id, estimate['memory_mb'],
+                        estimate.get('predicted_seconds', estimate['cpu_seconds']))
+        with self.condition:
+            if ticket.memory_mb > self.memory_budget_mb:
+                raise AdmissionRejected(
+                    f"Job needs an estimated {ticket.memory_mb:.0f} MB but the node budget is "
+                    f"{self.memory_budget_mb:.0f} MB; use fewer models or a smaller dataset",
+                    status_code=413, estimate=estimate
+                )
+
+            if not self.queue and self._fits(ticket):
+                ticket.started_at = time.monotonic()
+                self.running.append(ticket)
+                return ticket
+
+            wait = self._estimated_start(ticket)
+            if wait > self.max_wait:
+                raise AdmissionRejected(
+                    f"Training capacity is busy; estimated start in {wait:.0f}s",
+                    status_code=503, retry_after=math.ceil(wait),
+                    estimated_start_seconds=round(wait, 1), queue_position=len(self.queue) + 1,
+                    estimate=estimate
+                )
+
+            self.queue.append(ticket)
+            if on_queued is not None:
+                on_queued(position=len(self.queue), estimated_start_seconds=round(wait, 1))
+            deadline = time.monotonic() + max(self.max_wait, wait) * 2
+            try:
+                while not (self.queue[0] is ticket and self._fits(ticket)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise AdmissionRejected(
+                            "Timed out waiting for training capacity",
+                            status_code=503, retry_after=math.ceil(self.max_wait) or 1,
+                            estimate=estimate
+                        )
+                    if cancelled is not None and cancelled():
+                        raise AdmissionRejected("Job was cancelled while queued", status_code=409)
+                    self.condition.wait(timeout=min(remaining, CANCEL_POLL_SECONDS))
+            finally:
+                self.queue.remove(ticket)
+                self.condition.notify_all()
+            ticket.started_at = time.monotonic()
+            self.running.append(ticket)
+            return ticket
+
+    def release(self, ticket):
+        with self.condition:
+            if ticket in self.running:
+                self.running.remove(ticket)
+            self.condition.notify_all()
+
+admission_controller = AdmissionController()
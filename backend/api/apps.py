@@ -1,5 +1,19 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}')
+        cursor.execute(f'PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}')
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'api' 
\ No newline at end of file
+    name = 'api'
+
+    def ready(self):
+        connection_created.connect(configure_sqlite)
+        from .fleet import fleet_enabled
+        fleet_enabled()
@@ -0,0 +1,131 @@
+import io
+import pickle
+import threading
+import uuid
+import numpy as np
+from collections import OrderedDict
+from django.conf import settings
+from django.core.files.base import ContentFile
+from .metrics import ARTIFACT_LOAD, cache_lookup
+
+_predictors = OrderedDict()
+_predictors_lock = threading.Lock()
+
+def _artifact_stem(result):
+    # Results that are not saved yet are bulk inserted later and have no id
+    return f'result_{result.id}' if result.id else f'result_{uuid.uuid4().hex}'
+
+def predictions_npz(y_true, y_pred):
+    """
+    Holdout predictions as the bytes of a compressed .npz file.
+
+    y_true is a Series indexed by row position in the dataset; the index,
+    targets and predictions are kept as columnar arrays so metrics can be
+    recomputed later without retraining.
+    """
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        index=np.asarray(y_true.index, dtype=np.int64),
+        y_true=np.asarray(y_true, dtype=np.float64),
+        y_pred=np.asarray(y_pred, dtype=np.float64)
+    )
+    return buffer.getvalue()
+
+def attach_predictions(result, y_true, y_pred):
+    """Store holdout predictions in result.predictions_file without saving the result"""
+    result.predictions_file.save(f'{_artifact_stem(result)}_predictions.npz',
+                                 ContentFile(predictions_npz(y_true, y_pred)), save=False)
+
+def attach_files(result, model_file=None, compiled_file=None, predictions_file=None):
+    """Store artifacts produced elsewhere (e.g. by a fleet worker) without saving the result"""
+    stem = _artifact_stem(result)
+    if model_file is not None:
+        result.model_file.save(f'{stem}.pkl', model_file, save=False)
+    if compiled_file is not None:
+        result.compiled_file.save(f'{stem}_compiled.pkl', compiled_file, save=False)
+    if predictions_file is not None:
+        result.predictions_file.save(f'{stem}_predictions.npz', predictions_file, save=False)
+
+def load_predictions(result):
+    """The stored holdout arrays (index, y_true, y_pred) of a result, or None"""
+    if not result.predictions_file:
+        return None
+    with ARTIFACT_LOAD.time(kind='predictions'), result.predictions_file.open('rb') as f:
+        with np.load(f) as arrays:
+            return {name: arrays[name] for name in ('index', 'y_true', 'y_pred')}
+
+def attach_pipeline(result, pipeline, X_sample=None):
+    """
+    Pickle a fitted pipeline into result.model_file without saving the result.
+
+    When X_sample is given the pipeline is also compiled into a NumPy-only
+    predictor, which is kept only if it reproduces the pipeline's
+    predictions on those rows.
+    """
+    stem = _artifact_stem(result)
+    result.model_file.save(
+        f'{stem}.pkl',
+        ContentFile(pickle.dumps(pipeline, protocol=pickle.HIGHEST_PROTOCOL)),
+        save=False
+    )
+    if X_sample is not None:
+        from .compiled import compile_and_verify
+
+        compiled = compile_and_verify(pipeline, X_sample)
+        if compiled is not None:
+            result.compiled_file.save(
+                f'{stem}_compiled.pkl',
+                ContentFile(pickle.dumps(compiled, protocol=pickle.HIGHEST_PROTOCOL)),
+                save=False
+            )
+
+def save_pipeline(result, pipeline, X_sample=None, predictions=None):
+    """Attach a fitted pipeline, and optionally its (y_true, y_pred), to result and save it"""
+    attach_pipeline(result, pipeline, X_sample)
+    if predictions is not None:
+        attach_predictions(result, *predictions)
+    result.save()
+
+def load_pipeline(result):
+    """Load the fitted pipeline stored for a training result, or None"""
+    if not result.model_file:
+        return None
+    with ARTIFACT_LOAD.time(kind='pipeline'), result.model_file.open('rb') as f:
+        return pickle.load(f)
+
+def load_compiled(result):
+    if not result.compiled_file:
+        return None
+    with ARTIFACT_LOAD.time(kind='compiled'), result.compiled_file.open('rb') as f:
+        return pickle.load(f)
+
+def predictor_key(result):
+    """Cache key for a result's stored model; changes whenever its files do"""
+    return (result.id, result.model_file.name, result.compiled_file.name)
+
+def get_predictor(result):
+    """
+    Return (predictor, kind) for serving a result, preferring the compiled
+    predictor. Loaded predictors are cached per process.
+    """
+    key = predictor_key(result)
+    with _predictors_lock:
+        hit = key in _predictors
+        if hit:
+            _predictors.move_to_end(key)
+            entry = _predictors[key]
+    cache_lookup('predictor', hit)
+    if hit:
+        return entry
+
+    compiled = load_compiled(result)
+    entry = (compiled, 'compiled') if compiled is not None else (load_pipeline(result), 'pipeline')
+    if entry[0] is None:
+        return None, None
+
+    with _predictors_lock:
+        _predictors[key] = entry
+        while len(_predictors) > settings.PREDICTOR_CACHE_SIZE:
+            _predictors.popitem(last=False)
+    return entry
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+class PredictionBatcher:
+    """
+    Coalesce concurrent prediction requests for one model into micro-batches.
+
+    Callers submit their rows and block on a future; a worker thread drains
+    the queue once max_batch_size rows are waiting or the oldest request has
+    waited max_wait seconds, runs a single vectorized predict and hands each
+    caller back its own slice.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait=0.005):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = deque()
+        self.queued_rows = 0
+        self.condition = threading.Condition()
+        self.closed = False
+        self.stats = {'requests': 0, 'rows': 0, 'batches': 0, 'max_batch_rows': 0,
+                      'max_queue_depth': 0, 'errors': 0}
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, rows):
+        """Queue rows for prediction and return a Future for their predictions"""
+        future = Future()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError('Batcher is closed')
+            self.queue.append((rows, future, time.monotonic()))
+            self.queued_rows += len(rows)
+            self.stats['requests'] += 1
+            self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], len(self.queue))
+            self.condition.notify()
+        return future
+
+    @property
+    def alive(self):
+        """Whether the worker thread is still answering requests"""
+        return self._worker.is_alive()
+
+    def predict(self, rows, timeout=None):
+        return self.submit(rows).result(timeout=timeout)
+
+    def snapshot(self):
+        with self.condition:
+            stats = dict(self.stats)
+            stats['queue_depth'] = len(self.queue)
+            stats['queued_rows'] = self.queued_rows
+        stats['mean_batch_rows'] = round(stats['rows'] / stats['batches'], 2) if stats['batches'] else 0
+        return stats
+
+    def close(self):
+        """Stop accepting requests; queued ones are still answered"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+    def _next_batch(self):
+        """Wait for a full batch or for the oldest request's deadline"""
+        with self.condition:
+            while not self.queue:
+                if self.closed:
+                    return None
+                self.condition.wait()
+
+            deadline = self.queue[0][2] + self.max_wait
+            while self.queued_rows < self.max_batch_size and not self.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(timeout=remaining)
+
+            batch, n_rows = [], 0
+            # Always take at least one request, even one larger than a full batch
+            while self.queue and (not batch or n_rows + len(self.queue[0][0]) <= self.max_batch_size):
+                rows, future, _ = self.queue.popleft()
+                batch.append((rows, future))
+                n_rows += len(rows)
+            self.queued_rows -= n_rows
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._predict_batch(batch)
+
+    def _predict_batch(self, batch):
+        rows = [row for request_rows, _ in batch for row in request_rows]
+        try:
+            predictions = self.predict_fn(rows)
+        except Exception:
+            # One malformed request must not fail the others in its batch
+            self._predict_individually(batch)
+            return
+
+        with self.condition:
+            self.stats['batches'] += 1
+            self.stats['rows'] += len(rows)
+            self.stats['max_batch_rows'] = max(self.stats['max_batch_rows'], len(rows))
+
+        start = 0
+        for request_rows, future in batch:
+            end = start + len(request_rows)
+            future.set_result(predictions[start:end])
+            start = end
+
+    def _predict_individually(self, batch):
+        for rows, future in batch:
+            try:
+                predictions = self.predict_fn(rows)
+            except Exception as e:
+                with self.condition:
+                    self.stats['errors'] += 1
+                future.set_exception(e)
+                continue
+            with self.condition:
+                self.stats['batches'] += 1
+                self.stats['rows'] += len(rows)
+            future.set_result(predictions)
+
+_batchers = OrderedDict()
+_batchers_lock = threading.Lock()
+
+def submit_prediction(key, rows, predict_fn, max_batch_size, max_wait, max_batchers):
+    """
+    Queue rows on the shared batcher for key and return a Future.
+
+    predict_fn is only used when the batcher is first started. The least
+    recently used batcher is closed once more than max_batchers are running,
+    and one whose worker thread died is replaced.
+    """
+    with _batchers_lock:
+        batcher = _batchers.get(key)
+        if batcher is None or not batcher.alive:
+            batcher = _batchers[key] = PredictionBatcher(predict_fn, max_batch_size, max_wait)
+            while len(_batchers) > max_batchers:
+                _batchers.popitem(last=False)[1].close()
+        else:
+            _batchers.move_to_end(key)
+        # Submitting under the registry lock keeps eviction from closing the
+        # batcher between lookup and submit
+        return batcher.submit(rows)
+
+def batcher_stats():
+    """Snapshot of every running batcher, by the first element of tuple keys"""
+    with _batchers_lock:
+        batchers = list(_batchers.items())
+    return {str(key[0] if isinstance(key, tuple) else key): batcher.snapshot()
+            for key, batcher in batchers}
@@ -0,0 +1,347 @@
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler, TargetEncoder
+from .encoding import DATETIME_PARTS, CYCLIC_PARTS, DatetimeFeatures, FrequencyEncoder
+
+logger = logging.getLogger(__name__)
+
+# Largest relative error tolerated between compiled and pipeline predictions;
+# xgboost works in float32, so it gets a looser bound
+VERIFY_RTOL = {'linear': 1e-7, 'forest': 1e-7, 'xgboost': 1e-4}
+
+class UnsupportedPipeline(Exception):
+    pass
+
+def _datetime_parts(values):
+    """Calendar parts for date strings, parsed with numpy for ISO dates"""
+    try:
+        days = np.array([v if isinstance(v, str) else 'NaT' for v in values], dtype='datetime64[D]')
+    except ValueError:
+        days = pd.to_datetime(pd.Series(values), errors='coerce').to_numpy().astype('datetime64[D]')
+    missing = np.isnat(days)
+    years = days.astype('datetime64[Y]')
+    months = days.astype('datetime64[M]')
+    parts = {
+        'year': years.astype(int) + 1970,
+        'month': (months - years).astype(int) + 1,
+        'day': (days - months).astype(int) + 1,
+        # 1970-01-01 was a Thursday (dayofweek 3)
+        'dayofweek': (days.astype(int) + 3) % 7,
+        'dayofyear': (days - years).astype(int) + 1,
+    }
+    return {name: np.where(missing, np.nan, part.astype(float)) for name, part in parts.items()}
+
+class Block:
+    """A run of preprocessing ops over some input columns, producing a dense block"""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.ops = []
+        self.width = None
+
+    def transform(self, data):
+        X = np.column_stack([data[col] for col in self.columns]).astype(object)
+        for op, params in self.ops:
+            if op == 'impute':
+                fill, keep = params
+                X = X[:, keep]
+                for j, value in enumerate(fill):
+                    column = X[:, j]
+                    missing = pd.isna(column)
+                    if missing.any():
+                        column[missing] = value
+            elif op == 'affine':
+                offset, scale = params
+                X = (X.astype(float) - offset) / scale
+            elif op == 'onehot':
+                lookups, width = params
+                out = np.zeros((X.shape[0], width))
+                for j, lookup in enumerate(lookups):
+                    index = np.array([lookup.get(v, -1) for v in X[:, j]])
+                    hit = index >= 0
+                    out[np.nonzero(hit)[0], index[hit]] = 1.0
+                X = out
+            elif op == 'map':
+                lookups, defaults = params
+                X = np.column_stack([
+                    [lookup.get(v, default) for v in X[:, j]]
+                    for j, (lookup, default) in enumerate(zip(lookups, defaults))
+                ]).astype(float)
+            elif op == 'datetime':
+                features = []
+                for j in range(X.shape[1]):
+                    parts = _datetime_parts(X[:, j])
+                    features.extend(parts[name] for name in DATETIME_PARTS)
+                    for name, period in CYCLIC_PARTS.items():
+                        angle = 2 * np.pi * parts[name] / period
+                        features.extend([np.sin(angle), np.cos(angle)])
+                X = np.column_stack(features)
+        return X.astype(float)
+
+def _compile_step(block, step):
+    if isinstance(step, SimpleImputer):
+        fill = step.statistics_
+        if fill.dtype == object:
+            keep = np.arange(len(fill))
+        else:
+            # Columns that were all-missing during fit are dropped by the imputer
+            keep = np.nonzero(~np.isnan(fill))[0]
+            fill = fill[keep]
+        block.ops.append(('impute', (list(fill), keep)))
+    elif isinstance(step, StandardScaler):
+        offset = step.mean_ if step.with_mean else 0.0
+        scale = step.scale_ if step.with_std else 1.0
+        block.ops.append(('affine', (offset, scale)))
+    elif isinstance(step, OneHotEncoder):
+        if step.handle_unknown != 'ignore' or getattr(step, '_infrequent_enabled', False):
+            raise UnsupportedPipeline('OneHotEncoder must ignore unknowns and have no infrequent categories')
+        lookups, position = [], 0
+        for i, categories in enumerate(step.categories_):
+            dropped = step.drop_idx_[i] if step.drop_idx_ is not None else None
+            lookup = {}
+            for j, category in enumerate(categories):
+                if j == dropped:
+                    continue
+                lookup[category] = position
+                position += 1
+            lookups.append(lookup)
+        block.ops.append(('onehot', (lookups, position)))
+    elif isinstance(step, FrequencyEncoder):
+        lookups = [step.frequencies_[col] for col in step.feature_names_in_]
+        block.ops.append(('map', (lookups, [0.0] * len(lookups))))
+    elif isinstance(step, TargetEncoder):
+        lookups = [dict(zip(categories, encodings))
+                   for categories, encodings in zip(step.categories_, step.encodings_)]
+        block.ops.append(('map', (lookups, [step.target_mean_] * len(lookups))))
+    elif isinstance(step, DatetimeFeatures):
+        block.ops.append(('datetime', None))
+    else:
+        raise UnsupportedPipeline(f"Cannot compile preprocessing step {type(step).__name__}")
+
+def _compile_preprocessor(preprocessor):
+    if not isinstance(preprocessor, ColumnTransformer):
+        raise UnsupportedPipeline('Expected a ColumnTransformer preprocessor')
+    blocks = []
+    for name, transformer, columns in preprocessor.transformers_:
+        if name == 'remainder' or transformer == 'drop' or len(columns) == 0:
+            if name == 'remainder' and transformer != 'drop':
+                raise UnsupportedPipeline('Remainder columns must be dropped')
+            continue
+        block = Block(columns)
+        steps = transformer.steps if isinstance(transformer, Pipeline) else [(name, transformer)]
+        for _, step in steps:
+            _compile_step(block, step)
+        blocks.append(block)
+    return blocks
+
+def _fold_linear(blocks, coef, intercept):
+    """Fold trailing standard scalers into the linear weights"""
+    coef = np.array(coef, dtype=float)
+    intercept = float(intercept)
+    start = 0
+    for block in blocks:
+        width = block.width
+        if block.ops and block.ops[-1][0] == 'affine':
+            offset, scale = block.ops.pop()[1]
+            weights = coef[start:start + width] / scale
+            intercept -= float(np.sum(offset * weights))
+            coef[start:start + width] = weights
+        start += width
+    return coef, intercept
+
+def _forest_tables(trees):
+    """
+    Concatenate fitted trees into flat node arrays.
+
+    Leaves point back at themselves so every tree can be walked in lockstep
+    for a fixed number of steps.
+    """
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        nodes = np.arange(n) + offset
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+        left.append(np.where(is_leaf, nodes, tree.children_left + offset))
+        right.append(np.where(is_leaf, nodes, tree.children_right + offset))
+        value.append(tree.value[:, 0, 0])
+        roots.append(offset)
+        offset += n
+    return {
+        'feature': np.concatenate(feature),
+        'threshold': np.concatenate(threshold),
+        'left': np.concatenate(left),
+        'right': np.concatenate(right),
+        'missing': None,
+        'value': np.concatenate(value),
+        'roots': np.array(roots),
+        'depth': max(tree.max_depth for tree in trees),
+    }
+
+def _tree_depth(left, right):
+    depth, frontier = 0, [0]
+    while True:
+        frontier = [child for node in frontier for child in (left[node], right[node]) if child != -1]
+        if not frontier:
+            return depth
+        depth += 1
+
+def _xgboost_tables(model):
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw(raw_format='json'))['learner']
+    trees = learner['gradient_booster']['model']['trees']
+    try:
+        trees = trees[:model.best_iteration + 1]
+    except AttributeError:
+        pass
+
+    feature, threshold, left, right, missing, value, roots, depths = [], [], [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        tree_left = np.array(tree['left_children'])
+        tree_right = np.array(tree['right_children'])
+        is_leaf = tree_left == -1
+        nodes = np.arange(len(tree_left)) + offset
+        # Leaf nodes keep their value in split_conditions
+        conditions = np.array(tree['split_conditions'], dtype=np.float32)
+        feature.append(np.where(is_leaf, 0, tree['split_indices']))
+        threshold.append(np.where(is_leaf, np.float32(np.inf), conditions))
+        left.append(np.where(is_leaf, nodes, tree_left + offset))
+        right.append(np.where(is_leaf, nodes, tree_right + offset))
+        missing.append(np.where(np.array(tree['default_left'], dtype=bool), left[-1], right[-1]))
+        value.append(np.where(is_leaf, conditions, np.float32(0)))
+        roots.append(offset)
+        depths.append(_tree_depth(tree_left, tree_right))
+        offset += len(tree_left)
+
+    return {
+        'feature': np.concatenate(feature),
+        'threshold': np.concatenate(threshold).astype(np.float32),
+        'left': np.concatenate(left),
+        'right': np.concatenate(right),
+        'missing': np.concatenate(missing),
+        'value': np.concatenate(value).astype(np.float32),
+        'roots': np.array(roots),
+        'depth': max(depths),
+        'base_score': float(learner['learner_model_param']['base_score']),
+    }
+
+class CompiledPredictor:
+    """
+    NumPy-only replacement for a fitted ModelTrainer pipeline.
+
+    Preprocessing is reduced to lookups and affine maps over flat arrays,
+    linear models to one dot product and tree ensembles to node tables
+    walked in lockstep.
+    """
+
+    def __init__(self, blocks, kind, params):
+        self.blocks = blocks
+        self.kind = kind
+        self.params = params
+        self.input_columns = [col for block in blocks for col in block.columns]
+
+    def _columns(self, rows):
+        if isinstance(rows, pd.DataFrame):
+            return {col: rows[col].to_numpy(dtype=object) for col in self.input_columns}
+        return {col: np.array([row.get(col) for row in rows], dtype=object)
+                for col in self.input_columns}
+
+    def transform(self, rows):
+        data = self._columns(rows)
+        return np.hstack([block.transform(data) for block in self.blocks])
+
+    def predict(self, rows):
+        X = self.transform(rows)
+        if self.kind == 'linear':
+            return X @ self.params['coef'] + self.params['intercept']
+
+        tables = self.params
+        n_rows = X.shape[0]
+        rows_index = np.arange(n_rows)[None, :]
+        node = np.repeat(tables['roots'][:, None], n_rows, axis=1)
+        if self.kind == 'forest':
+            # sklearn trees compare float32 inputs against float64 thresholds
+            X = X.astype(np.float32).astype(np.float64)
+        else:
+            X = X.astype(np.float32)
+        for _ in range(tables['depth'] + 1):
+            x = X[rows_index, tables['feature'][node]]
+            if self.kind == 'forest':
+                go_left = x <= tables['threshold'][node]
+                node = np.where(go_left, tables['left'][node], tables['right'][node])
+            else:
+                go_left = x < tables['threshold'][node]
+                step = np.where(go_left, tables['left'][node], tables['right'][node])
+                node = np.where(np.isnan(x), tables['missing'][node], step)
+
+        leaves = tables['value'][node]
+        if self.kind == 'forest':
+            return leaves.mean(axis=0)
+        return leaves.sum(axis=0, dtype=np.float32) + np.float32(tables['base_score'])
+
+def compile_pipeline(pipeline):
+    """
+    Compile a fitted ModelTrainer pipeline, raising UnsupportedPipeline for
+    steps or regressors without a compiled form.
+    """
+    blocks = _compile_preprocessor(pipeline.named_steps['preprocessor'])
+    model = pipeline.named_steps['regressor']
+    sample_width = len(pipeline.named_steps['preprocessor'].get_feature_names_out())
+
+    # Widths are needed to fold scalers into linear weights
+    widths = []
+    for name, transformer, columns in pipeline.named_steps['preprocessor'].transformers_:
+        if name == 'remainder' or transformer == 'drop' or len(columns) == 0:
+            continue
+        widths.append(len(pipeline.named_steps['preprocessor'].named_transformers_[name]
+                          .get_feature_names_out(columns)))
+    if sum(widths) != sample_width:
+        raise UnsupportedPipeline('Could not determine preprocessor output widths')
+    for block, width in zip(blocks, widths):
+        block.width = width
+
+    if isinstance(model, LinearRegression):
+        coef, intercept = _fold_linear(blocks, model.coef_, model.intercept_)
+        return CompiledPredictor(blocks, 'linear', {'coef': coef, 'intercept': intercept})
+    if isinstance(model, RandomForestRegressor):
+        return CompiledPredictor(blocks, 'forest',
+                                 _forest_tables([e.tree_ for e in model.estimators_]))
+    if type(model).__name__ == 'XGBRegressor':
+        objective = model.get_params().get('objective') or 'reg:squarederror'
+        if objective != 'reg:squarederror' or getattr(model, 'booster', None) not in (None, 'gbtree'):
+            raise UnsupportedPipeline(f"Unsupported xgboost configuration: {objective}")
+        return CompiledPredictor(blocks, 'xgboost', _xgboost_tables(model))
+    raise UnsupportedPipeline(f"Cannot compile regressor {type(model).__name__}")
+
+def compile_and_verify(pipeline, X_sample):
+    """
+    Compile a pipeline and check it reproduces the pipeline's predictions on
+    X_sample; returns None when the pipeline can't be compiled faithfully.
+    """
+    try:
+        compiled = compile_pipeline(pipeline)
+        expected = pipeline.predict(X_sample)
+        actual = compiled.predict(X_sample)
+    except UnsupportedPipeline as e:
+        logger.info(f"Pipeline not compiled: {e}")
+        return None
+    except Exception as e:
+        logger.warning(f"Compiling pipeline failed: {e}")
+        return None
+
+    rtol = VERIFY_RTOL[compiled.kind]
+    if not np.allclose(actual, expected, rtol=rtol, atol=rtol * (np.abs(expected).max() + 1)):
+        logger.warning(f"Compiled {compiled.kind} predictor disagrees with pipeline; not using it")
+        return None
+    return compiled
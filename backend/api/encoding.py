@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.preprocessing import TargetEncoder
+from .profiling import is_datetime_column, parse_datetimes
+
+# Object columns with more distinct values than this are not one-hot encoded
+HIGH_CARDINALITY_THRESHOLD = 20
+HIGH_CARDINALITY_ENCODERS = ['frequency', 'target']
+
+DATETIME_PARTS = ['year', 'month', 'day', 'dayofweek', 'dayofyear']
+CYCLIC_PARTS = {'month': 12, 'dayofweek': 7}
+
+def plan_encodings(X, categorical_features, profile=None,
+                   cardinality_threshold=HIGH_CARDINALITY_THRESHOLD,
+                   high_cardinality_encoder='frequency'):
+    """
+    Choose an encoding for every categorical column.
+
+    Datetime strings are expanded into calendar features, columns above the
+    cardinality threshold get a compact single-column encoder and the rest
+    are one-hot encoded.
+    """
+    if high_cardinality_encoder not in HIGH_CARDINALITY_ENCODERS:
+        raise ValueError(f"Unsupported high-cardinality encoder: {high_cardinality_encoder}")
+
+    encodings = {}
+    for col in categorical_features:
+        info = profile.get('columns', {}).get(col) if profile else None
+        is_datetime = info['is_datetime'] if info and 'is_datetime' in info else is_datetime_column(X[col])
+        if is_datetime:
+            encodings[col] = 'datetime'
+            continue
+
+        n_unique = info['n_unique'] if info else X[col].nunique(dropna=True)
+
+        if n_unique > cardinality_threshold:
+            encodings[col] = high_cardinality_encoder
+        else:
+            encodings[col] = 'onehot'
+    return encodings
+
+class DatetimeFeatures(BaseEstimator, TransformerMixin):
+    """Expand datetime columns into calendar parts plus sin/cos cyclic features"""
+
+    def fit(self, X, y=None):
+        X = pd.DataFrame(X)
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        return self
+
+    def transform(self, X):
+        X = pd.DataFrame(X)
+        features = []
+        for col in X.columns:
+            dates = parse_datetimes(X[col])
+            for part in DATETIME_PARTS:
+                features.append(getattr(dates.dt, part).astype(float).to_numpy())
+            for part, period in CYCLIC_PARTS.items():
+                angle = 2 * np.pi * getattr(dates.dt, part).astype(float).to_numpy() / period
+                features.append(np.sin(angle))
+                features.append(np.cos(angle))
+        if not features:
+            return np.empty((len(X), 0))
+        return np.column_stack(features)
+
+    def get_feature_names_out(self, input_features=None):
+        if input_features is None:
+            input_features = self.feature_names_in_
+        names = []
+        for col in input_features:
+            names.extend(f"{col}_{part}" for part in DATETIME_PARTS)
+            for part in CYCLIC_PARTS:
+                names.extend([f"{col}_{part}_sin", f"{col}_{part}_cos"])
+        return np.asarray(names, dtype=object)
+
+class FrequencyEncoder(BaseEstimator, TransformerMixin):
+    """Replace each category with its relative frequency in the training data"""
+
+    def fit(self, X, y=None):
+        X = pd.DataFrame(X)
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        self.frequencies_ = {
+            col: X[col].value_counts(normalize=True).to_dict()
+            for col in X.columns
+        }
+        return self
+
+    def transform(self, X):
+        X = pd.DataFrame(X)
+        columns = [
+            X[col].map(self.frequencies_[col]).fillna(0.0).astype(float).to_numpy()
+            for col in X.columns
+        ]
+        if not columns:
+            return np.empty((len(X), 0))
+        return np.column_stack(columns)
+
+    def get_feature_names_out(self, input_features=None):
+        if input_features is None:
+            input_features = self.feature_names_in_
+        return np.asarray([f"{col}_freq" for col in input_features], dtype=object)
+
+def make_high_cardinality_encoder(name):
+    if name == 'target':
+        # TargetEncoder cross-fits during fit_transform, so training rows are
+        # encoded out-of-fold and do not leak their own target
+        return TargetEncoder(target_type='continuous', random_state=42)
+    return FrequencyEncoder()
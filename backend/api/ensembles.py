@@ -0,0 +1,109 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from .artifacts import get_predictor
+from .models import TrainingResult
+
+# Folds used to estimate the blend's out-of-sample error on the holdout rows
+BLEND_FOLDS = 5
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1,
+                                           thread_name_prefix='ensemble')
+        return _executor
+
+def fit_blender(predictions, y):
+    """
+    Non-negative least-squares weights (plus intercept) for stacking.
+
+    Non-negative weights keep the blend interpretable and stop correlated
+    base models from cancelling each other out.
+    """
+    from scipy.optimize import nnls
+
+    mean_p, mean_y = predictions.mean(axis=0), y.mean()
+    weights, _ = nnls(predictions - mean_p, y - mean_y)
+    return weights, float(mean_y - mean_p @ weights)
+
+def cross_validated_blend(predictions, y, folds=BLEND_FOLDS):
+    """Out-of-fold blended predictions, so the blend is never scored on rows it was fitted to"""
+    blended = np.empty(len(y))
+    for test in np.array_split(np.random.default_rng(0).permutation(len(y)), folds):
+        train = np.setdiff1d(np.arange(len(y)), test)
+        weights, intercept = fit_blender(predictions[train], y[train])
+        blended[test] = predictions[test] @ weights + intercept
+    return blended
+
+class StackedEnsemble:
+    """
+    A blend of stored TrainingResults, served like a fitted pipeline.
+
+    Only result ids and blend weights are pickled; base models are loaded
+    through the predictor cache when the ensemble is loaded and evaluated
+    in parallel.
+    """
+
+    def __init__(self, result_ids, weights, intercept, feature_names):
+        self.result_ids = list(result_ids)
+        self.weights = np.asarray(weights, dtype=float)
+        self.intercept = float(intercept)
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_bases', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Resolve the bases while loading, in the request thread, rather than
+        # on the first predict, which may run on a batching thread
+        try:
+            self._base_predictors()
+        except ValueError:
+            self._bases = None
+
+    def _base_predictors(self):
+        bases = getattr(self, '_bases', None)
+        if bases is None:
+            results = TrainingResult.objects.in_bulk(self.result_ids)
+            bases = []
+            for result_id in self.result_ids:
+                if result_id not in results:
+                    raise ValueError(f'Base result {result_id} no longer exists')
+                predictor, _ = get_predictor(results[result_id])
+                if predictor is None:
+                    raise ValueError(f'Base result {result_id} has no stored model')
+                bases.append(predictor)
+            self._bases = bases
+        return bases
+
+    def predict(self, X):
+        X = pd.DataFrame(X, columns=self.feature_names_in_)
+        # Bases with zero weight do not contribute and are skipped
+        active = [(predictor, weight) for predictor, weight
+                  in zip(self._base_predictors(), self.weights) if weight > 0]
+        futures = [_get_executor().submit(predictor.predict, X) for predictor, _ in active]
+        prediction = np.full(len(X), self.intercept)
+        for future, (_, weight) in zip(futures, active):
+            prediction += weight * np.asarray(future.result(), dtype=float)
+        return prediction
+
+def base_predictions(results, X):
+    """Predictions of each stored result on X, one column per result, in parallel"""
+    predictors = []
+    for result in results:
+        predictor, _ = get_predictor(result)
+        if predictor is None:
+            raise ValueError(f'Result {result.id} has no stored model')
+        predictors.append(predictor)
+    futures = [_get_executor().submit(predictor.predict, X) for predictor in predictors]
+    return np.column_stack([np.asarray(future.result(), dtype=float) for future in futures])
@@ -0,0 +1,130 @@
+import importlib
+import threading
+
+class EstimatorSpec:
+    """
+    A model type both backends can train.
+
+    The estimator class is imported only the first time the model type is
+    used, so validating model configs never pays for loading sklearn or xgboost.
+    """
+
+    def __init__(self, name, label, loader, hyperparameters, ignored_hyperparameters=(),
+                 supports_warm_start=False, native_categorical=False):
+        self.name = name
+        self.label = label
+        self.loader = loader
+        self.hyperparameters = list(hyperparameters)
+        # Accepted for backwards compatibility but not passed to the estimator
+        self.ignored_hyperparameters = list(ignored_hyperparameters)
+        # Whether a fitted model can keep training on new rows
+        self.supports_warm_start = supports_warm_start
+        # Whether the estimator takes ordinal-coded categories and missing
+        # values directly, instead of imputed, scaled and one-hot features
+        self.native_categorical = native_categorical
+        self._estimator_class = None
+        self._lock = threading.Lock()
+
+    @property
+    def allowed_hyperparameters(self):
+        return self.hyperparameters + self.ignored_hyperparameters
+
+    def load(self):
+        """Import and cache the estimator class"""
+        if self._estimator_class is None:
+            with self._lock:
+                if self._estimator_class is None:
+                    if callable(self.loader):
+                        self._estimator_class = self.loader()
+                    else:
+                        module_name, attr = self.loader.split(':')
+                        self._estimator_class = getattr(importlib.import_module(module_name), attr)
+        return self._estimator_class
+
+    def create(self, hyperparameters):
+        params = {k: v for k, v in hyperparameters.items()
+                  if k not in self.ignored_hyperparameters}
+        return self.load()(**params)
+
+    def describe(self):
+        return {
+            'model_type': self.name,
+            'label': self.label,
+            'hyperparameters': self.allowed_hyperparameters,
+            'supports_warm_start': self.supports_warm_start,
+            'native_categorical': self.native_categorical,
+        }
+
+_registry = {}
+
+def register_estimator(name, label, loader, hyperparameters, ignored_hyperparameters=(),
+                       supports_warm_start=False, native_categorical=False):
+    """
+    Register a model type.
+
+    `loader` is either a "module:ClassName" import path or a zero-argument
+    callable returning the estimator class; `hyperparameters` is the
+    whitelist of constructor arguments accepted from API requests.
+    """
+    spec = EstimatorSpec(name, label, loader, hyperparameters, ignored_hyperparameters,
+                         supports_warm_start, native_categorical)
+    _registry[name] = spec
+    return spec
+
+def get_estimator_spec(model_type):
+    try:
+        return _registry[model_type]
+    except KeyError:
+        raise ValueError(f"Unsupported model type: {model_type}")
+
+def get_estimator_class(model_type):
+    return get_estimator_spec(model_type).load()
+
+def create_estimator(model_type, hyperparameters):
+    return get_estimator_spec(model_type).create(hyperparameters)
+
+def registered_model_types():
+    return list(_registry)
+
+def estimator_choices():
+    """Choices for MLModel.model_type, evaluated lazily by Django"""
+    return [(spec.name, spec.label) for spec in _registry.values()]
+
+register_estimator(
+    'linear_regression', 'Linear Regression',
+    'sklearn.linear_model:LinearRegression',
+    ['fit_intercept', 'n_jobs'],
+    # Removed from LinearRegression in scikit-learn 1.2
+    ignored_hyperparameters=['normalize']
+)
+register_estimator(
+    'random_forest', 'Random Forest',
+    'sklearn.ensemble:RandomForestRegressor',
+    ['n_estimators', 'max_depth', 'min_samples_split', 'min_samples_leaf',
+     'max_features', 'random_state', 'n_jobs'],
+    supports_warm_start=True
+)
+register_estimator(
+    'knn', 'K-Nearest Neighbors',
+    'sklearn.neighbors:KNeighborsRegressor',
+    ['n_neighbors', 'weights', 'algorithm', 'leaf_size']
+)
+register_estimator(
+    'svr', 'Support Vector Regression',
+    'sklearn.svm:SVR',
+    ['kernel', 'C', 'epsilon', 'gamma']
+)
+register_estimator(
+    'xgboost', 'XGBoost',
+    'xgboost:XGBRegressor',
+    ['n_estimators', 'max_depth', 'learning_rate', 'subsample', 'colsample_bytree'],
+    supports_warm_start=True
+)
+register_estimator(
+    'hist_gradient_boosting', 'Histogram Gradient Boosting',
+    'sklearn.ensemble:HistGradientBoostingRegressor',
+    ['max_iter', 'learning_rate', 'max_leaf_nodes', 'max_depth', 'min_samples_leaf',
+     'l2_regularization', 'max_bins', 'early_stopping', 'validation_fraction',
+     'n_iter_no_change', 'random_state'],
+    native_categorical=True
+)
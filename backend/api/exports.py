@@ -0,0 +1,174 @@
+import csv
+import io
+import json
+from .artifacts import load_predictions
+
+# Rows fetched per database round trip (a server-side cursor on PostgreSQL)
+EXPORT_CHUNK_SIZE = 500
+# Rows buffered per Parquet row group
+PARQUET_ROW_GROUP_SIZE = 5000
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+RESULT_COLUMNS = ['id', 'dataset', 'model', 'model_type', 'target_column', 'created_at']
+PREDICTION_COLUMNS = ['result_id', 'dataset', 'model', 'model_type', 'target_column',
+                      'row_index', 'y_true', 'y_pred']
+
+def _flatten(values, prefix):
+    """Nested metric dicts (e.g. confidence intervals) as dotted scalar columns"""
+    flat = {}
+    for key, value in (values or {}).items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f'{prefix}{key}.'))
+        else:
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+def _iter_results(queryset):
+    return queryset.select_related('dataset', 'model').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+def result_columns(queryset):
+    """
+    Header for flattened result rows, the metric columns that hold text,
+    and the highest result id seen.
+
+    Metric and feature-importance keys differ between results, so they are
+    collected in a first pass that only reads the two JSON columns. Most
+    metrics are numbers, but some (the paired comparison's reference id)
+    are not, and typed formats need to know which. Results created after
+    this pass are not covered by the header, so the export stops at the
+    returned id.
+    """
+    metric_keys, importance_keys, text_columns = {}, {}, set()
+    last_id = None
+    for result_id, metrics, importance in (queryset.values_list('id', 'metrics', 'feature_importance')
+                                           .iterator(chunk_size=EXPORT_CHUNK_SIZE)):
+        last_id = result_id if last_id is None else max(last_id, result_id)
+        flat = _flatten(metrics, 'metric.')
+        metric_keys.update(dict.fromkeys(flat))
+        text_columns.update(key for key, value in flat.items()
+                            if value is not None and not isinstance(value, (int, float)))
+        importance_keys.update(dict.fromkeys(importance or {}))
+    columns = (RESULT_COLUMNS
+               + list(metric_keys)
+               + [f'importance.{key}' for key in importance_keys])
+    return columns, text_columns, last_id
+
+def iter_result_rows(queryset):
+    for result in _iter_results(queryset):
+        row = {
+            'id': result.id,
+            'dataset': result.dataset.name,
+            'model': result.model.name,
+            'model_type': result.model.model_type,
+            'target_column': result.target_column,
+            'created_at': result.created_at.isoformat(),
+        }
+        row.update(_flatten(result.metrics, 'metric.'))
+        row.update({f'importance.{k}': v for k, v in (result.feature_importance or {}).items()})
+        yield row
+
+def iter_prediction_rows(queryset):
+    """One row per stored holdout prediction; results without predictions are skipped"""
+    for result in _iter_results(queryset.exclude(predictions_file='')):
+        arrays = load_predictions(result)
+        if arrays is None:
+            continue
+        base = {
+            'result_id': result.id,
+            'dataset': result.dataset.name,
+            'model': result.model.name,
+            'model_type': result.model.model_type,
+            'target_column': result.target_column,
+        }
+        for index, y_true, y_pred in zip(arrays['index'].tolist(), arrays['y_true'].tolist(),
+                                         arrays['y_pred'].tolist()):
+            yield {**base, 'row_index': index, 'y_true': y_true, 'y_pred': y_pred}
+
+class _Echo:
+    """File-like object whose write returns what was written, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+def stream_csv(columns, rows):
+    # A row updated after the header pass may carry keys the header lacks;
+    # dropping them beats failing halfway through a 200 response
+    writer = csv.DictWriter(_Echo(), fieldnames=columns, restval='', extrasaction='ignore')
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+def _parquet_schema(columns, text_columns=()):
+    import pyarrow as pa
+
+    integers = {'id', 'result_id', 'row_index'}
+    floats = {'y_true', 'y_pred'}
+    fields = []
+    for col in columns:
+        if col in integers:
+            fields.append(pa.field(col, pa.int64()))
+        elif col in text_columns:
+            fields.append(pa.field(col, pa.string()))
+        elif col in floats or col.startswith(('metric.', 'importance.')):
+            fields.append(pa.field(col, pa.float64()))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    return pa.schema(fields)
+
+def stream_parquet(columns, rows, text_columns=()):
+    """Write Parquet row groups as rows arrive, yielding the bytes of each one"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(columns, text_columns)
+    sink = io.BytesIO()
+    writer = pq.ParquetWriter(sink, schema)
+
+    def flush(batch):
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    batch = []
+    for row in rows:
+        # A text column may still hold numbers in some rows
+        for col in text_columns:
+            if row.get(col) is not None:
+                row[col] = str(row[col])
+        batch.append(row)
+        if len(batch) >= PARQUET_ROW_GROUP_SIZE:
+            yield flush(batch)
+            batch = []
+    if batch:
+        yield flush(batch)
+    writer.close()
+    yield sink.getvalue()
+
+def stream_export(queryset, export_format, predictions=False):
+    """Chunks of the export of a TrainingResult queryset in the given format"""
+    text_columns = ()
+    if predictions:
+        columns, rows = PREDICTION_COLUMNS, iter_prediction_rows(queryset)
+    elif export_format == 'ndjson':
+        columns, rows = None, iter_result_rows(queryset)
+    else:
+        columns, text_columns, last_id = result_columns(queryset)
+        rows = iter_result_rows(queryset.filter(id__lte=last_id) if last_id is not None
+                                else queryset.none())
+
+    if export_format == 'csv':
+        return stream_csv(columns, rows)
+    if export_format == 'ndjson':
+        return stream_ndjson(rows)
+    return stream_parquet(columns, rows, text_columns)
@@ -0,0 +1,187 @@
+import multiprocessing
+import time
+from django.conf import settings
+from .metrics import FIT_DURATION, FITS, FITS_IN_FLIGHT, rows_label
+
+# How often a waiting request checks for cancellation and its deadline
+POLL_SECONDS = 0.1
+# Time a worker gets to stop cooperatively after its deadline before it is killed
+KILL_GRACE_SECONDS = 1.0
+
+INTERRUPT_MESSAGES = {
+    'cancelled': 'Training was cancelled',
+    'timed_out': 'Training exceeded its time limit',
+}
+
+class TrainingInterrupted(Exception):
+    """A model x target cell was stopped before it finished"""
+
+    def __init__(self, status, message=None):
+        super().__init__(message or INTERRUPT_MESSAGES[status])
+        # 'cancelled' or 'timed_out'
+        self.status = status
+
+    def __reduce__(self):
+        return TrainingInterrupted, (self.status, str(self))
+
+_context = None
+
+def _get_context():
+    """
+    Multiprocessing context for fit workers.
+
+    A fork server that has already imported scikit-learn hands out fresh
+    workers quickly, without forking the threads of the web server.
+    """
+    global _context
+    if _context is None:
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            _context = multiprocessing.get_context('forkserver')
+            _context.set_forkserver_preload(['api.ml_utils'])
+        else:
+            _context = multiprocessing.get_context('spawn')
+    return _context
+
+class _PipeReporter:
+    """Progress callback of a worker process, forwarding events to the request"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __call__(self, event, **data):
+        self.conn.send(('progress', event, data))
+
+def _timed_out(time_limit):
+    return TrainingInterrupted('timed_out', f'Training exceeded its time limit of {time_limit:g}s')
+
+def _deadline_check(deadline):
+    def should_stop():
+        if deadline is not None and time.time() > deadline:
+            return 'timed_out'
+        return None
+    return should_stop
+
+def _fit_in_worker(trainer, conn, deadline, method, args):
+    trainer.progress_callback = _PipeReporter(conn)
+    trainer.should_stop = _deadline_check(deadline)
+    try:
+        outputs = getattr(trainer, method)(*args)
+        # Only train_and_evaluate sets the holdout attributes
+        message = ('result', (outputs, *(getattr(trainer, name, None)
+                                         for name in ('X_test', 'y_test', 'y_pred'))))
+    except Exception as e:
+        message = ('error', e)
+    try:
+        conn.send(message)
+    except Exception as e:
+        # The exception itself could not be pickled
+        conn.send(('error', RuntimeError(str(message[1]) if message[0] == 'error' else str(e))))
+    finally:
+        conn.close()
+
+def _fit_in_process(trainer, time_limit, cancelled, method, args):
+    context = _get_context()
+    receiver, sender = context.Pipe(duplex=False)
+    deadline = time.time() + time_limit if time_limit else None
+    callback = trainer.progress_callback
+    # The callback publishes to this process's progress log and is not picklable
+    trainer.progress_callback = None
+    try:
+        worker = context.Process(target=_fit_in_worker,
+                                 args=(trainer, sender, deadline, method, args), daemon=True)
+        worker.start()
+    finally:
+        trainer.progress_callback = callback
+    sender.close()
+
+    try:
+        while True:
+            if receiver.poll(POLL_SECONDS):
+                try:
+                    kind, *payload = receiver.recv()
+                except EOFError:
+                    worker.join()
+                    raise RuntimeError(f'Training process exited unexpectedly '
+                                       f'(exit code {worker.exitcode})')
+                if kind == 'progress':
+                    if callback is not None:
+                        event, data = payload
+                        callback(event, **data)
+                elif kind == 'error':
+                    error = payload[0]
+                    if isinstance(error, TrainingInterrupted) and error.status == 'timed_out':
+                        raise _timed_out(time_limit)
+                    raise error
+                else:
+                    outputs, trainer.X_test, trainer.y_test, trainer.y_pred = payload[0]
+                    return outputs
+            elif cancelled is not None and cancelled():
+                raise TrainingInterrupted('cancelled')
+            elif deadline is not None and time.time() > deadline + KILL_GRACE_SECONDS:
+                raise _timed_out(time_limit)
+    finally:
+        # Killing the worker frees its memory and CPU immediately
+        if worker.is_alive():
+            worker.kill()
+        worker.join()
+        receiver.close()
+
+def _fit_in_thread(trainer, time_limit, cancelled, method, args):
+    deadline = time.monotonic() + time_limit if time_limit else None
+
+    def should_stop():
+        if cancelled is not None and cancelled():
+            return 'cancelled'
+        if deadline is not None and time.monotonic() > deadline:
+            return 'timed_out'
+        return None
+
+    trainer.should_stop = should_stop
+    try:
+        return getattr(trainer, method)(*args)
+    except TrainingInterrupted as e:
+        if e.status == 'timed_out':
+            raise _timed_out(time_limit)
+        raise
+
+def fit_cell(trainer, time_limit=None, cancelled=None, isolation=None,
+             method='train_and_evaluate', args=()):
+    """
+    Run trainer.train_and_evaluate() for one model x target cell.
+
+    With process isolation the fit runs in a worker process that is killed
+    when `cancelled()` becomes true or time_limit seconds pass; otherwise it
+    runs in the calling thread and stops at the trainer's checkpoints
+    (between stages, forest chunks and XGBoost rounds). Either way an
+    interrupted cell raises TrainingInterrupted. Progress goes to the
+    trainer's progress_callback, and trainer.X_test, y_test and y_pred are
+    set as after a local call.
+
+    `method` and `args` run another trainer method under the same limits,
+    e.g. the subsample fits of a quick comparison.
+    """
+    if isolation is None:
+        isolation = settings.TRAINING_FIT_ISOLATION
+    if cancelled is not None and cancelled():
+        raise TrainingInterrupted('cancelled')
+
+    fit_status = 'failed'
+    started = time.perf_counter()
+    try:
+        with FITS_IN_FLIGHT.track_inprogress():
+            if isolation == 'process':
+                outputs = _fit_in_process(trainer, time_limit, cancelled, method, args)
+            else:
+                outputs = _fit_in_thread(trainer, time_limit, cancelled, method, args)
+        fit_status = 'completed'
+        return outputs
+    except TrainingInterrupted as e:
+        fit_status = e.status
+        raise
+    finally:
+        FITS.inc(model_type=trainer.model_type, status=fit_status)
+        # Durations are labelled by dataset size, which only full fits train on
+        if fit_status == 'completed' and method == 'train_and_evaluate':
+            profile = trainer.profile if isinstance(trainer.profile, dict) else {}
+            FIT_DURATION.observe(time.perf_counter() - started, model_type=trainer.model_type,
+                                 dataset_rows=rows_label(profile.get('row_count')))
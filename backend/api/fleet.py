@@ -0,0 +1,211 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .artifacts import attach_files
+from .models import FleetWorker, TrainingResult, TrainingTask
+from .runtime import record_fit
+
+# How often a request waiting on fleet tasks checks their status
+POLL_SECONDS = 0.5
+# Pending tasks considered per claim; claims race, so more than one is tried
+CLAIM_CANDIDATES = 20
+
+ACTIVE_STATUSES = ('pending', 'running')
+
+def fleet_enabled():
+    """
+    Whether /api/train/ hands cells to fleet workers.
+
+    Workers upload pickled models, so the fleet is only run with a worker
+    token; without one it refuses to start.
+    """
+    if settings.TRAINING_EXECUTOR != 'fleet':
+        return False
+    if not settings.FLEET_WORKER_TOKEN:
+        raise ImproperlyConfigured('TRAINING_EXECUTOR=fleet requires FLEET_WORKER_TOKEN to be set')
+    return True
+
+def enqueue_tasks(job_id, dataset, cells, dropped_features=None):
+    """
+    Queue one task per (MLModel, target_column, time_limit) cell of a job.
+
+    Tasks carry the dataset's content hash, which is what workers cache
+    datasets by, and the features selected away for their target.
+    """
+    dropped_features = dropped_features or {}
+    if not dataset.content_hash:
+        from .uploads import content_hash
+
+        with dataset.file.open('rb') as f:
+            dataset.content_hash = content_hash(f)
+        dataset.save(update_fields=['content_hash'])
+    return TrainingTask.objects.bulk_create([
+        TrainingTask(job_id=job_id, dataset=dataset, dataset_hash=dataset.content_hash,
+                     model=ml_model, target_column=target, time_limit=time_limit,
+                     dropped_features=dropped_features.get(target))
+        for ml_model, target, time_limit in cells
+    ])
+
+def live_workers(exclude=None):
+    """Workers that claimed or heartbeated within one lease period"""
+    since = timezone.now() - timedelta(seconds=settings.FLEET_LEASE_SECONDS)
+    workers = FleetWorker.objects.filter(last_seen__gte=since)
+    if exclude:
+        workers = workers.exclude(worker_id=exclude)
+    return workers
+
+def requeue_expired():
+    """
+    Put running tasks whose worker stopped heartbeating back in the queue.
+
+    Tasks that already used up their attempts fail instead, and tasks no
+    worker picked up in time fail too, so waiting requests always finish.
+    """
+    now = timezone.now()
+    expired = TrainingTask.objects.filter(status='running', lease_expires_at__lt=now)
+    expired.filter(attempts__gte=settings.FLEET_MAX_ATTEMPTS).update(
+        status='failed', error='Worker stopped responding', finished_at=now)
+    expired.update(status='pending', worker_id='', lease_expires_at=None)
+    TrainingTask.objects.filter(
+        status='pending',
+        created_at__lt=now - timedelta(seconds=settings.FLEET_MAX_PENDING_SECONDS)
+    ).update(status='failed', error='No worker claimed the task in time', finished_at=now)
+
+def _candidates(worker_id, cached_hashes):
+    """
+    Pending tasks this worker should try to claim, best first.
+
+    Tasks on datasets the worker already holds come first. Other tasks are
+    held back for a short while when another live worker holds their
+    dataset (delay scheduling), so data moves between nodes only when
+    waiting for locality would leave workers idle.
+    """
+    pending = TrainingTask.objects.filter(status='pending')
+    local = list(pending.filter(dataset_hash__in=cached_hashes)[:CLAIM_CANDIDATES])
+    if local:
+        return local
+
+    held_elsewhere = set()
+    for hashes in live_workers(exclude=worker_id).values_list('cached_hashes', flat=True):
+        held_elsewhere.update(hashes)
+    patience = timezone.now() - timedelta(seconds=settings.FLEET_LOCALITY_WAIT_SECONDS)
+    return [task for task in pending[:CLAIM_CANDIDATES]
+            if task.dataset_hash not in held_elsewhere or task.created_at < patience]
+
+def claim_task(worker_id, cached_hashes):
+    """Lease the best pending task to a worker, or return None when there is nothing to do"""
+    now = timezone.now()
+    FleetWorker.objects.update_or_create(
+        worker_id=worker_id, defaults={'cached_hashes': list(cached_hashes), 'last_seen': now})
+    requeue_expired()
+
+    for task in _candidates(worker_id, cached_hashes):
+        # Conditional update, so concurrent claims never lease the same task twice
+        claimed = TrainingTask.objects.filter(pk=task.pk, status='pending').update(
+            status='running', worker_id=worker_id, claimed_at=now,
+            lease_expires_at=now + timedelta(seconds=settings.FLEET_LEASE_SECONDS),
+            attempts=F('attempts') + 1
+        )
+        if claimed:
+            return TrainingTask.objects.select_related('model').get(pk=task.pk)
+    return None
+
+def task_payload(task):
+    return {
+        'id': task.id,
+        'job_id': task.job_id,
+        'dataset_hash': task.dataset_hash,
+        'model_type': task.model.model_type,
+        'hyperparameters': task.model.hyperparameters,
+        'target_column': task.target_column,
+        'time_limit': task.time_limit,
+        'dropped_features': task.dropped_features or {},
+        'cardinality_threshold': settings.ML_HIGH_CARDINALITY_THRESHOLD,
+        'high_cardinality_encoder': settings.ML_HIGH_CARDINALITY_ENCODER,
+        'lease_seconds': settings.FLEET_LEASE_SECONDS,
+    }
+
+def heartbeat(task_id, worker_id):
+    """
+    Extend a worker's lease on a task.
+
+    Returns False when the worker should stop: the task was cancelled,
+    or it expired and now belongs to someone else.
+    """
+    now = timezone.now()
+    FleetWorker.objects.filter(worker_id=worker_id).update(last_seen=now)
+    return bool(TrainingTask.objects.filter(pk=task_id, worker_id=worker_id, status='running')
+                .update(lease_expires_at=now + timedelta(seconds=settings.FLEET_LEASE_SECONDS)))
+
+def complete_task(task_id, worker_id, metrics, feature_importance, model_info,
+                  model_file, compiled_file=None, predictions_file=None):
+    """
+    Store a worker's output as a TrainingResult.
+
+    Returns the result, or None if the task is no longer leased to this
+    worker, in which case the output is dropped.
+    """
+    with transaction.atomic():
+        task = (TrainingTask.objects.select_for_update()
+                .filter(pk=task_id, worker_id=worker_id, status='running').first())
+        if task is None:
+            return None
+        result = TrainingResult(dataset_id=task.dataset_id, model_id=task.model_id,
+                                target_column=task.target_column, metrics=metrics,
+                                feature_importance=feature_importance)
+        result.save()
+        attach_files(result, model_file, compiled_file, predictions_file)
+        result.save()
+        task.status = 'completed'
+        task.result = result
+        task.model_info = model_info
+        task.finished_at = timezone.now()
+        task.save(update_fields=['status', 'result', 'model_info', 'finished_at'])
+        fit_record = record_fit(task.model.model_type, task.model.hyperparameters, model_info)
+        if fit_record is not None:
+            fit_record.save()
+    return result
+
+def fail_task(task_id, worker_id, task_status, error):
+    """Record that a worker gave up on a task ('failed', 'timed_out' or 'cancelled')"""
+    return bool(TrainingTask.objects.filter(pk=task_id, worker_id=worker_id, status='running')
+                .update(status=task_status, error=error, finished_at=timezone.now()))
+
+def cancel_tasks(job_id):
+    """Cancel a job's unfinished tasks; running workers notice on their next heartbeat"""
+    return TrainingTask.objects.filter(job_id=job_id, status__in=ACTIVE_STATUSES).update(
+        status='cancelled', error='Training was cancelled', finished_at=timezone.now())
+
+def wait_for_tasks(job_id, progress):
+    """
+    Block until every task of a job has finished, relaying their progress.
+
+    Cancelling the job's progress cancels its remaining tasks. Returns the
+    tasks in the order they were queued.
+    """
+    seen = {}
+    while True:
+        if progress.cancel_requested:
+            cancel_tasks(job_id)
+        requeue_expired()
+        tasks = list(TrainingTask.objects.filter(job_id=job_id)
+                     .select_related('model', 'result', 'dataset'))
+        for task in tasks:
+            if seen.get(task.pk) == (task.status, task.worker_id):
+                continue
+            seen[task.pk] = (task.status, task.worker_id)
+            cell = {'model': task.model.name, 'model_type': task.model.model_type,
+                    'target': task.target_column}
+            if task.status == 'running':
+                progress.publish('model_started', worker=task.worker_id, **cell)
+            elif task.status == 'completed':
+                progress.step_completed(metrics=task.result.metrics, worker=task.worker_id, **cell)
+            elif task.status != 'pending':
+                progress.step_interrupted(task.status, error=task.error, **cell)
+        if all(task.status not in ACTIVE_STATUSES for task in tasks):
+            return tasks
+        time.sleep(POLL_SECONDS)
@@ -0,0 +1,303 @@
+import json
+import math
+import os
+import queue
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+from .worker import _encode_multipart
+
+# Bundled scenarios, rerunnable by name
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'loadtest')
+ENDPOINTS = ('upload', 'train', 'results_list', 'result_detail', 'predict')
+PERCENTILES = (50, 95, 99)
+REQUEST_TIMEOUT = 300
+
+DEFAULT_SCENARIO = {
+    'concurrency': 8,
+    'dataset': {'rows': 2000, 'seed': 0},
+    'unique_uploads': True,
+    # Trained before the run so detail and predict traffic has results to hit
+    'setup_models': [{'name': 'load-test lr', 'model_type': 'linear_regression',
+                      'hyperparameters': {}}],
+}
+
+def load_scenario(name):
+    """A scenario from a JSON file path or by name from SCENARIO_DIR"""
+    path = name if os.path.exists(name) else os.path.join(SCENARIO_DIR, f'{name}.json')
+    with open(path) as f:
+        scenario = {**DEFAULT_SCENARIO, **json.load(f)}
+    scenario.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    if 'stages' not in scenario:
+        scenario['stages'] = [{'duration_seconds': scenario.get('duration_seconds', 30),
+                               'arrival_rate': scenario.get('arrival_rate', 0)}]
+    unknown = {entry['endpoint'] for entry in scenario['mix']} - set(ENDPOINTS)
+    if unknown:
+        raise ValueError(f"Unknown endpoints in scenario: {sorted(unknown)}")
+    return scenario
+
+def synthetic_dataset(rows, seed=0):
+    """A crop-trial-like table: categorical site, weather readings and a numeric target"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'Location': rng.choice([f'site-{i}' for i in range(8)], rows),
+        'temp': rng.normal(20, 5, rows).round(2),
+        'humidity': rng.integers(30, 100, rows),
+        'rainfall': rng.gamma(2, 3, rows).round(2),
+        'wind_speed': rng.normal(3, 1, rows).round(2),
+    })
+    df['target'] = (50 + 2 * df['temp'] + 0.3 * df['humidity'] - df['wind_speed']
+                    + df['Location'].str[-1].astype(int) + rng.normal(0, 2, rows)).round(3)
+    return df
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+class LoadTest:
+    """
+    Mixed open-loop traffic against a running API server.
+
+    With an arrival rate, requests arrive as a Poisson process and wait
+    for one of `concurrency` client threads, and latency is measured from
+    the scheduled arrival. That way a saturated server shows up as
+    growing latency instead of silently lower load. A rate of 0 runs
+    closed-loop, each thread sending its next request as soon as the
+    last one returns.
+    """
+
+    def __init__(self, scenario, base_url, seed=0):
+        self.scenario = scenario
+        self.base_url = base_url.rstrip('/')
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.result_ids = []
+        self.records = []
+
+    def request(self, method, path, data=None, files=None):
+        """(status code, response body); status 0 for connection errors"""
+        headers, body = {}, None
+        if files:
+            body, headers['Content-Type'] = _encode_multipart(data or {}, files)
+        elif data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(f'{self.base_url}{path}', data=body, headers=headers,
+                                         method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+        except OSError as e:
+            return 0, str(e).encode()
+
+    def setup(self):
+        """Build the dataset and train the results detail and predict traffic uses"""
+        options = self.scenario['dataset']
+        if options.get('path'):
+            import pandas as pd
+
+            self.frame = pd.read_csv(options['path'])
+        else:
+            self.frame = synthetic_dataset(options['rows'], options.get('seed', 0))
+        self.target = options.get('target', 'target')
+        self.csv = self.frame.to_csv(index=False).encode()
+        features = self.frame.drop(columns=[self.target]).head(100)
+        self.prediction_rows = json.loads(features.to_json(orient='records'))
+
+        code, body = self.request('POST', '/api/train/', {
+            'models': json.dumps(self.scenario['setup_models']),
+            'target_columns': json.dumps([self.target]),
+        }, files={'file': ('load-test.csv', self.csv)})
+        if code != 201:
+            raise RuntimeError(f"Setup training failed ({code}): {body[:500]!r}")
+        self.result_ids = [cell['id'] for cell in json.loads(body) if cell.get('id')]
+
+    def _upload_content(self):
+        if not self.scenario['unique_uploads']:
+            return self.csv
+        # One extra row with a random target gives each upload its own content hash
+        row = self.frame.head(1).copy()
+        row[self.target] = self.random.random()
+        return self.csv + row.to_csv(index=False, header=False).encode()
+
+    def send(self, entry):
+        """Issue one request for a mix entry; returns its status code"""
+        endpoint = entry['endpoint']
+        if endpoint == 'upload':
+            code, _ = self.request('POST', '/api/datasets/upload/',
+                                   files={'file': ('load-test.csv', self._upload_content())})
+        elif endpoint == 'train':
+            code, body = self.request('POST', '/api/train/', {
+                'models': json.dumps(entry.get('models', self.scenario['setup_models'])),
+                'target_columns': json.dumps([self.target]),
+                'job_id': f'load-{uuid.uuid4().hex}',
+                **{key: json.dumps(entry[key]) for key in ('quick_compare', 'feature_selection')
+                   if key in entry},
+            }, files={'file': ('load-test.csv', self._upload_content())})
+            if code == 201:
+                with self.lock:
+                    self.result_ids.extend(cell['id'] for cell in json.loads(body) if cell.get('id'))
+        elif endpoint == 'results_list':
+            code, _ = self.request('GET', '/api/results/')
+        elif endpoint == 'result_detail':
+            code, _ = self.request('GET', f'/api/results/{self.random.choice(self.result_ids)}/')
+        else:
+            start = self.random.randrange(len(self.prediction_rows))
+            rows = self.prediction_rows[start:start + entry.get('rows', 1)]
+            code, _ = self.request('POST', f'/api/results/{self.random.choice(self.result_ids)}/predict/',
+                                   {'rows': rows})
+        return code
+
+    def _pick(self):
+        mix = self.scenario['mix']
+        return self.random.choices(mix, weights=[entry.get('weight', 1) for entry in mix])[0]
+
+    def _execute(self, stage, entry, scheduled):
+        started = time.perf_counter()
+        code = self.send(entry)
+        finished = time.perf_counter()
+        with self.lock:
+            self.records.append({
+                'stage': stage, 'endpoint': entry['endpoint'], 'status': code,
+                'latency': finished - scheduled, 'service': finished - started,
+                'finished': finished,
+            })
+
+    def run_stage(self, stage, duration, arrival_rate):
+        concurrency = self.scenario['concurrency']
+        deadline = time.perf_counter() + duration
+
+        if not arrival_rate:
+            def closed_loop():
+                while time.perf_counter() < deadline:
+                    self._execute(stage, self._pick(), time.perf_counter())
+            threads = [threading.Thread(target=closed_loop) for _ in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return
+
+        arrivals = queue.Queue()
+
+        def client():
+            while (item := arrivals.get()) is not None:
+                self._execute(stage, *item)
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        scheduled = time.perf_counter()
+        while True:
+            scheduled += self.random.expovariate(arrival_rate)
+            if scheduled >= deadline:
+                break
+            time.sleep(max(0.0, scheduled - time.perf_counter()))
+            arrivals.put((self._pick(), scheduled))
+        for _ in threads:
+            arrivals.put(None)
+        for thread in threads:
+            thread.join()
+
+    def run(self, label=None):
+        """Run every stage and return the report"""
+        self.setup()
+        started_at = datetime.now(timezone.utc).isoformat()
+        stage_times = []
+        for index, stage in enumerate(self.scenario['stages']):
+            started = time.perf_counter()
+            self.run_stage(index, stage['duration_seconds'], stage.get('arrival_rate', 0))
+            stage_times.append(time.perf_counter() - started)
+        return build_report(self.scenario, self.records, stage_times, self.base_url,
+                            started_at, label)
+
+def _summarize(records, elapsed):
+    latencies = sorted(r['latency'] * 1000 for r in records)
+    service = sorted(r['service'] * 1000 for r in records)
+    statuses = {}
+    for r in records:
+        statuses[str(r['status'])] = statuses.get(str(r['status']), 0) + 1
+    errors = sum(1 for r in records if not 200 <= r['status'] < 400)
+    return {
+        'requests': len(records),
+        'errors': errors,
+        'error_rate': round(errors / len(records), 4) if records else 0,
+        'throughput_rps': round(len(records) / elapsed, 3) if elapsed else 0,
+        'latency_ms': {
+            **{f'p{p}': round(percentile(latencies, p), 2) for p in PERCENTILES},
+            'mean': round(sum(latencies) / len(latencies), 2),
+            'max': round(latencies[-1], 2),
+        },
+        'service_ms': {f'p{p}': round(percentile(service, p), 2) for p in PERCENTILES},
+        'status_codes': statuses,
+    }
+
+def build_report(scenario, records, stage_times, base_url, started_at, label=None):
+    """Per-stage, per-endpoint throughput, error rate and latency percentiles"""
+    stages = []
+    for index, (stage, elapsed) in enumerate(zip(scenario['stages'], stage_times)):
+        stage_records = [r for r in records if r['stage'] == index]
+        endpoints = {}
+        for endpoint in ENDPOINTS:
+            matching = [r for r in stage_records if r['endpoint'] == endpoint]
+            if matching:
+                endpoints[endpoint] = _summarize(matching, elapsed)
+        stages.append({
+            'arrival_rate': stage.get('arrival_rate', 0),
+            'duration_seconds': round(elapsed, 2),
+            'total': _summarize(stage_records, elapsed) if stage_records else None,
+            'endpoints': endpoints,
+        })
+    return {
+        'scenario': scenario['name'],
+        'label': label,
+        'base_url': base_url,
+        'started_at': started_at,
+        'concurrency': scenario['concurrency'],
+        'stages': stages,
+    }
+
+def format_report(report):
+    """Plain-text table of a report, one row per stage and endpoint"""
+    lines = [f"Scenario {report['scenario']}" + (f" ({report['label']})" if report['label'] else '')
+             + f" against {report['base_url']}, concurrency {report['concurrency']}",
+             f"{'stage':>5} {'rate':>6} {'endpoint':<14} {'reqs':>6} {'rps':>8} {'err%':>6} "
+             f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+    for index, stage in enumerate(report['stages']):
+        rows = list(stage['endpoints'].items())
+        if stage['total']:
+            rows.append(('all', stage['total']))
+        for endpoint, stats in rows:
+            latency = stats['latency_ms']
+            lines.append(f"{index:>5} {stage['arrival_rate']:>6} {endpoint:<14} {stats['requests']:>6} "
+                         f"{stats['throughput_rps']:>8.2f} {stats['error_rate'] * 100:>6.1f} "
+                         f"{latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f}")
+    return '\n'.join(lines)
+
+def compare_reports(report, baseline):
+    """Lines comparing p95 latency and throughput with a baseline run of the same scenario"""
+    lines = [f"Compared with {baseline.get('label') or baseline['started_at']}:"]
+    for index, (stage, base_stage) in enumerate(zip(report['stages'], baseline['stages'])):
+        for endpoint, stats in stage['endpoints'].items():
+            base = base_stage['endpoints'].get(endpoint)
+            if base is None:
+                continue
+            p95, base_p95 = stats['latency_ms']['p95'], base['latency_ms']['p95']
+            change = (p95 - base_p95) / base_p95 * 100 if base_p95 else 0.0
+            lines.append(f"  stage {index} {endpoint:<14} p95 {base_p95:.1f} -> {p95:.1f} ms "
+                         f"({change:+.0f}%), {base['throughput_rps']:.2f} -> "
+                         f"{stats['throughput_rps']:.2f} rps")
+    return '\n'.join(lines)
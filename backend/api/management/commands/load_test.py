@@ -0,0 +1,52 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from api.loadtest import LoadTest, compare_reports, format_report, load_scenario
+
+class Command(BaseCommand):
+    help = 'Run a load-test scenario of mixed API traffic against a running server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', nargs='?', default='mixed',
+                            help='Scenario name in backend/loadtest/ or path to a scenario JSON file')
+        parser.add_argument('--server', default='http://localhost:8000',
+                            help='Base URL of the server under test')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Client threads (overrides the scenario)')
+        parser.add_argument('--rate', type=float, default=None,
+                            help='Arrivals per second for every stage; 0 runs closed-loop')
+        parser.add_argument('--duration', type=float, default=None,
+                            help='Seconds of every stage (overrides the scenario)')
+        parser.add_argument('--label', default=None,
+                            help='Name of the server configuration or release under test')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default=None, help='Write the JSON report here')
+        parser.add_argument('--compare', default=None,
+                            help='JSON report of an earlier run to compare against')
+
+    def handle(self, *args, **options):
+        try:
+            scenario = load_scenario(options['scenario'])
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Could not load scenario {options['scenario']}: {e}")
+        if options['concurrency']:
+            scenario['concurrency'] = options['concurrency']
+        for stage in scenario['stages']:
+            if options['rate'] is not None:
+                stage['arrival_rate'] = options['rate']
+            if options['duration'] is not None:
+                stage['duration_seconds'] = options['duration']
+
+        self.stdout.write(f"Running {scenario['name']} against {options['server']}")
+        try:
+            report = LoadTest(scenario, options['server'], seed=options['seed']).run(options['label'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        self.stdout.write(format_report(report))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.stdout.write(compare_reports(report, json.load(f)))
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
@@ -0,0 +1,31 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.worker import BrokerClient, DatasetCache, Worker
+
+class Command(BaseCommand):
+    help = 'Run a training worker that pulls model x target tasks from a training server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', default=os.getenv('FLEET_SERVER_URL', 'http://localhost:8000'),
+                            help='Base URL of the training server')
+        parser.add_argument('--cache-dir', default=os.path.join(settings.MEDIA_ROOT, 'worker_cache'),
+                            help='Directory datasets are cached in, by content hash')
+        parser.add_argument('--worker-id', default=None,
+                            help='Name reported to the server (default: host-pid)')
+        parser.add_argument('--idle-seconds', type=float, default=2,
+                            help='Pause between claims while the queue is empty')
+
+    def handle(self, *args, **options):
+        if not settings.FLEET_WORKER_TOKEN:
+            raise CommandError('Set FLEET_WORKER_TOKEN to the token of the training server')
+        worker = Worker(
+            BrokerClient(options['server'], token=settings.FLEET_WORKER_TOKEN),
+            DatasetCache(options['cache_dir']),
+            worker_id=options['worker_id']
+        )
+        self.stdout.write(f"Worker {worker.worker_id} pulling tasks from {options['server']}")
+        try:
+            worker.run(idle_seconds=options['idle_seconds'])
+        except KeyboardInterrupt:
+            self.stdout.write('Worker stopped')
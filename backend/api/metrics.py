@@ -0,0 +1,254 @@
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Prometheus text exposition format served by /metrics
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from cached predictions up to whole training requests
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+FIT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_start_time = time.time()
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """
+    A metric family with fixed label names.
+
+    Updates take one lock and touch one dict entry, so they are cheap
+    enough for request and fit hot paths.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, **extra):
+        return {**dict(zip(self.labelnames, key)), **extra}
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, self._labels(key), value
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, self._labels(key), value
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = [(key, (list(counts), total, count))
+                      for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', self._labels(key, le=_format_value(bound)), cumulative
+            yield f'{self.name}_sum', self._labels(key), total
+            yield f'{self.name}_count', self._labels(key), count
+
+REGISTRY = []
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time to produce a response, by endpoint',
+    ['method', 'endpoint', 'status'])
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries issued while handling a request',
+    ['endpoint'], buckets=QUERY_COUNT_BUCKETS)
+FIT_DURATION = Histogram(
+    'training_fit_duration_seconds', 'Wall-clock time of one model x target fit',
+    ['model_type', 'dataset_rows'], buckets=FIT_BUCKETS)
+FITS = Counter(
+    'training_fits_total', 'Model x target fits by outcome', ['model_type', 'status'])
+FITS_IN_FLIGHT = Gauge('training_fits_in_flight', 'Fits currently running in this process')
+FITS_IN_FLIGHT.set(0)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Lookups of in-process and upload caches', ['cache', 'result'])
+ARTIFACT_LOAD = Histogram(
+    'artifact_load_seconds', 'Time to read and unpickle a stored artifact', ['kind'])
+
+def rows_label(rows):
+    """Order of magnitude of a row count, e.g. '1e4' for 10,000-99,999 rows"""
+    if not rows:
+        return 'unknown'
+    return f'1e{int(math.log10(rows))}'
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+def process_metrics():
+    """Resident memory, CPU time and open files of this process"""
+    families = []
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        families.append(('process_resident_memory_bytes', 'gauge',
+                         'Resident memory size in bytes', [({}, rss)]))
+    except (OSError, ValueError, IndexError):
+        import resource
+        import sys
+
+        # Peak rather than current RSS where /proc is unavailable; macOS reports bytes
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak *= 1 if sys.platform == 'darwin' else 1024
+        families.append(('process_max_resident_memory_bytes', 'gauge',
+                         'Peak resident memory size in bytes', [({}, peak)]))
+    times = os.times()
+    families.append(('process_cpu_seconds_total', 'counter', 'User and system CPU time spent',
+                     [({}, times.user + times.system)]))
+    families.append(('process_start_time_seconds', 'gauge', 'Start time of the process',
+                     [({}, _start_time)]))
+    try:
+        families.append(('process_open_fds', 'gauge', 'Open file descriptors',
+                         [({}, len(os.listdir('/proc/self/fd')))]))
+    except OSError:
+        pass
+    return families
+
+def render(*collectors):
+    """
+    All registered metrics plus those of the given collectors, as exposition text.
+
+    A collector returns (name, type, help, [(labels, value), ...]) families
+    computed at scrape time, for state that is cheaper to read than to track.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    for collector in (process_metrics, *collectors):
+        for name, kind, documentation, samples in collector():
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+def training_service_metrics():
+    """Queue depths and job state of the Django training service"""
+    from django.conf import settings
+    from .admission import admission_controller
+    from .batching import batcher_stats
+    from .progress import job_counts
+
+    admission = admission_controller.snapshot()
+    families = [
+        ('training_admission_running_jobs', 'gauge', 'Jobs holding a memory reservation',
+         [({}, admission['running_jobs'])]),
+        ('training_admission_queued_jobs', 'gauge', 'Jobs waiting for training capacity',
+         [({}, admission['queued_jobs'])]),
+        ('training_admission_reserved_megabytes', 'gauge', 'Memory reserved by running jobs',
+         [({}, admission['memory_reserved_mb'])]),
+        ('training_admission_budget_megabytes', 'gauge', 'Memory budget for training jobs',
+         [({}, admission['memory_budget_mb'])]),
+        ('training_jobs', 'gauge', 'Retained training jobs by status',
+         [({'status': job_status}, count) for job_status, count in job_counts().items()]),
+    ]
+
+    batchers = batcher_stats()
+    families.append(('prediction_batch_queue_depth', 'gauge',
+                     'Prediction requests waiting for a batch, by result',
+                     [({'result': key}, stats['queue_depth']) for key, stats in batchers.items()]))
+
+    if settings.TRAINING_EXECUTOR == 'fleet':
+        from django.db.models import Count
+        from .fleet import live_workers
+        from .models import TrainingTask
+
+        counts = dict(TrainingTask.objects.values_list('status').annotate(n=Count('id')))
+        families.append(('fleet_tasks', 'gauge', 'Fleet training tasks by status',
+                         [({'status': task_status}, counts.get(task_status, 0))
+                          for task_status, _ in TrainingTask.STATUS_CHOICES]))
+        families.append(('fleet_live_workers', 'gauge', 'Workers seen within one lease period',
+                         [({}, live_workers().count())]))
+    return families
@@ -0,0 +1,66 @@
+import time
+from django.db import connection
+from .metrics import REQUEST_LATENCY, REQUEST_QUERIES
+
+class _MeasuredStream:
+    """
+    Streaming content that counts database queries while it is consumed.
+
+    Streaming responses (event streams, exports) do their work while the
+    body is sent, after the view has returned; the measurement is recorded
+    once the response is closed.
+    """
+
+    def __init__(self, content, count_query, record):
+        self.content = content
+        self.count_query = count_query
+        self.record = record
+        self.recorded = False
+
+    def __iter__(self):
+        with connection.execute_wrapper(self.count_query):
+            yield from self.content
+
+    def close(self):
+        if not self.recorded:
+            self.recorded = True
+            self.record()
+
+class MetricsMiddleware:
+    """
+    Record each request's latency and database query count by endpoint.
+
+    Endpoints are labelled by URL name (or route pattern), never by the raw
+    path, so ids in URLs do not create new time series. Streaming responses
+    are measured until their body has been sent.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+
+        def record():
+            elapsed = time.perf_counter() - started
+            match = request.resolver_match
+            endpoint = (match.url_name or match.route) if match is not None else 'unmatched'
+            REQUEST_LATENCY.observe(elapsed, method=request.method, endpoint=endpoint,
+                                    status=response.status_code)
+            REQUEST_QUERIES.observe(queries, endpoint=endpoint)
+
+        if response.streaming and not response.is_async:
+            response.streaming_content = _MeasuredStream(response.streaming_content,
+                                                         count_query, record)
+        else:
+            record()
+        return response
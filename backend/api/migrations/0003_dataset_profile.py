@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-19 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_alter_mlmodel_options_alter_mlmodel_model_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='profile',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-19 18:39
+
+import api.estimators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_dataset_profile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mlmodel',
+            name='model_type',
+            field=models.CharField(choices=api.estimators.estimator_choices, max_length=50),
+        ),
+    ]
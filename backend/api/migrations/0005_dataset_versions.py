@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-19 18:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_mlmodel_registry_choices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='api.dataset'),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='version',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='trainingresult',
+            name='target_column',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
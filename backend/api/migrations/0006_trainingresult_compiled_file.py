@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-19 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_dataset_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingresult',
+            name='compiled_file',
+            field=models.FileField(blank=True, null=True, upload_to='trained_models/'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-19 18:49
+
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_dataset_content_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dataset',
+            name='profile',
+            field=models.JSONField(blank=True, encoder=api.models.CompactJSONEncoder, null=True),
+        ),
+        migrations.AlterField(
+            model_name='trainingresult',
+            name='feature_importance',
+            field=models.JSONField(blank=True, encoder=api.models.CompactJSONEncoder, null=True),
+        ),
+        migrations.AlterField(
+            model_name='trainingresult',
+            name='metrics',
+            field=models.JSONField(default=dict, encoder=api.models.CompactJSONEncoder),
+        ),
+    ]
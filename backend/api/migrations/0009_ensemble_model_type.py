@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-19 18:52
+
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_compact_json_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mlmodel',
+            name='model_type',
+            field=models.CharField(choices=api.models.model_choices, max_length=50),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-19 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_ensemble_model_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingresult',
+            name='predictions_file',
+            field=models.FileField(blank=True, null=True, upload_to='predictions/'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.2 on 2026-10-19 19:04
+
+import api.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_trainingresult_predictions_file'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FleetWorker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker_id', models.CharField(max_length=255, unique=True)),
+                ('cached_hashes', models.JSONField(default=list)),
+                ('last_seen', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrainingTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(db_index=True, max_length=64)),
+                ('dataset_hash', models.CharField(db_index=True, max_length=64)),
+                ('target_column', models.CharField(max_length=255)),
+                ('time_limit', models.FloatField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled'), ('timed_out', 'Timed out')], db_index=True, default='pending', max_length=20)),
+                ('worker_id', models.CharField(blank=True, default='', max_length=255)),
+                ('attempts', models.IntegerField(default=0)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('model_info', models.JSONField(blank=True, encoder=api.models.CompactJSONEncoder, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.dataset')),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.mlmodel')),
+                ('result', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.trainingresult')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+            },
+        ),
+    ]
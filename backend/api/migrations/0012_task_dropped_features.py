@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-19 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_training_tasks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingtask',
+            name='dropped_features',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
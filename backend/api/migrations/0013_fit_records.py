@@ -0,0 +1,26 @@
+# Generated by Django 5.0.2 on 2026-10-19 19:46
+
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_task_dropped_features'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FitRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_type', models.CharField(db_index=True, max_length=50)),
+                ('hyperparameters', models.JSONField(default=dict, encoder=api.models.CompactJSONEncoder)),
+                ('n_rows', models.IntegerField()),
+                ('n_features', models.IntegerField()),
+                ('fit_seconds', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -1,39 +1,274 @@
+import copy
+import os
+import time
 import pandas as pd
 import numpy as np
+from sklearn.base import clone
 from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.svm import SVR
-from sklearn.neighbors import KNeighborsRegressor
-from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.preprocessing import StandardScaler
 from sklearn.impute import SimpleImputer
-import xgboost as xgb
 from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import OneHotEncoder
-from sklearn.inspection import permutation_importance
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
+from .encoding import (
+    HIGH_CARDINALITY_THRESHOLD,
+    DatetimeFeatures,
+    make_high_cardinality_encoder,
+    plan_encodings,
+)
+from .estimators import get_estimator_spec
+from .fitting import TrainingInterrupted
+from .profiling import profile_dataframe
+from .scoring import BOOTSTRAP_RESAMPLES, bootstrap_intervals
+
+# Number of progress updates reported while fitting iterative models
+PROGRESS_STEPS = 10
+
+# Every training call holds out the same rows, so stored models can be
+# compared and blended on their common out-of-sample split
+TEST_SIZE = 0.2
+SPLIT_RANDOM_STATE = 42
+
+# Bins histogram-based models use by default; native categorical columns
+# must have fewer distinct values than the model's max_bins
+DEFAULT_MAX_BINS = 255
+
+# Target quantile bins subsamples are stratified on
+STRATIFY_BINS = 10
+# Holdout rows used to score subsample fits
+SUBSAMPLE_VALIDATION_SIZE = 5000
+
+# Training-set fractions evaluated by ModelTrainer.learning_curve
+LEARNING_CURVE_FRACTIONS = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+
+_xgboost_progress_class = None
+
+def xgboost_progress_callback(report, total_iterations, should_stop=None):
+    """
+    Build an xgboost callback reporting boosting rounds, importing xgboost lazily.
+
+    Boosting ends early once should_stop() returns a truthy value.
+    """
+    global _xgboost_progress_class
+    if _xgboost_progress_class is None:
+        import xgboost as xgb
+
+        class XGBoostProgress(xgb.callback.TrainingCallback):
+            def __init__(self, report, total_iterations, should_stop):
+                super().__init__()
+                self.report = report
+                self.total_iterations = total_iterations
+                self.should_stop = should_stop
+                self.every = max(1, total_iterations // PROGRESS_STEPS)
+
+            def after_iteration(self, model, epoch, evals_log):
+                iteration = epoch + 1
+                if iteration % self.every == 0 or iteration == self.total_iterations:
+                    self.report('iteration', iteration=iteration,
+                                total_iterations=self.total_iterations)
+                return bool(self.should_stop and self.should_stop())
+
+        _xgboost_progress_class = XGBoostProgress
+    return _xgboost_progress_class(report, total_iterations, should_stop)
+
+def load_dataset(dataset_path):
+    """
+    Read a CSV, or concatenate the segments of an appended dataset version.
+
+    An already loaded DataFrame (a fleet worker's cached copy) is used as is;
+    training never modifies it in place.
+    """
+    if isinstance(dataset_path, pd.DataFrame):
+        return dataset_path
+    if isinstance(dataset_path, (list, tuple)):
+        return pd.concat([pd.read_csv(path) for path in dataset_path], ignore_index=True)
+    return pd.read_csv(dataset_path)
+
+def split_dataset(X, y):
+    return train_test_split(X, y, test_size=TEST_SIZE, random_state=SPLIT_RANDOM_STATE)
+
+def stratified_sample(y, n_samples, bins=STRATIFY_BINS):
+    """
+    Sorted positions of n_samples rows of y, stratified on target quantile bins.
+
+    Every part of the target's range is represented in proportion, so a
+    small subsample ranks regression models much like the full data does.
+    """
+    if n_samples >= len(y) - bins:
+        return np.arange(len(y))
+    strata = pd.qcut(pd.Series(y).rank(method='first'), q=bins, labels=False)
+    positions, _ = train_test_split(np.arange(len(y)), train_size=n_samples, stratify=strata,
+                                    random_state=SPLIT_RANDOM_STATE)
+    return np.sort(positions)
+
+def holdout_split(dataset_path, target_column):
+    """The held-out rows train_and_evaluate scores a model on, as (X_test, y_test)"""
+    df = load_dataset(dataset_path).dropna(subset=[target_column])
+    X = df.drop(columns=[target_column])
+    _, X_test, _, y_test = split_dataset(X, df[target_column])
+    return X_test, y_test
+
+def regression_metrics(y_true, y_pred):
+    mse = mean_squared_error(y_true, y_pred)
+    return {
+        'r2_score': float(r2_score(y_true, y_pred)),
+        'mse': float(mse),
+        'mae': float(mean_absolute_error(y_true, y_pred)),
+        'rmse': float(np.sqrt(mse))
+    }
+
+def incremental_linear_fits(X, y, sizes, fit_intercept=True):
+    """
+    Least-squares fits on the prefixes X[:n] for each n in sizes.
+
+    Running sums of X'X and X'y are extended by each new block of rows, so
+    the whole curve costs one pass over the data plus one small solve per
+    size. Yields (n, coef, intercept).
+    """
+    n_features = X.shape[1]
+    xtx = np.zeros((n_features, n_features))
+    xty = np.zeros(n_features)
+    sum_x = np.zeros(n_features)
+    sum_y = 0.0
+    done = 0
+    for n in sizes:
+        block_x, block_y = X[done:n], y[done:n]
+        xtx += block_x.T @ block_x
+        xty += block_x.T @ block_y
+        sum_x += block_x.sum(axis=0)
+        sum_y += block_y.sum()
+        done = n
+
+        if fit_intercept:
+            mean_x, mean_y = sum_x / n, sum_y / n
+            gram = xtx - n * np.outer(mean_x, mean_x)
+            cross = xty - n * mean_x * mean_y
+        else:
+            gram, cross = xtx, xty
+        # Minimum-norm solution, like LinearRegression, when columns are collinear
+        coef = np.linalg.lstsq(gram, cross, rcond=1e-10)[0]
+        intercept = mean_y - mean_x @ coef if fit_intercept else 0.0
+        yield n, coef, intercept
 
 class ModelTrainer:
-    def __init__(self, dataset_path, target_column, model_type, hyperparameters):
+    def __init__(self, dataset_path, target_column, model_type, hyperparameters, profile=None,
+                 cardinality_threshold=HIGH_CARDINALITY_THRESHOLD,
+                 high_cardinality_encoder='frequency', progress_callback=None,
+                 warm_start_from=None, should_stop=None, dropped_features=None,
+                 bootstrap_resamples=BOOTSTRAP_RESAMPLES):
         self.dataset_path = dataset_path
         self.target_column = target_column
         self.model_type = model_type
-        if model_type == 'linear_regression':
-            self.hyperparameters = {k: v for k, v in hyperparameters.items() 
-                                  if k not in ['normalize']}
+        self.profile = profile
+        self.cardinality_threshold = cardinality_threshold
+        self.high_cardinality_encoder = high_cardinality_encoder
+        self.progress_callback = progress_callback
+        self.hyperparameters = hyperparameters
+        # A fitted pipeline of the same model type to continue training from
+        self.warm_start_from = warm_start_from
+        # Returns 'cancelled' or 'timed_out' when the fit should stop early
+        self.should_stop = should_stop
+        # Prepared data and split reused by subsample_score
+        self._subsample_data = None
+        # Columns the feature-selection stage left out, mapped to why
+        self.dropped_features = dropped_features or {}
+        # Resamples behind the metrics' confidence intervals; 0 skips them
+        self.bootstrap_resamples = bootstrap_resamples
+
+    def _report(self, event, **data):
+        if self.progress_callback is not None:
+            self.progress_callback(event, **data)
+
+    def _check_stop(self):
+        status = self.should_stop() if self.should_stop is not None else None
+        if status:
+            raise TrainingInterrupted(status)
+
+    def _warm_start_fit(self, pipeline, X_train, y_train):
+        """
+        Continue training the previous pipeline's model on new rows.
+
+        The previous preprocessor is reused unchanged so the new trees see
+        the same feature space as the old ones.
+        """
+        previous = self.warm_start_from
+        preprocessor = previous.named_steps['preprocessor']
+        model = copy.deepcopy(previous.named_steps['regressor'])
+        X_transformed = preprocessor.transform(X_train)
+
+        if self.model_type == 'random_forest':
+            # Add this config's number of trees, fitted on the new rows only
+            extra = self.hyperparameters.get('n_estimators', 100)
+            model.set_params(warm_start=True, n_estimators=model.n_estimators + extra)
+            model.fit(X_transformed, y_train)
+            model.set_params(warm_start=False)
+        elif self.model_type == 'xgboost':
+            # Further boosting rounds on top of the existing booster
+            model.fit(X_transformed, y_train, xgb_model=model.get_booster())
+        else:
+            raise ValueError(f"Model type {self.model_type} does not support warm starts")
+
+        pipeline.steps = [('preprocessor', preprocessor), ('regressor', model)]
+
+    def _fit(self, pipeline, X_train, y_train):
+        """
+        Fit the pipeline, reporting iteration progress for ensemble models.
+
+        Forests and boosted trees are also checked for cancellation between
+        chunks of trees and boosting rounds.
+        """
+        model = pipeline.named_steps['regressor']
+        if self.warm_start_from is not None:
+            self._warm_start_fit(pipeline, X_train, y_train)
+        elif self.progress_callback is None and self.should_stop is None:
+            pipeline.fit(X_train, y_train)
+        elif self.model_type == 'xgboost':
+            total = model.get_params().get('n_estimators') or 100
+            model.set_params(callbacks=[
+                xgboost_progress_callback(self._report, total, self.should_stop)])
+            try:
+                pipeline.fit(X_train, y_train)
+            finally:
+                # Keep the fitted pipeline picklable
+                model.set_params(callbacks=None)
+            # A stop request ends boosting early; the partial model is discarded
+            self._check_stop()
+        elif self.model_type == 'random_forest':
+            # Grow the forest in chunks with warm_start; with a fixed
+            # random_state this builds exactly the same trees as one fit
+            X_transformed = pipeline.named_steps['preprocessor'].fit_transform(X_train, y_train)
+            total = model.get_params()['n_estimators']
+            warm_start = model.get_params()['warm_start']
+            step = max(1, total // PROGRESS_STEPS)
+            model.set_params(warm_start=True)
+            for n_estimators in range(step, total + step, step):
+                n_estimators = min(n_estimators, total)
+                model.set_params(n_estimators=n_estimators)
+                model.fit(X_transformed, y_train)
+                self._report('iteration', iteration=n_estimators, total_iterations=total)
+                self._check_stop()
+                if n_estimators == total:
+                    break
+            model.set_params(warm_start=warm_start)
         else:
-            self.hyperparameters = hyperparameters
+            pipeline.fit(X_train, y_train)
         
-    def train_and_evaluate(self):
+    def _prepare(self):
+        """Load and clean the data and build the (unfitted) preprocessor"""
         # Load data
-        df = pd.read_csv(self.dataset_path)
+        self._report('model_stage', stage='loading')
+        df = load_dataset(self.dataset_path)
+        
+        # Reuse the upload-time profile when available instead of rescanning
+        profile = self.profile
+        if not profile or set(profile.get('columns', {})) != set(df.columns):
+            profile = profile_dataframe(df)
+        missing_values = {col: info['null_count'] for col, info in profile['columns'].items()}
         
         # Print data info for debugging
-        print("\nDataset Info:")
-        print(df.info())
         print("\nMissing Values:")
-        print(df.isnull().sum())
+        print(missing_values)
 
         # Drop rows where target column is null
         df_clean = df.dropna(subset=[self.target_column])
@@ -42,16 +277,41 @@ class ModelTrainer:
         if len(df_clean) < 50:  # You can adjust this threshold
             raise ValueError(f"Insufficient data after cleaning. Only {len(df_clean)} samples available.")
         
-        # Prepare features and target
-        X = df_clean.drop(columns=[self.target_column])
+        # Prepare features and target, leaving out deselected columns
+        dropped = [col for col in self.dropped_features
+                   if col in df_clean.columns and col != self.target_column]
+        if dropped:
+            print("Dropped features:", dropped)
+        X = df_clean.drop(columns=[self.target_column, *dropped])
         y = df_clean[self.target_column]
         
-        # Identify numeric and categorical columns
-        numeric_features = X.select_dtypes(include=['int64', 'float64']).columns
-        categorical_features = X.select_dtypes(include=['object', 'category']).columns
+        # Identify numeric and categorical columns from the profile
+        numeric_features = pd.Index([col for col in X.columns
+                                     if profile['columns'][col]['kind'] == 'numeric'])
+        categorical_features = pd.Index([col for col in X.columns
+                                         if profile['columns'][col]['kind'] == 'categorical'])
+        
+        # Models with native categorical support take every column that fits
+        # in their bins as is; only wider ones fall back to the high-cardinality encoder
+        native = get_estimator_spec(self.model_type).native_categorical
+        cardinality_threshold = self.cardinality_threshold
+        if native:
+            cardinality_threshold = self.hyperparameters.get('max_bins', DEFAULT_MAX_BINS) - 1
+
+        # Decide how each categorical column is encoded
+        encodings = plan_encodings(
+            X, categorical_features, profile=profile,
+            cardinality_threshold=cardinality_threshold,
+            high_cardinality_encoder=self.high_cardinality_encoder
+        )
+        onehot_features = [col for col in categorical_features if encodings[col] == 'onehot']
+        datetime_features = [col for col in categorical_features if encodings[col] == 'datetime']
+        high_cardinality_features = [col for col in categorical_features
+                                     if encodings[col] == self.high_cardinality_encoder]
         
         print("\nNumeric features:", numeric_features.tolist())
         print("Categorical features:", categorical_features.tolist())
+        print("Encodings:", encodings)
         
         # Create preprocessing pipelines for both numeric and categorical data
         numeric_transformer = Pipeline(steps=[
@@ -64,31 +324,88 @@ class ModelTrainer:
             ('onehot', OneHotEncoder(drop='first', sparse_output=False, handle_unknown='ignore'))
         ])
         
+        datetime_transformer = Pipeline(steps=[
+            ('expand', DatetimeFeatures()),
+            ('imputer', SimpleImputer(strategy='mean')),
+            ('scaler', StandardScaler())
+        ])
+        
+        high_cardinality_transformer = Pipeline(steps=[
+            ('imputer', SimpleImputer(strategy='constant', fill_value='missing')),
+            ('encoder', make_high_cardinality_encoder(self.high_cardinality_encoder)),
+            ('scaler', StandardScaler())
+        ])
+        
+        categorical_indices = []
+        if native:
+            # Missing values and category codes go to the model untouched;
+            # unseen categories are treated as missing
+            numeric_transformer = 'passthrough'
+            categorical_transformer = OrdinalEncoder(
+                handle_unknown='use_encoded_value', unknown_value=np.nan,
+                encoded_missing_value=np.nan
+            )
+            datetime_transformer = DatetimeFeatures()
+            categorical_indices = list(range(len(numeric_features),
+                                             len(numeric_features) + len(onehot_features)))
+            encodings = {col: 'native' if encoding == 'onehot' else encoding
+                         for col, encoding in encodings.items()}
+
         # Combine preprocessing steps
         preprocessor = ColumnTransformer(
             transformers=[
                 ('num', numeric_transformer, numeric_features),
-                ('cat', categorical_transformer, categorical_features)
-            ])
+                ('cat', categorical_transformer, onehot_features),
+                ('date', datetime_transformer, datetime_features),
+                ('high_card', high_cardinality_transformer, high_cardinality_features)
+            ],
+            verbose_feature_names_out=False)
+
+        return {
+            'df': df,
+            'df_clean': df_clean,
+            'X': X,
+            'y': y,
+            'missing_values': missing_values,
+            'numeric_features': numeric_features,
+            'categorical_features': categorical_features,
+            'encodings': encodings,
+            'cardinality_threshold': cardinality_threshold,
+            'preprocessor': preprocessor,
+            # Output columns holding ordinal-coded categories, for native models
+            'categorical_indices': categorical_indices,
+        }
+
+    def _create_model(self, data):
+        """A fresh estimator for this trainer's model type and the prepared columns"""
+        spec = get_estimator_spec(self.model_type)
+        model = spec.create(self.hyperparameters)
+        if spec.native_categorical:
+            model.set_params(categorical_features=data['categorical_indices'] or None)
+        return model
+
+    def train_and_evaluate(self):
+        started = time.perf_counter()
+        data = self._prepare()
+        df, df_clean, X, y = data['df'], data['df_clean'], data['X'], data['y']
+        missing_values = data['missing_values']
+        numeric_features = data['numeric_features']
+        categorical_features = data['categorical_features']
+        encodings = data['encodings']
+        preprocessor = data['preprocessor']
         
         # Split data
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        X_train, X_test, y_train, y_test = split_dataset(X, y)
+        # Kept for callers that check exported artifacts against the held-out rows
+        self.X_test, self.y_test = X_test, y_test
         print(f"\nTraining set size: {len(X_train)}")
         print(f"Test set size: {len(X_test)}")
         
-        # Create and train model based on type
-        if self.model_type == 'linear_regression':
-            model = LinearRegression(**self.hyperparameters)
-        elif self.model_type == 'random_forest':
-            model = RandomForestRegressor(**self.hyperparameters)
-        elif self.model_type == 'knn':
-            model = KNeighborsRegressor(**self.hyperparameters)
-        elif self.model_type == 'svr':
-            model = SVR(**self.hyperparameters)
-        elif self.model_type == 'xgboost':
-            model = xgb.XGBRegressor(**self.hyperparameters)
-        else:
-            raise ValueError(f"Unsupported model type: {self.model_type}")
+        # Create the model from the registry; the estimator class is imported on first use
+        spec = get_estimator_spec(self.model_type)
+        model = self._create_model(data)
+        if self.warm_start_from is not None and not spec.supports_warm_start:
+            raise ValueError(f"Model type {self.model_type} does not support warm starts")
         
         # Create a pipeline with preprocessing and model
         pipeline = Pipeline([
@@ -97,36 +414,52 @@ class ModelTrainer:
         ])
         
         # Train model
-        pipeline.fit(X_train, y_train)
+        self._check_stop()
+        self._report('model_stage', stage='fitting')
+        self._fit(pipeline, X_train, y_train)
+        self._check_stop()
+        # A warm start swaps in the previously fitted steps
+        preprocessor = pipeline.named_steps['preprocessor']
+        model = pipeline.named_steps['regressor']
         
         # Make predictions
+        self._report('model_stage', stage='evaluating')
         y_pred = pipeline.predict(X_test)
+        self.y_pred = y_pred
         
         # Calculate metrics
-        metrics = {
-            'r2_score': float(r2_score(y_test, y_pred)),
-            'mse': float(mean_squared_error(y_test, y_pred)),
-            'mae': float(mean_absolute_error(y_test, y_pred)),
-            'rmse': float(np.sqrt(mean_squared_error(y_test, y_pred)))
-        }
+        metrics = regression_metrics(y_test, y_pred)
         
         print("\nModel Performance Metrics:")
         for metric, value in metrics.items():
             print(f"{metric}: {value}")
+        if self.bootstrap_resamples:
+            # How much each metric could move on another draw of the holdout rows
+            metrics['confidence_intervals'] = bootstrap_intervals(
+                y_test, y_pred, n_resamples=self.bootstrap_resamples)
+            print("Confidence intervals:", metrics['confidence_intervals'])
+        
+        # Names of the columns the regressor actually sees
+        encoded_feature_names = preprocessor.get_feature_names_out().tolist()
         
         # Create model info first
         model_info = {
             'n_features': X.shape[1],
+            'n_encoded_features': len(encoded_feature_names),
             'n_samples_train': X_train.shape[0],
             'n_samples_test': X_test.shape[0],
             'feature_names': X.columns.tolist(),
+            'dropped_features': self.dropped_features,
             'numeric_features': numeric_features.tolist(),
             'categorical_features': categorical_features.tolist(),
-            'missing_values': df.isnull().sum().to_dict(),
+            'encodings': encodings,
+            'warm_started': self.warm_start_from is not None,
+            'cardinality_threshold': data['cardinality_threshold'],
+            'missing_values': missing_values,
             'total_samples': len(df),
             'samples_after_cleaning': len(df_clean),
             'dropped_samples': len(df) - len(df_clean),
-            'missing_values_before_cleaning': df.isnull().sum().to_dict(),
+            'missing_values_before_cleaning': missing_values,
             'missing_values_after_cleaning': df_clean.isnull().sum().to_dict(),
             'feature_importance_method': 'feature_importances_' if hasattr(model, 'feature_importances_') 
                                       else 'coefficients' if hasattr(pipeline.named_steps['regressor'], 'coef_')
@@ -135,22 +468,18 @@ class ModelTrainer:
         }
 
         # Get feature importance for models that support it
+        self._check_stop()
+        self._report('model_stage', stage='feature_importance')
         feature_importance = {}
         if hasattr(model, 'feature_importances_'):
             try:
                 # Get feature names after preprocessing
-                feature_names = (numeric_features.tolist() + 
-                               [f"{feature}_{val}" for feature, vals in 
-                                zip(categorical_features,
-                                    pipeline.named_steps['preprocessor']
-                                    .named_transformers_['cat']
-                                    .named_steps['onehot'].categories_)
-                                for val in vals[1:]])
+                feature_names = encoded_feature_names
                 
                 # Get feature importances
                 importances = model.feature_importances_
                 if len(importances) == len(feature_names):
-                    feature_importance = dict(zip(feature_names, importances))
+                    feature_importance = dict(zip(feature_names, importances.astype(float)))
                 print("\nUsing feature_importances_ method")
             except Exception as e:
                 print(f"Error calculating feature importance from feature_importances_: {str(e)}")
@@ -160,20 +489,14 @@ class ModelTrainer:
         elif hasattr(pipeline.named_steps['regressor'], 'coef_'):
             try:
                 # Get feature names after preprocessing
-                feature_names = (numeric_features.tolist() + 
-                               [f"{feature}_{val}" for feature, vals in 
-                                zip(categorical_features,
-                                    pipeline.named_steps['preprocessor']
-                                    .named_transformers_['cat']
-                                    .named_steps['onehot'].categories_)
-                                for val in vals[1:]])
+                feature_names = encoded_feature_names
                 
                 # Get coefficients and normalize them
                 coefficients = np.abs(pipeline.named_steps['regressor'].coef_)
                 normalized_coefficients = coefficients / np.sum(coefficients)
                 
                 if len(normalized_coefficients) == len(feature_names):
-                    feature_importance = dict(zip(feature_names, normalized_coefficients))
+                    feature_importance = dict(zip(feature_names, normalized_coefficients.astype(float)))
                     
                     # Add intercept if it exists
                     if hasattr(pipeline.named_steps['regressor'], 'intercept_'):
@@ -188,6 +511,8 @@ class ModelTrainer:
         # For models that support permutation importance
         elif hasattr(model, 'predict'):
             try:
+                from sklearn.inspection import permutation_importance
+
                 # Calculate permutation importance
                 r = permutation_importance(
                     pipeline, X_test, y_test,
@@ -225,7 +550,9 @@ class ModelTrainer:
             'has_coef': hasattr(pipeline.named_steps['regressor'], 'coef_'),
             'has_feature_importances': hasattr(model, 'feature_importances_'),
             'has_predict': hasattr(model, 'predict'),
-            'model_type': self.model_type
+            'model_type': self.model_type,
+            # Loading to importances, as recorded for the runtime estimator
+            'fit_seconds': round(time.perf_counter() - started, 4)
         })
 
         # Prepare scatter data
@@ -234,4 +561,130 @@ class ModelTrainer:
             'predicted': y_pred.tolist()
         }
         
-        return pipeline, metrics, feature_importance, scatter_data, model_info
\ No newline at end of file
+        return pipeline, metrics, feature_importance, scatter_data, model_info
+
+    def learning_curve(self, fractions=LEARNING_CURVE_FRACTIONS, n_jobs=None):
+        """
+        Train and validation metrics for nested subsamples of the training split.
+
+        Every size shares one split and one preprocessor fit, and the
+        subsamples are prefixes of a single shuffled order so each one
+        contains the smaller ones. Linear regression is solved
+        incrementally from running sums; other models are fitted per size
+        in parallel threads.
+        """
+        data = self._prepare()
+        X_train, X_test, y_train, y_test = split_dataset(data['X'], data['y'])
+
+        self._report('model_stage', stage='preprocessing')
+        preprocessor = data['preprocessor']
+        # fit_transform keeps target encodings of training rows out-of-fold
+        Xt_train = np.asarray(preprocessor.fit_transform(X_train, y_train), dtype=float)
+        Xt_test = np.asarray(preprocessor.transform(X_test), dtype=float)
+        y_train = y_train.to_numpy(dtype=float)
+        y_test = y_test.to_numpy(dtype=float)
+
+        order = np.random.default_rng(42).permutation(len(y_train))
+        Xt_train, y_train = Xt_train[order], y_train[order]
+        n_train = len(y_train)
+        sizes = sorted({min(n_train, max(2, int(round(f * n_train)))) for f in fractions})
+
+        def point(n, predict_train, predict_test, fit_seconds):
+            return {
+                'fraction': round(n / n_train, 4),
+                'n_samples': n,
+                'train': regression_metrics(y_train[:n], predict_train),
+                'validation': regression_metrics(y_test, predict_test),
+                'fit_seconds': round(fit_seconds, 4)
+            }
+
+        incremental = self.model_type == 'linear_regression'
+        self._report('model_stage', stage='fitting')
+        if incremental:
+            points = []
+            fit_intercept = self.hyperparameters.get('fit_intercept', True)
+            started = time.perf_counter()
+            for n, coef, intercept in incremental_linear_fits(Xt_train, y_train, sizes, fit_intercept):
+                points.append(point(n, Xt_train[:n] @ coef + intercept, Xt_test @ coef + intercept,
+                                    time.perf_counter() - started))
+                started = time.perf_counter()
+        else:
+            from joblib import Parallel, delayed
+
+            def fit_size(n):
+                started = time.perf_counter()
+                try:
+                    model = self._create_model(data)
+                    model.fit(Xt_train[:n], y_train[:n])
+                except Exception as e:
+                    # e.g. fewer rows than n_neighbors at the smallest sizes
+                    return {'fraction': round(n / n_train, 4), 'n_samples': n, 'error': str(e)}
+                fit_seconds = time.perf_counter() - started
+                return point(n, model.predict(Xt_train[:n]), model.predict(Xt_test), fit_seconds)
+
+            n_jobs = n_jobs or min(len(sizes), os.cpu_count() or 1)
+            points = Parallel(n_jobs=n_jobs, prefer='threads')(delayed(fit_size)(n) for n in sizes)
+
+        return {
+            'model_type': self.model_type,
+            'target_column': self.target_column,
+            'n_train': n_train,
+            'n_validation': len(y_test),
+            'incremental': incremental,
+            'points': points
+        }
+
+    def prepare_subsamples(self, validation_size=SUBSAMPLE_VALIDATION_SIZE):
+        """Prepare and split the data subsample_score fits on, once per trainer"""
+        if self._subsample_data is None:
+            data = self._prepare()
+            X_train, X_test, y_train, y_test = split_dataset(data['X'], data['y'])
+            self._subsample_data = (data, X_train, y_train,
+                                    X_test.iloc[:validation_size], y_test.iloc[:validation_size])
+
+    def subsample_trainer(self, n_samples, validation_size=SUBSAMPLE_VALIDATION_SIZE):
+        """
+        A copy of this trainer holding only a stratified sample of n_samples
+        training rows and the validation rows.
+
+        The data is prepared here, once per trainer; fitting the copy in a
+        worker process ships just the sampled rows, and its subsample_score
+        neither reloads nor re-prepares the dataset.
+        """
+        self.prepare_subsamples(validation_size)
+        data, X_train, y_train, X_val, y_val = self._subsample_data
+        positions = stratified_sample(y_train, n_samples)
+        trainer = copy.copy(self)
+        trainer.dataset_path = None
+        trainer._subsample_data = (
+            {key: data[key] for key in ('preprocessor', 'categorical_indices')},
+            X_train.iloc[positions], y_train.iloc[positions], X_val, y_val
+        )
+        return trainer
+
+    def release_subsamples(self):
+        """Drop the prepared data of subsample_score, e.g. once the config is eliminated"""
+        self._subsample_data = None
+
+    def subsample_score(self, n_samples, validation_size=SUBSAMPLE_VALIDATION_SIZE):
+        """
+        Holdout metrics of a fit on a stratified sample of n_samples training rows.
+
+        Quick comparisons use this to rank configs cheaply. The data is
+        prepared and split once per trainer, so larger samples of the same
+        trainer skip loading and planning; fits in worker processes run on
+        a subsample_trainer. Returns (metrics, fit_seconds).
+        """
+        self.prepare_subsamples(validation_size)
+        data, X_train, y_train, X_val, y_val = self._subsample_data
+
+        positions = stratified_sample(y_train, n_samples)
+        pipeline = Pipeline([
+            ('preprocessor', clone(data['preprocessor'])),
+            ('regressor', self._create_model(data))
+        ])
+        self._check_stop()
+        started = time.perf_counter()
+        self._fit(pipeline, X_train.iloc[positions], y_train.iloc[positions])
+        fit_seconds = time.perf_counter() - started
+        return regression_metrics(y_val, pipeline.predict(X_val)), round(fit_seconds, 4)
@@ -1,6 +1,15 @@
 import os
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from .estimators import estimator_choices
+
+class CompactJSONEncoder(DjangoJSONEncoder):
+    """Serialize JSON fields without the whitespace json.dumps adds by default"""
+
+    def __init__(self, *args, **kwargs):
+        kwargs['separators'] = (',', ':')
+        super().__init__(*args, **kwargs)
 
 class Dataset(models.Model):
     name = models.CharField(max_length=255)
@@ -8,18 +17,45 @@ class Dataset(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     columns = models.JSONField(null=True, blank=True)
     row_count = models.IntegerField(null=True, blank=True)
+    profile = models.JSONField(null=True, blank=True, encoder=CompactJSONEncoder)
+    # SHA-256 of the uploaded file; identical uploads share one stored blob
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    # Appended versions store only their new rows and point at the version they extend
+    parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE,
+                               related_name='children')
+    version = models.IntegerField(default=1)
     
     def __str__(self):
         return self.name
 
+    def segment_files(self):
+        """Files holding this version's rows, oldest segment first"""
+        segments = []
+        dataset = self
+        while dataset is not None:
+            segments.append(dataset.file)
+            dataset = dataset.parent
+        return segments[::-1]
+
+    def segment_paths(self):
+        return [segment.path for segment in self.segment_files()]
+
+    def lineage(self):
+        """This version and every version it was appended to"""
+        versions = []
+        dataset = self
+        while dataset is not None:
+            versions.append(dataset)
+            dataset = dataset.parent
+        return versions
+
+def model_choices():
+    """Registered estimators, plus ensembles blended from stored results"""
+    return estimator_choices() + [('ensemble', 'Stacked Ensemble')]
+
 class MLModel(models.Model):
-    MODEL_CHOICES = [
-        ('linear_regression', 'Linear Regression'),
-        ('random_forest', 'Random Forest'),
-        ('knn', 'K-Nearest Neighbors'),
-        ('svr', 'Support Vector Regression'),
-        ('xgboost', 'XGBoost'),
-    ]
+    # Evaluated lazily so model types registered at runtime are accepted too
+    MODEL_CHOICES = model_choices
     
     name = models.CharField(max_length=255)
     model_type = models.CharField(max_length=50, choices=MODEL_CHOICES)
@@ -35,10 +71,73 @@ class MLModel(models.Model):
 class TrainingResult(models.Model):
     dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE)
     model = models.ForeignKey(MLModel, on_delete=models.CASCADE)
-    metrics = models.JSONField(default=dict)
-    feature_importance = models.JSONField(null=True, blank=True)
+    target_column = models.CharField(max_length=255, blank=True, default='')
+    metrics = models.JSONField(default=dict, encoder=CompactJSONEncoder)
+    feature_importance = models.JSONField(null=True, blank=True, encoder=CompactJSONEncoder)
     model_file = models.FileField(upload_to='trained_models/', null=True)
+    # NumPy-only predictor compiled from model_file, when the pipeline supports it
+    compiled_file = models.FileField(upload_to='trained_models/', null=True, blank=True)
+    # Holdout row indices, targets and predictions (.npz) for recomputing metrics
+    predictions_file = models.FileField(upload_to='predictions/', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"{self.model.name} on {self.dataset.name}" 
\ No newline at end of file
+        return f"{self.model.name} on {self.dataset.name}" 
+class TrainingTask(models.Model):
+    """One model x target cell of a training job, queued for fleet workers"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+        ('timed_out', 'Timed out'),
+    ]
+
+    job_id = models.CharField(max_length=64, db_index=True)
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE)
+    # Copy of dataset.content_hash so claims can match worker caches cheaply
+    dataset_hash = models.CharField(max_length=64, db_index=True)
+    model = models.ForeignKey(MLModel, on_delete=models.CASCADE)
+    target_column = models.CharField(max_length=255)
+    time_limit = models.FloatField(null=True, blank=True)
+    # Columns the feature-selection stage left out for this target
+    dropped_features = models.JSONField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending',
+                              db_index=True)
+    worker_id = models.CharField(max_length=255, blank=True, default='')
+    attempts = models.IntegerField(default=0)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    result = models.ForeignKey(TrainingResult, null=True, blank=True, on_delete=models.SET_NULL)
+    model_info = models.JSONField(null=True, blank=True, encoder=CompactJSONEncoder)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+
+    def __str__(self):
+        return f"{self.model.name} on {self.target_column} ({self.status})"
+
+class FleetWorker(models.Model):
+    """A training worker and the dataset hashes it last reported having cached"""
+    worker_id = models.CharField(max_length=255, unique=True)
+    cached_hashes = models.JSONField(default=list)
+    last_seen = models.DateTimeField()
+
+    def __str__(self):
+        return self.worker_id
+
+class FitRecord(models.Model):
+    """Wall-clock time of one completed model x target fit, for learning runtime estimates"""
+    model_type = models.CharField(max_length=50, db_index=True)
+    hyperparameters = models.JSONField(default=dict, encoder=CompactJSONEncoder)
+    n_rows = models.IntegerField()
+    n_features = models.IntegerField()
+    fit_seconds = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.model_type} on {self.n_rows}x{self.n_features}: {self.fit_seconds:.2f}s"
@@ -0,0 +1,61 @@
+from django.db import transaction
+from .artifacts import attach_pipeline, attach_predictions
+from .models import FitRecord, MLModel, TrainingResult
+
+class ResultWriter:
+    """
+    Collect the models and results produced by one request.
+
+    Nothing touches the database while training runs; flush() inserts
+    everything with bulk_create in a single short transaction, so concurrent
+    requests hold the SQLite write lock only for milliseconds.
+    """
+
+    def __init__(self):
+        self.models = []
+        self.results = []
+        self.fits = []
+        self.flushed = False
+
+    def add_model(self, serializer):
+        """Queue the MLModel a validated MLModelSerializer would create"""
+        ml_model = MLModel(**serializer.validated_data)
+        self.models.append(ml_model)
+        return ml_model
+
+    def add_result(self, pipeline=None, X_sample=None, predictions=None, **fields):
+        result = TrainingResult(**fields)
+        if pipeline is not None:
+            attach_pipeline(result, pipeline, X_sample)
+        if predictions is not None:
+            attach_predictions(result, *predictions)
+        self.results.append(result)
+        return result
+
+    def add_fit(self, fit_record):
+        """Queue the FitRecord timing of a completed fit, if there is one"""
+        if fit_record is not None:
+            self.fits.append(fit_record)
+
+    def flush(self):
+        with transaction.atomic():
+            MLModel.objects.bulk_create(self.models)
+            for result in self.results:
+                # Re-assigning picks up primary keys set by the bulk insert above
+                result.model = result.model
+            TrainingResult.objects.bulk_create(self.results)
+            FitRecord.objects.bulk_create(self.fits)
+        self.flushed = True
+        return self.results
+
+    def discard(self):
+        """Delete artifacts written for results that were never flushed"""
+        if self.flushed:
+            return
+        for result in self.results:
+            for field in (result.model_file, result.compiled_file, result.predictions_file):
+                if field:
+                    field.delete(save=False)
+        self.results = []
+        self.models = []
+        self.fits = []
@@ -0,0 +1,181 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Share of sampled values that must parse as dates to treat a column as datetime
+DATETIME_PARSE_RATIO = 0.9
+DATETIME_SAMPLE_SIZE = 200
+
+def parse_datetimes(values):
+    with warnings.catch_warnings():
+        # Format inference warns for every column it can't parse consistently
+        warnings.simplefilter('ignore', UserWarning)
+        return pd.to_datetime(values, errors='coerce')
+
+def is_datetime_column(series):
+    """Check whether an object column holds date/time strings"""
+    sample = series.dropna()
+    if sample.empty:
+        return False
+    sample = sample.astype(str).head(DATETIME_SAMPLE_SIZE)
+    # Require a date separator so plain codes like '04n' or '12' are not dates
+    if not sample.str.contains(r'[-/:]').all():
+        return False
+    parsed = parse_datetimes(sample)
+    return parsed.notna().mean() >= DATETIME_PARSE_RATIO
+
+NUMERIC_DTYPES = ['int64', 'float64']
+CATEGORICAL_DTYPES = ['object', 'category']
+PROFILE_QUANTILES = [0.25, 0.5, 0.75]
+# Columns with at most this many distinct values keep exact value counts,
+# which lets profiles of appended segments be merged without rescanning
+PROFILE_MAX_TRACKED_VALUES = 200
+
+def _to_json_number(value):
+    """Convert numpy scalars to plain floats, mapping NaN/inf to None"""
+    if value is None or pd.isna(value):
+        return None
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+def _value_key(value, kind):
+    # Normalise numeric keys so int and float segments of one column agree
+    return repr(float(value)) if kind == 'numeric' else str(value)
+
+def _value_counts(series, kind):
+    return {_value_key(value, kind): int(count)
+            for value, count in series.value_counts(dropna=True).items()}
+
+def profile_dataframe(df):
+    """
+    Build a per-column profile of a dataset: dtype, null counts, cardinality
+    and, for numeric columns, min/max/mean and quantiles.
+
+    Every statistic is computed column-wise in one vectorized call so the
+    profile can be stored at upload time and reused instead of rescanning
+    the CSV on each training run.
+    """
+    null_counts = df.isna().sum()
+    n_unique = df.nunique(dropna=True)
+    numeric = df.select_dtypes(include=NUMERIC_DTYPES)
+    categorical = df.select_dtypes(include=CATEGORICAL_DTYPES)
+    numeric_stats = numeric.agg(['min', 'max', 'mean']) if not numeric.empty else None
+    quantiles = numeric.quantile(PROFILE_QUANTILES) if not numeric.empty else None
+
+    columns = {}
+    for col in df.columns:
+        if col in numeric.columns:
+            kind = 'numeric'
+        elif col in categorical.columns:
+            kind = 'categorical'
+        else:
+            kind = 'other'
+
+        info = {
+            'dtype': str(df[col].dtype),
+            'kind': kind,
+            'null_count': int(null_counts[col]),
+            'non_null_count': int(len(df) - null_counts[col]),
+            'n_unique': int(n_unique[col]),
+        }
+        if info['n_unique'] <= PROFILE_MAX_TRACKED_VALUES:
+            info['value_counts'] = _value_counts(df[col], kind)
+        if kind == 'numeric':
+            info.update({
+                'min': _to_json_number(numeric_stats.at['min', col]),
+                'max': _to_json_number(numeric_stats.at['max', col]),
+                'mean': _to_json_number(numeric_stats.at['mean', col]),
+                'quantiles': {
+                    str(q): _to_json_number(quantiles.at[q, col])
+                    for q in PROFILE_QUANTILES
+                },
+            })
+        elif kind == 'categorical':
+            info['is_datetime'] = bool(is_datetime_column(df[col]))
+        columns[col] = info
+
+    return {
+        'row_count': int(len(df)),
+        'columns': columns,
+    }
+
+
+def _weighted_mean(a, count_a, b, count_b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (a * count_a + b * count_b) / (count_a + count_b)
+
+def _merge_column(old, new):
+    if old['kind'] != new['kind']:
+        # An all-null segment says nothing about the column's type
+        if new['non_null_count'] == 0:
+            new = dict(new, kind=old['kind'], dtype=old['dtype'])
+        elif old['non_null_count'] == 0:
+            old = dict(old, kind=new['kind'], dtype=new['dtype'])
+        else:
+            return None
+
+    merged = {
+        'dtype': old['dtype'] if old['non_null_count'] else new['dtype'],
+        'kind': old['kind'],
+        'null_count': old['null_count'] + new['null_count'],
+        'non_null_count': old['non_null_count'] + new['non_null_count'],
+    }
+
+    if 'value_counts' in old and 'value_counts' in new:
+        counts = dict(old['value_counts'])
+        for value, count in new['value_counts'].items():
+            counts[value] = counts.get(value, 0) + count
+        merged['n_unique'] = len(counts)
+        if len(counts) <= PROFILE_MAX_TRACKED_VALUES:
+            merged['value_counts'] = counts
+    else:
+        # Without value counts only bounds are known; keep the upper bound
+        merged['n_unique'] = min(old['n_unique'] + new['n_unique'], merged['non_null_count'])
+        merged['n_unique_is_estimate'] = True
+
+    if merged['kind'] == 'numeric':
+        old_count, new_count = old['non_null_count'], new['non_null_count']
+        mins = [v for v in (old.get('min'), new.get('min')) if v is not None]
+        maxs = [v for v in (old.get('max'), new.get('max')) if v is not None]
+        merged.update({
+            'min': min(mins) if mins else None,
+            'max': max(maxs) if maxs else None,
+            'mean': _weighted_mean(old.get('mean'), old_count, new.get('mean'), new_count),
+            # Quantiles do not combine exactly; weight each segment by its size
+            'quantiles': {
+                q: _weighted_mean(old.get('quantiles', {}).get(q), old_count,
+                                  new.get('quantiles', {}).get(q), new_count)
+                for q in old.get('quantiles', {})
+            },
+            'quantiles_are_estimates': True,
+        })
+    elif merged['kind'] == 'categorical':
+        merged['is_datetime'] = old.get('is_datetime', False) and new.get('is_datetime', True)
+    return merged
+
+def merge_profiles(old, new):
+    """
+    Combine the stored profile of a dataset with the profile of appended rows.
+
+    Counts, min/max and means merge exactly; cardinality is exact while value
+    counts are tracked and quantiles are size-weighted estimates. Returns None
+    when a column changed type, in which case the caller should re-profile.
+    """
+    if set(old['columns']) != set(new['columns']):
+        return None
+
+    columns = {}
+    for col, info in old['columns'].items():
+        merged = _merge_column(info, new['columns'][col])
+        if merged is None:
+            return None
+        columns[col] = merged
+
+    return {
+        'row_count': old['row_count'] + new['row_count'],
+        'columns': columns,
+    }
@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Finished jobs are kept so late subscribers can replay their events
+MAX_RETAINED_JOBS = 100
+HEARTBEAT_SECONDS = 15
+
+class TrainingProgress:
+    """
+    In-memory event log for one training job.
+
+    The training thread publishes events and any number of subscribers
+    block on a condition variable until new events arrive, so streaming
+    progress never touches the database.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.status = 'pending'
+        self.total_steps = 0
+        self.completed_steps = 0
+        self.step_fraction = 0.0
+        self.started_at = time.monotonic()
+        self.events = []
+        self.condition = threading.Condition()
+        # Set by a cancel request; the training loop stops at the next check
+        self.cancel_requested = False
+
+    @property
+    def finished(self):
+        return self.status in ('completed', 'failed', 'cancelled')
+
+    def eta_seconds(self):
+        """Extrapolate the remaining time from the fraction of work done so far"""
+        if not self.total_steps:
+            return None
+        done = (self.completed_steps + self.step_fraction) / self.total_steps
+        if done <= 0:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        return round(elapsed * (1 - done) / done, 2)
+
+    def start(self, total_steps):
+        with self.condition:
+            self.total_steps = total_steps
+            self.started_at = time.monotonic()
+        self.publish('stage', stage='training', status='running')
+
+    def step_completed(self, **data):
+        with self.condition:
+            self.completed_steps += 1
+            self.step_fraction = 0.0
+        self.publish('model_completed', **data)
+
+    def step_interrupted(self, reason, **data):
+        """A model x target cell was cancelled, timed out or failed; it still counts as done"""
+        with self.condition:
+            self.completed_steps += 1
+            self.step_fraction = 0.0
+        self.publish('model_interrupted', reason=reason, **data)
+
+    def cancel(self):
+        with self.condition:
+            self.cancel_requested = True
+        self.publish('stage', stage='cancelling')
+
+    def iteration(self, iteration, total_iterations, **data):
+        with self.condition:
+            self.step_fraction = iteration / total_iterations if total_iterations else 0.0
+        self.publish('iteration', iteration=iteration, total_iterations=total_iterations, **data)
+
+    def publish(self, event, status=None, **data):
+        with self.condition:
+            if status:
+                self.status = status
+            payload = {
+                'id': len(self.events),
+                'event': event,
+                'job_id': self.job_id,
+                'status': self.status,
+                'completed_steps': self.completed_steps,
+                'total_steps': self.total_steps,
+                'eta_seconds': self.eta_seconds(),
+                'timestamp': time.time(),
+            }
+            payload.update(data)
+            self.events.append(payload)
+            self.condition.notify_all()
+        return payload
+
+    def snapshot(self):
+        with self.condition:
+            return {
+                'job_id': self.job_id,
+                'status': self.status,
+                'completed_steps': self.completed_steps,
+                'total_steps': self.total_steps,
+                'eta_seconds': self.eta_seconds(),
+                'last_event': self.events[-1] if self.events else None,
+            }
+
+    def iter_events(self, last_event_id=-1, heartbeat=HEARTBEAT_SECONDS):
+        """
+        Yield events after last_event_id until the job finishes.
+
+        Yields None whenever no event arrived within the heartbeat interval
+        so callers can keep idle connections alive.
+        """
+        index = last_event_id + 1
+        while True:
+            with self.condition:
+                if index >= len(self.events) and not self.finished:
+                    self.condition.wait(timeout=heartbeat)
+                pending = self.events[index:]
+                finished = self.finished
+            index += len(pending)
+
+            if not pending:
+                if finished:
+                    return
+                yield None
+            for event in pending:
+                yield event
+
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+def start_progress(job_id):
+    """Register a new progress log for job_id, or return None if the id is already in use"""
+    with _jobs_lock:
+        if job_id in _jobs:
+            return None
+        progress = _jobs[job_id] = TrainingProgress(job_id)
+        while len(_jobs) > MAX_RETAINED_JOBS:
+            _jobs.popitem(last=False)
+        return progress
+
+def find_progress(job_id):
+    """Return the progress log for job_id, or None for a job this process does not know"""
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def job_counts():
+    """Number of retained jobs per status"""
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    counts = {}
+    for progress in jobs:
+        counts[progress.status] = counts.get(progress.status, 0) + 1
+    return counts
+
+def format_sse(event):
+    """Encode an event (or a heartbeat for None) in server-sent events format"""
+    if event is None:
+        return ': keep-alive\n\n'
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
@@ -0,0 +1,132 @@
+import json
+import math
+from .fitting import TrainingInterrupted
+
+# Training rows of the first quick-compare rung; each later rung grows by
+# QUICK_GROWTH, for at most QUICK_MAX_RUNGS rungs
+QUICK_FIRST_RUNG = 2000
+QUICK_GROWTH = 4
+QUICK_MAX_RUNGS = 3
+# Rungs stop below this share of the training rows; the full fits cover the rest
+QUICK_MAX_RUNG_SHARE = 0.5
+# Share of configs kept after each rung (successive halving)
+QUICK_KEEP_SHARE = 0.5
+# Configs whose holdout R² trails the best by more than this are dominated
+QUICK_DOMINANCE_MARGIN = 0.05
+# Configs trained on all rows at the end
+QUICK_LEADERS = 2
+
+QUICK_COMPARE_OPTIONS = {
+    'first_rung': QUICK_FIRST_RUNG,
+    'growth': QUICK_GROWTH,
+    'max_rungs': QUICK_MAX_RUNGS,
+    'leaders': QUICK_LEADERS,
+    'margin': QUICK_DOMINANCE_MARGIN,
+}
+
+def parse_quick_compare_options(value):
+    """
+    Options of the quick_compare request field, or None when it is off.
+
+    The field is a JSON boolean or an object overriding QUICK_COMPARE_OPTIONS.
+    """
+    if value in (None, ''):
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    if value is False:
+        return None
+    if value is True:
+        return dict(QUICK_COMPARE_OPTIONS)
+    if not isinstance(value, dict):
+        raise ValueError("quick_compare must be true, false or an object of options")
+    unknown = set(value) - set(QUICK_COMPARE_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown quick_compare options: {sorted(unknown)}")
+    options = {**QUICK_COMPARE_OPTIONS, **value}
+    if int(options['leaders']) < 1 or float(options['growth']) <= 1:
+        raise ValueError("quick_compare needs at least one leader and a growth above 1")
+    return options
+
+def rung_sizes(n_train, options):
+    """Training rows of each quick-compare rung; empty when the data is already small"""
+    sizes = []
+    size = int(options['first_rung'])
+    while len(sizes) < int(options['max_rungs']) and size <= n_train * QUICK_MAX_RUNG_SHARE:
+        sizes.append(size)
+        size = int(size * float(options['growth']))
+    return sizes
+
+def _score(metrics):
+    r2 = metrics['r2_score']
+    return r2 if r2 == r2 else -math.inf
+
+def quick_compare(trainers, n_train, options, report=None, cancelled=None, score=None):
+    """
+    Successive halving over configs on growing stratified subsamples.
+
+    Every trainer is fitted on the first rung's rows; after each rung
+    only the better share of configs goes on to the next, larger one,
+    and configs trailing the best by more than the margin stop
+    immediately. report(rung, n_samples, ranking) is called after every
+    rung with provisional metrics, so a ranking is available long before
+    any full fit finishes. score(index, n_samples) returns a config's
+    (metrics, fit_seconds) and defaults to its trainer's subsample_score;
+    a config whose subsample fit times out stops there.
+
+    Returns (leaders, history): indices of the configs to train on all
+    rows, best first, and each config's rung metrics.
+    """
+    if score is None:
+        score = lambda i, n_samples: trainers[i].subsample_score(n_samples)
+    alive = list(range(len(trainers)))
+    history = {i: [] for i in alive}
+    sizes = rung_sizes(n_train, options)
+    if not sizes:
+        # Too little data for subsamples to save anything: every config gets a full fit
+        return alive, history
+
+    try:
+        for rung, size in enumerate(sizes, start=1):
+            scores = {}
+            for i in alive:
+                if cancelled is not None and cancelled():
+                    raise TrainingInterrupted('cancelled')
+                try:
+                    metrics, fit_seconds = score(i, size)
+                except TrainingInterrupted as e:
+                    if e.status == 'cancelled':
+                        raise
+                    history[i].append({'n_samples': size, 'error': str(e)})
+                    continue
+                except Exception as e:
+                    # e.g. more neighbours than sampled rows; the config stops here
+                    history[i].append({'n_samples': size, 'error': str(e)})
+                    continue
+                history[i].append({'n_samples': size, 'metrics': metrics,
+                                   'fit_seconds': fit_seconds})
+                scores[i] = _score(metrics)
+
+            ranked = sorted(scores, key=scores.get, reverse=True)
+            keep = max(int(options['leaders']), math.ceil(len(alive) * QUICK_KEEP_SHARE))
+            best = scores[ranked[0]] if ranked else 0
+            eliminated = alive
+            alive = [i for position, i in enumerate(ranked)
+                     if position < keep and best - scores[i] <= float(options['margin'])]
+            # Eliminated configs no longer need their copy of the training rows
+            for i in set(eliminated) - set(alive):
+                trainers[i].release_subsamples()
+            if report is not None:
+                report(rung, size, [
+                    {'index': i, 'metrics': history[i][-1]['metrics'],
+                     'fit_seconds': history[i][-1]['fit_seconds'],
+                     'status': 'running' if i in alive else 'eliminated'}
+                    for i in ranked
+                ])
+            if len(alive) <= int(options['leaders']):
+                break
+    finally:
+        # Leaders are trained again on all rows by trainers of their own
+        for trainer in trainers:
+            trainer.release_subsamples()
+    return alive[:int(options['leaders'])], history
@@ -0,0 +1,173 @@
+import math
+import threading
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+from .admission import COST_MODELS, OPS_PER_SECOND, _default_cost, encoded_width
+from .models import FitRecord
+
+# Most recent recorded fits the cost model is trained on
+RUNTIME_HISTORY = 5000
+# Recorded fits a model type needs before it gets its own correction
+RUNTIME_MIN_TYPE_FITS = 5
+# Ridge penalty pulling learned corrections toward the analytic estimate
+RUNTIME_RIDGE = 1.0
+# No fit finishes faster than loading, encoding and scoring allow
+RUNTIME_MIN_SECONDS = 0.05
+
+def analytic_seconds(model_type, n_rows, n_features, hyperparameters):
+    """CPU seconds the admission cost model gives for one fit"""
+    cost = COST_MODELS.get(model_type, _default_cost)
+    _, ops = cost(n_rows, n_features, hyperparameters or {})
+    return max(ops / OPS_PER_SECOND, 1e-4)
+
+def _features(n_rows, n_features, analytic):
+    return [1.0, math.log(analytic), math.log1p(n_rows), math.log1p(n_features)]
+
+def _ridge(X, y, penalty=RUNTIME_RIDGE):
+    """Least squares with an L2 penalty on every coefficient but the intercept"""
+    identity = np.eye(X.shape[1]) * penalty
+    identity[0, 0] = 0.0
+    return np.linalg.solve(X.T @ X + identity, X.T @ y)
+
+class RuntimeEstimator:
+    """
+    Predict the wall-clock seconds of a model x target fit from recorded fits.
+
+    The analytic operation counts of admission control, which already
+    account for hyperparameters such as the number of trees or boosting
+    rounds, are the starting point. A ridge regression in log space learns
+    how far off they are from FitRecords, first across all model types
+    and then, once a type has RUNTIME_MIN_TYPE_FITS fits, per type. With
+    no history the analytic estimate is used as is.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.shared = None
+        self.by_type = {}
+
+    def fit(self, records):
+        """Learn corrections from (model_type, n_rows, n_features, hyperparameters, seconds)"""
+        records = [r for r in records if r[4] > 0]
+        if not records:
+            self.shared, self.by_type = None, {}
+            return self
+        X = np.array([_features(n, p, analytic_seconds(model_type, n, p, params))
+                      for model_type, n, p, params, _ in records])
+        residual = np.log([max(r[4], RUNTIME_MIN_SECONDS) for r in records]) - X[:, 1]
+        self.shared = _ridge(X, residual)
+        remaining = residual - X @ self.shared
+
+        types = np.array([r[0] for r in records])
+        self.by_type = {}
+        for model_type in set(types):
+            rows = types == model_type
+            if rows.sum() >= RUNTIME_MIN_TYPE_FITS:
+                self.by_type[model_type] = _ridge(X[rows], remaining[rows])
+        return self
+
+    def refresh(self):
+        """Retrain when fits were recorded since the last training"""
+        latest = FitRecord.objects.aggregate(latest=Max('id'), count=Count('id'))
+        version = (latest['latest'], latest['count'])
+        with self.lock:
+            if version == self.version:
+                return self
+            records = FitRecord.objects.order_by('-id').values_list(
+                'model_type', 'n_rows', 'n_features', 'hyperparameters', 'fit_seconds'
+            )[:RUNTIME_HISTORY]
+            self.fit(list(records))
+            self.version = version
+        return self
+
+    def predict(self, model_type, n_rows, n_features, hyperparameters=None):
+        analytic = analytic_seconds(model_type, n_rows, n_features, hyperparameters)
+        x = np.array(_features(n_rows, n_features, analytic))
+        log_seconds = x[1]
+        if self.shared is not None:
+            log_seconds += x @ self.shared
+        if model_type in self.by_type:
+            log_seconds += x @ self.by_type[model_type]
+        return max(float(np.exp(log_seconds)), RUNTIME_MIN_SECONDS)
+
+runtime_estimator = RuntimeEstimator()
+
+def estimate_cells(profile, model_configs, target_columns, cardinality_threshold=None,
+                   dropped_features=None):
+    """
+    Predicted seconds of every model x target cell, in submission order.
+
+    Each cell is {'index', 'model', 'model_type', 'target', 'predicted_seconds'},
+    where index is the config's position in model_configs.
+    """
+    if cardinality_threshold is None:
+        cardinality_threshold = settings.ML_HIGH_CARDINALITY_THRESHOLD
+    dropped_features = dropped_features or {}
+    runtime_estimator.refresh()
+
+    shapes = {}
+    for target in target_columns:
+        columns = {col: info for col, info in profile['columns'].items()
+                   if col not in dropped_features.get(target, {})}
+        width = encoded_width({**profile, 'columns': columns}, target, cardinality_threshold)
+        non_null = profile['columns'][target].get('non_null_count', profile['row_count'])
+        shapes[target] = (int(non_null * 0.8), width)
+
+    cells = []
+    for index, config in enumerate(model_configs):
+        for target in target_columns:
+            n_rows, width = shapes[target]
+            seconds = runtime_estimator.predict(config.get('model_type'), n_rows, width,
+                                                config.get('hyperparameters') or {})
+            cells.append({
+                'index': index,
+                'model': config.get('name'),
+                'model_type': config.get('model_type'),
+                'target': target,
+                'predicted_seconds': round(seconds, 2),
+            })
+    return cells
+
+def shortest_first(cells):
+    """Cells ordered so cheap results come back first (shortest job first)"""
+    return sorted(cells, key=lambda cell: cell['predicted_seconds'])
+
+def longest_first(cells):
+    """Cells ordered for parallel workers: long fits start early so all workers finish together"""
+    return sorted(cells, key=lambda cell: -cell['predicted_seconds'])
+
+def schedule_summary(cells, workers=1):
+    """
+    Expected timeline of cells run in the given order by `workers` parallel workers.
+
+    Each cell goes to the worker that frees up first and gets its
+    expected_finish_seconds. Returns the total (makespan), when the first
+    result arrives and the mean time to a result.
+    """
+    free_at = [0.0] * max(workers, 1)
+    for cell in cells:
+        worker = min(range(len(free_at)), key=free_at.__getitem__)
+        free_at[worker] += cell['predicted_seconds']
+        cell['expected_finish_seconds'] = round(free_at[worker], 2)
+    finishes = [cell['expected_finish_seconds'] for cell in cells] or [0.0]
+    return {
+        'predicted_total_seconds': round(max(free_at), 2),
+        'predicted_first_result_seconds': min(finishes),
+        'predicted_mean_result_seconds': round(sum(finishes) / len(finishes), 2),
+    }
+
+def record_fit(model_type, hyperparameters, model_info):
+    """
+    A FitRecord for a completed fit, built from its model_info.
+
+    None when the fit has no timing, or continued an earlier model, whose
+    time says little about a fit from scratch.
+    """
+    if not model_info or model_info.get('fit_seconds') is None or model_info.get('warm_started'):
+        return None
+    return FitRecord(model_type=model_type, hyperparameters=hyperparameters or {},
+                     n_rows=model_info['n_samples_train'],
+                     n_features=model_info['n_encoded_features'],
+                     fit_seconds=model_info['fit_seconds'])
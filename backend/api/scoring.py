@@ -0,0 +1,291 @@
+import numpy as np
+import pandas as pd
+from .artifacts import load_predictions
+
+_metrics = {}
+
+# Bootstrap resamples of the holdout rows behind confidence intervals
+BOOTSTRAP_RESAMPLES = 1000
+BOOTSTRAP_CONFIDENCE = 0.95
+BOOTSTRAP_METRICS = ('r2_score', 'mse', 'mae', 'rmse')
+BOOTSTRAP_SEED = 42
+# Cells of the (resamples x rows) index matrix drawn at once, to bound memory
+BOOTSTRAP_CHUNK_CELLS = 2_000_000
+# Metrics where a larger value is better; the rest are errors
+HIGHER_IS_BETTER = {'r2_score'}
+
+def register_metric(name, fn):
+    """
+    Register a metric for recomputation from stored predictions.
+
+    `fn(y_true, y_pred, mask)` receives (results x rows) arrays padded to a
+    common width, with `mask` marking the real rows, and returns one value
+    per result.
+    """
+    _metrics[name] = fn
+    return fn
+
+def registered_metrics():
+    return list(_metrics)
+
+def _mean(values, mask):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(mask, values, 0.0).sum(axis=1) / mask.sum(axis=1)
+
+def _mse(y_true, y_pred, mask):
+    return _mean((y_true - y_pred) ** 2, mask)
+
+def _r2(y_true, y_pred, mask):
+    residual = np.where(mask, (y_true - y_pred) ** 2, 0.0).sum(axis=1)
+    centered = y_true - _mean(y_true, mask)[:, None]
+    total = np.where(mask, centered ** 2, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r2 = 1 - residual / total
+    # Constant targets score like scikit-learn: 1 for a perfect fit, else 0
+    return np.where(total == 0, np.where(residual == 0, 1.0, 0.0), r2)
+
+def _max_error(y_true, y_pred, mask):
+    return np.where(mask, np.abs(y_true - y_pred), -np.inf).max(axis=1)
+
+def quantile_loss(q):
+    """Pinball loss at quantile q"""
+    def loss(y_true, y_pred, mask):
+        diff = y_true - y_pred
+        return _mean(np.maximum(q * diff, (q - 1) * diff), mask)
+    return loss
+
+register_metric('r2_score', _r2)
+register_metric('mse', _mse)
+register_metric('rmse', lambda t, p, m: np.sqrt(_mse(t, p, m)))
+register_metric('mae', lambda t, p, m: _mean(np.abs(t - p), m))
+register_metric('mape', lambda t, p, m: _mean(
+    np.abs(t - p) / np.maximum(np.abs(t), np.finfo(np.float64).eps), m))
+register_metric('max_error', _max_error)
+for q in (0.1, 0.5, 0.9):
+    register_metric(f'quantile_loss_{int(q * 100)}', quantile_loss(q))
+
+def stack_predictions(arrays, keep=None):
+    """
+    Pad per-result prediction arrays into (results x rows) matrices.
+
+    `keep` optionally holds one boolean array per result selecting the
+    rows to score. Returns (y_true, y_pred, mask).
+    """
+    width = max((len(a['y_true']) for a in arrays), default=0)
+    y_true = np.zeros((len(arrays), width))
+    y_pred = np.zeros((len(arrays), width))
+    mask = np.zeros((len(arrays), width), dtype=bool)
+    for i, a in enumerate(arrays):
+        n = len(a['y_true'])
+        y_true[i, :n] = a['y_true']
+        y_pred[i, :n] = a['y_pred']
+        mask[i, :n] = True if keep is None else keep[i]
+    return y_true, y_pred, mask
+
+def check_metrics(metric_names):
+    unknown = [name for name in metric_names if name not in _metrics]
+    if unknown:
+        raise ValueError(f"Unknown metrics {unknown}; available: {registered_metrics()}")
+
+def compute_metrics(arrays, metric_names, keep=None):
+    """Every requested metric for every result at once, as {name: values}"""
+    check_metrics(metric_names)
+    y_true, y_pred, mask = stack_predictions(arrays, keep)
+    empty = ~mask.any(axis=1)
+    return {name: np.where(empty, np.nan, _metrics[name](y_true, y_pred, mask))
+            for name in metric_names}
+
+def _resample_counts(rng, n_rows, n_resamples):
+    """(resamples x rows) counts of how often each row is drawn, from a resample index matrix"""
+    index = rng.integers(0, n_rows, size=(n_resamples, n_rows))
+    offsets = np.arange(n_resamples)[:, None] * n_rows
+    counts = np.bincount((index + offsets).ravel(), minlength=n_resamples * n_rows)
+    return counts.reshape(n_resamples, n_rows).astype(np.float64)
+
+def bootstrap_values(y_true, predictions, metric_names=BOOTSTRAP_METRICS,
+                     n_resamples=BOOTSTRAP_RESAMPLES, seed=BOOTSTRAP_SEED):
+    """
+    Metric values of each prediction vector on shared bootstrap resamples.
+
+    Every metric here is built from per-row sums (squared and absolute
+    errors, and the target's first two moments), so the sums over all
+    resamples are one matrix product of the resample counts with a
+    (rows x columns) table. Every prediction vector sees the same
+    resamples, which makes their differences paired. Returns
+    {metric: (predictions x resamples)}.
+    """
+    unsupported = [name for name in metric_names if name not in BOOTSTRAP_METRICS]
+    if unsupported:
+        raise ValueError(f"No bootstrap for metrics {unsupported}; available: {list(BOOTSTRAP_METRICS)}")
+    y_true = np.asarray(y_true, dtype=np.float64)
+    n_rows = len(y_true)
+    # Centering first keeps the variance from cancelling away for large targets
+    centered = y_true - y_true.mean()
+    columns = [centered, centered ** 2]
+    for y_pred in predictions:
+        residual = y_true - np.asarray(y_pred, dtype=np.float64)
+        columns += [residual ** 2, np.abs(residual)]
+    table = np.column_stack(columns)
+
+    rng = np.random.default_rng(seed)
+    sums = np.empty((n_resamples, table.shape[1]))
+    chunk = max(1, BOOTSTRAP_CHUNK_CELLS // max(n_rows, 1))
+    for start in range(0, n_resamples, chunk):
+        stop = min(start + chunk, n_resamples)
+        sums[start:stop] = _resample_counts(rng, n_rows, stop - start) @ table
+
+    total = sums[:, 1] - sums[:, 0] ** 2 / n_rows
+    values = {name: np.empty((len(predictions), n_resamples)) for name in metric_names}
+    for i in range(len(predictions)):
+        residual = sums[:, 2 + 2 * i]
+        mse = residual / n_rows
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r2 = 1 - residual / total
+        by_name = {
+            # Constant resamples score like scikit-learn: 1 for a perfect fit, else 0
+            'r2_score': np.where(total <= 0, np.where(residual == 0, 1.0, 0.0), r2),
+            'mse': mse,
+            'rmse': np.sqrt(mse),
+            'mae': sums[:, 3 + 2 * i] / n_rows,
+        }
+        for name in metric_names:
+            values[name][i] = by_name[name]
+    return values
+
+def _bounds(values, confidence):
+    tail = (1 - confidence) / 2 * 100
+    with np.errstate(invalid='ignore'):
+        low, high = np.nanpercentile(values, [tail, 100 - tail], axis=-1)
+    return low, high
+
+def _rounded(value):
+    return round(float(value), 6) if np.isfinite(value) else None
+
+def bootstrap_intervals(y_true, y_pred, metric_names=BOOTSTRAP_METRICS,
+                        n_resamples=BOOTSTRAP_RESAMPLES, confidence=BOOTSTRAP_CONFIDENCE,
+                        seed=BOOTSTRAP_SEED):
+    """Percentile bootstrap interval of each metric of one model's holdout predictions"""
+    values = bootstrap_values(y_true, [y_pred], metric_names, n_resamples, seed)
+    intervals = {'level': confidence, 'n_resamples': n_resamples}
+    for name in metric_names:
+        low, high = _bounds(values[name][0], confidence)
+        intervals[name] = {'low': _rounded(low), 'high': _rounded(high)}
+    return intervals
+
+def paired_differences(y_true, predictions, reference, metric_names=BOOTSTRAP_METRICS,
+                       n_resamples=BOOTSTRAP_RESAMPLES, confidence=BOOTSTRAP_CONFIDENCE,
+                       seed=BOOTSTRAP_SEED):
+    """
+    Paired bootstrap differences of each model against predictions[reference].
+
+    All predictions must be for the same holdout rows. For every model and
+    metric this gives the point difference (model minus reference), its
+    interval, and the share of resamples where the model does better. An
+    interval spanning 0 means the split cannot tell the two models apart.
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    values = bootstrap_values(y_true, predictions, metric_names, n_resamples, seed)
+    full = compute_metrics([{'y_true': y_true, 'y_pred': np.asarray(y_pred)}
+                            for y_pred in predictions], metric_names)
+    comparisons = []
+    for i in range(len(predictions)):
+        comparison = {}
+        for name in metric_names:
+            diff = values[name][i] - values[name][reference]
+            low, high = _bounds(diff, confidence)
+            better = diff > 0 if name in HIGHER_IS_BETTER else diff < 0
+            comparison[name] = {
+                'difference': _rounded(full[name][i] - full[name][reference]),
+                'low': _rounded(low),
+                'high': _rounded(high),
+                'probability_better': round(float(better.mean()), 4),
+            }
+        comparisons.append(comparison)
+    return comparisons
+
+def compare_predictions(arrays, metric_names=BOOTSTRAP_METRICS, n_resamples=BOOTSTRAP_RESAMPLES,
+                        confidence=BOOTSTRAP_CONFIDENCE):
+    """
+    Paired bootstrap comparison of holdout arrays (index, y_true, y_pred) against the best R².
+
+    Raises ValueError unless every array covers the same holdout rows.
+    Returns (position of the reference, one comparison per array).
+    """
+    first = arrays[0]['index']
+    if any(len(a['index']) != len(first) or not np.array_equal(a['index'], first)
+           for a in arrays[1:]):
+        raise ValueError("Predictions were scored on different holdout rows")
+    r2 = compute_metrics(arrays, ['r2_score'])['r2_score']
+    reference = int(np.argmax(np.where(np.isnan(r2), -np.inf, r2)))
+    comparisons = paired_differences(arrays[0]['y_true'], [a['y_pred'] for a in arrays],
+                                     reference, metric_names, n_resamples, confidence)
+    return reference, [{'level': confidence, 'n_resamples': n_resamples, **comparison}
+                       for comparison in comparisons]
+
+def compare_results(results, metric_names=BOOTSTRAP_METRICS, n_resamples=BOOTSTRAP_RESAMPLES,
+                    confidence=BOOTSTRAP_CONFIDENCE):
+    """
+    Paired bootstrap comparison of TrainingResults scored on the same holdout.
+
+    Returns ({result_id: comparison}, id of the reference result, i.e. the
+    best R²). Raises ValueError when a result has no stored predictions.
+    """
+    results = list(results)
+    arrays = []
+    for result in results:
+        a = load_predictions(result)
+        if a is None:
+            raise ValueError(f"Result {result.id} has no stored predictions")
+        arrays.append(a)
+    reference, comparisons = compare_predictions(arrays, metric_names, n_resamples, confidence)
+    return ({result.id: comparison for result, comparison in zip(results, comparisons)},
+            results[reference].id)
+
+def subgroup_rows(results, arrays, where):
+    """
+    For each result, which stored holdout rows match `where`.
+
+    `where` maps dataset columns to a value or a list of accepted values;
+    each dataset is read once, and only for those columns.
+    """
+    columns = list(where)
+    accepted = {col: value if isinstance(value, list) else [value] for col, value in where.items()}
+    matches = {}
+    keep = []
+    for result, a in zip(results, arrays):
+        if result.dataset_id not in matches:
+            df = pd.concat([pd.read_csv(path, usecols=columns)
+                            for path in result.dataset.segment_paths()], ignore_index=True)
+            match = np.ones(len(df), dtype=bool)
+            for col in columns:
+                match &= df[col].isin(accepted[col]).to_numpy()
+            matches[result.dataset_id] = match
+        keep.append(matches[result.dataset_id][a['index']])
+    return keep
+
+def score_results(results, metric_names, where=None):
+    """
+    Recompute metrics for TrainingResults from their stored predictions.
+
+    Returns ({result_id: {metric: value}}, ids of results without stored
+    predictions). Metrics with no matching rows come back as None.
+    """
+    check_metrics(metric_names)
+    loaded, arrays, missing = [], [], []
+    for result in results:
+        a = load_predictions(result)
+        if a is None:
+            missing.append(result.id)
+        else:
+            loaded.append(result)
+            arrays.append(a)
+
+    keep = subgroup_rows(loaded, arrays, where) if where else None
+    values = compute_metrics(arrays, metric_names, keep)
+    scores = {}
+    for i, result in enumerate(loaded):
+        scores[result.id] = {
+            name: float(values[name][i]) if np.isfinite(values[name][i]) else None
+            for name in metric_names
+        }
+    return scores, missing
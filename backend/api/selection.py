@@ -0,0 +1,202 @@
+import json
+import re
+import numpy as np
+import pandas as pd
+from .metrics import cache_lookup
+from .models import Dataset
+
+# Feature pairs correlated at least this strongly are treated as duplicates
+CORRELATION_THRESHOLD = 0.95
+# Correlations at least this strong are cached, so any stricter threshold
+# can be applied later without reading the data again
+CORRELATION_FLOOR = 0.8
+# Rows both columns must have for their correlation to count
+CORRELATION_MIN_PERIODS = 50
+# Columns whose most frequent value covers this share of rows carry no signal
+NEAR_CONSTANT_SHARE = 0.995
+# Share of distinct values above which a text column is treated as an identifier
+ID_UNIQUE_SHARE = 0.95
+ID_NAME_PATTERN = re.compile(r'(^|[\s_.-])id$', re.IGNORECASE)
+# Columns named like identifiers with at most this many values are codes
+# (e.g. weather condition ids) that models can still use
+ID_MIN_UNIQUE = 20
+
+# Model-based filter: training rows sampled and minimum normalised importance
+MODEL_FILTER_SAMPLE_SIZE = 20000
+MIN_IMPORTANCE = 0.005
+
+SELECTION_OPTIONS = {
+    'correlation_threshold': CORRELATION_THRESHOLD,
+    'drop_constant': True,
+    'drop_ids': True,
+    'model_filter': False,
+    'min_importance': MIN_IMPORTANCE,
+}
+
+def parse_selection_options(value):
+    """
+    Options of the feature_selection request field, or None when it is off.
+
+    The field is a JSON boolean or an object overriding SELECTION_OPTIONS.
+    """
+    if value in (None, ''):
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    if value is False:
+        return None
+    if value is True:
+        return dict(SELECTION_OPTIONS)
+    if not isinstance(value, dict):
+        raise ValueError("feature_selection must be true, false or an object of options")
+    unknown = set(value) - set(SELECTION_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown feature_selection options: {sorted(unknown)}")
+    return {**SELECTION_OPTIONS, **value}
+
+def compute_feature_statistics(df, profile):
+    """Pairs of numeric columns whose absolute correlation reaches CORRELATION_FLOOR"""
+    numeric = [col for col, info in profile['columns'].items()
+               if info['kind'] == 'numeric' and info['n_unique'] > 1]
+    pairs = []
+    if len(numeric) > 1:
+        corr = df[numeric].corr(min_periods=CORRELATION_MIN_PERIODS).to_numpy()
+        rows, cols = np.triu_indices(len(numeric), k=1)
+        values = corr[rows, cols]
+        strong = np.abs(np.nan_to_num(values)) >= CORRELATION_FLOOR
+        pairs = [[numeric[i], numeric[j], round(float(r), 4)]
+                 for i, j, r in zip(rows[strong], cols[strong], values[strong])]
+    return {'correlation_floor': CORRELATION_FLOOR, 'correlated_pairs': pairs}
+
+def feature_statistics(dataset, dataset_path):
+    """
+    Correlation statistics of a dataset, computed on first use and cached in its profile.
+
+    Identical uploads share a profile, so the statistics are stored on all
+    of them and later duplicates reuse them without reading the CSV.
+    """
+    from .ml_utils import load_dataset
+
+    profile = dataset.profile
+    cached = profile.get('feature_statistics')
+    hit = bool(cached) and cached.get('correlation_floor') == CORRELATION_FLOOR
+    cache_lookup('feature_statistics', hit)
+    if hit:
+        return cached
+
+    df = load_dataset(dataset_path)
+    statistics = compute_feature_statistics(df, profile)
+    profile['feature_statistics'] = statistics
+    if dataset.parent_id is None and dataset.content_hash:
+        Dataset.objects.filter(content_hash=dataset.content_hash,
+                               parent__isnull=True).update(profile=profile)
+    else:
+        dataset.save(update_fields=['profile'])
+    return statistics
+
+def _is_constant(info, row_count):
+    if info['n_unique'] <= 1:
+        return True
+    counts = info.get('value_counts')
+    return bool(counts) and max(counts.values()) >= NEAR_CONSTANT_SHARE * row_count
+
+def _is_id_like(col, info):
+    if info.get('is_datetime'):
+        return False
+    integer = info['dtype'].startswith('int')
+    if (ID_NAME_PATTERN.search(col.strip()) and (integer or info['kind'] == 'categorical')
+            and info['n_unique'] > ID_MIN_UNIQUE):
+        return True
+    non_null = info['non_null_count']
+    if info['kind'] == 'categorical':
+        return non_null >= CORRELATION_MIN_PERIODS and info['n_unique'] >= ID_UNIQUE_SHARE * non_null
+    # A unique run of consecutive integers is a row number
+    return (integer and non_null > 1 and info['n_unique'] == non_null
+            and info.get('max') is not None
+            and info['max'] - info['min'] == non_null - 1)
+
+def select_features(profile, target_column, statistics, correlation_threshold=CORRELATION_THRESHOLD,
+                    drop_constant=True, drop_ids=True):
+    """
+    Columns to leave out of the features for one target, mapped to why.
+
+    Of two features correlated at least correlation_threshold, the one with
+    more missing values (or, on a tie, the later one) is dropped. The
+    target itself is never considered.
+    """
+    columns = profile['columns']
+    row_count = profile['row_count']
+    dropped = {}
+    for col, info in columns.items():
+        if col == target_column:
+            continue
+        if drop_constant and _is_constant(info, row_count):
+            dropped[col] = {'reason': 'constant'}
+        elif drop_ids and _is_id_like(col, info):
+            dropped[col] = {'reason': 'id_like'}
+
+    order = {col: i for i, col in enumerate(columns)}
+    pairs = sorted(statistics['correlated_pairs'], key=lambda pair: -abs(pair[2]))
+    for a, b, r in pairs:
+        if abs(r) < correlation_threshold:
+            break
+        if target_column in (a, b) or a in dropped or b in dropped:
+            continue
+        if a not in columns or b not in columns:
+            continue
+        keep, drop = sorted((a, b), key=lambda col: (columns[col]['null_count'], order[col]))
+        dropped[drop] = {'reason': 'correlated', 'with': keep, 'correlation': r}
+    return dropped
+
+def model_filter(dataset_path, target_column, profile, dropped, min_importance=MIN_IMPORTANCE):
+    """
+    Features a quick extra-trees fit on the training rows finds nearly useless.
+
+    Only the rows train_and_evaluate trains on are used, so the holdout
+    never influences which features the models see. The most important
+    feature is always kept.
+    """
+    from sklearn.ensemble import ExtraTreesRegressor
+    from .ml_utils import load_dataset, split_dataset
+
+    df = load_dataset(dataset_path).dropna(subset=[target_column])
+    X = df.drop(columns=[target_column, *[col for col in dropped if col in df.columns]])
+    if X.shape[1] < 2:
+        return {}
+    X_train, _, y_train, _ = split_dataset(X, df[target_column])
+    if len(X_train) > MODEL_FILTER_SAMPLE_SIZE:
+        X_train = X_train.sample(MODEL_FILTER_SAMPLE_SIZE, random_state=0)
+        y_train = y_train.loc[X_train.index]
+
+    # Codes and median fills are enough for trees to rank columns
+    encoded = pd.DataFrame(index=X_train.index)
+    for col in X_train.columns:
+        if profile['columns'][col]['kind'] == 'numeric':
+            encoded[col] = X_train[col].fillna(X_train[col].median())
+        else:
+            encoded[col] = pd.factorize(X_train[col])[0]
+    encoded = encoded.fillna(0)
+
+    forest = ExtraTreesRegressor(n_estimators=50, min_samples_leaf=5, n_jobs=-1, random_state=0)
+    forest.fit(encoded, y_train)
+    importances = forest.feature_importances_
+    best = int(np.argmax(importances))
+    return {col: {'reason': 'low_importance', 'importance': round(float(importance), 5)}
+            for i, (col, importance) in enumerate(zip(encoded.columns, importances))
+            if importance < min_importance and i != best}
+
+def plan_feature_selection(dataset, dataset_path, target_columns, options):
+    """Dropped features per target column for a training job"""
+    statistics = feature_statistics(dataset, dataset_path)
+    plan = {}
+    for target in target_columns:
+        dropped = select_features(
+            dataset.profile, target, statistics,
+            correlation_threshold=float(options['correlation_threshold']),
+            drop_constant=options['drop_constant'], drop_ids=options['drop_ids']
+        )
+        if options['model_filter']:
+            dropped.update(model_filter(dataset_path, target, dataset.profile, dropped,
+                                        min_importance=float(options['min_importance'])))
+        plan[target] = dropped
+    return plan
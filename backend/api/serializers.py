@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Dataset, MLModel, TrainingResult
+from .estimators import get_estimator_spec
 
 class DatasetSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,49 +20,15 @@ class MLModelSerializer(serializers.ModelSerializer):
         """
         model_type = self.initial_data.get('model_type')
         
-        # Define valid hyperparameters for each model type
-        valid_hyperparameters = {
-            'linear_regression': [
-                'fit_intercept',
-                'normalize',
-                'n_jobs'
-            ],
-            'random_forest': [
-                'n_estimators',
-                'max_depth',
-                'min_samples_split',
-                'min_samples_leaf',
-                'max_features',
-                'random_state',
-                'n_jobs'
-            ],
-            'knn': [
-                'n_neighbors',
-                'weights',
-                'algorithm',
-                'leaf_size'
-            ],
-            'svr': [
-                'kernel',
-                'C',
-                'epsilon',
-                'gamma'
-            ],
-            'xgboost': [
-                'n_estimators',
-                'max_depth',
-                'learning_rate',
-                'subsample',
-                'colsample_bytree'
-            ]
-        }
-
-        if model_type not in valid_hyperparameters:
+        # Valid hyperparameters come from the estimator registry
+        try:
+            spec = get_estimator_spec(model_type)
+        except ValueError:
             raise serializers.ValidationError(f"Invalid model type: {model_type}")
 
         # Check if all provided hyperparameters are valid for the model type
         for param in value.keys():
-            if param not in valid_hyperparameters[model_type]:
+            if param not in spec.allowed_hyperparameters:
                 raise serializers.ValidationError(
                     f"Invalid hyperparameter '{param}' for model type '{model_type}'"
                 )
@@ -80,6 +47,7 @@ class TrainingResultSerializer(serializers.ModelSerializer):
             'dataset_name',
             'model_name',
             'model_type',
+            'target_column',
             'metrics',
             'feature_importance',
             'created_at'
@@ -92,6 +60,7 @@ class TrainingResultSerializer(serializers.ModelSerializer):
             'id': str(data['id']),
             'dataset': data['dataset_name'],
             'model': data['model_name'],
+            'target_column': data['target_column'],
             'metrics': data['metrics'],
             'feature_importance': data['feature_importance'],
             'created_at': data['created_at']
@@ -1,10 +1,45 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework.test import APITestCase
 from django.core.files.uploadedfile import SimpleUploadedFile
 from .models import Dataset, MLModel, TrainingResult
+from .encoding import DatetimeFeatures, FrequencyEncoder, plan_encodings
+from .progress import TrainingProgress, find_progress, start_progress
+from .serializers import MLModelSerializer
+from .artifacts import save_pipeline
+from .compiled import compile_pipeline
+from .batching import PredictionBatcher
+from .ml_utils import ModelTrainer
+from .profiling import profile_dataframe
+from . import estimators
+import pandas as pd
+import numpy as np
+import json
 import os
+import tempfile
+import threading
+import time
 
-class DatasetTests(APITestCase):
+def make_csv(n_rows, seed=0):
+    """Small numeric regression dataset as CSV bytes"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'x1': rng.normal(size=n_rows), 'x2': rng.normal(size=n_rows)})
+    df['target'] = 3 * df['x1'] - df['x2'] + rng.normal(scale=0.1, size=n_rows)
+    return df.to_csv(index=False).encode()
+
+class MediaTestCase(APITestCase):
+    """API tests whose uploads, models and predictions go to a temporary MEDIA_ROOT"""
+
+    @classmethod
+    def setUpClass(cls):
+        import shutil
+        media = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        cls.addClassCleanup(settings_override.disable)
+        super().setUpClass()
+
+class DatasetTests(MediaTestCase):
     def test_upload_dataset(self):
         # Create a simple CSV file
         csv_content = b"feature1,feature2,target\n1,2,3\n4,5,6"
@@ -17,6 +52,167 @@ class DatasetTests(APITestCase):
         self.assertEqual(response.status_code, 201)
         self.assertTrue(Dataset.objects.filter(name="test.csv").exists())
 
+    def test_upload_stores_profile(self):
+        csv_content = b"feature1,label,target\n1,a,3\n4,b,\n7,a,9"
+        file = SimpleUploadedFile("profile.csv", csv_content, content_type="text/csv")
+        
+        response = self.client.post('/api/datasets/upload/', {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        
+        # The profile endpoint serves the statistics computed at upload time
+        response = self.client.get(f"/api/datasets/{response.data['id']}/profile/")
+        self.assertEqual(response.status_code, 200)
+        columns = response.data['columns']
+        self.assertEqual(response.data['row_count'], 3)
+        self.assertEqual(columns['target']['null_count'], 1)
+        self.assertEqual(columns['target']['non_null_count'], 2)
+        self.assertEqual(columns['feature1']['kind'], 'numeric')
+        self.assertEqual(columns['feature1']['max'], 7.0)
+        self.assertEqual(columns['feature1']['quantiles']['0.5'], 4.0)
+        self.assertEqual(columns['label']['kind'], 'categorical')
+        self.assertEqual(columns['label']['n_unique'], 2)
+
+class DatasetVersionTests(MediaTestCase):
+    def test_append_creates_version_and_retrains(self):
+        file = SimpleUploadedFile("base.csv", make_csv(80), content_type="text/csv")
+        response = self.client.post('/api/datasets/upload/', {'file': file}, format='multipart')
+        parent_id = response.data['id']
+        model = MLModel.objects.create(name="lr", model_type="linear_regression")
+
+        file = SimpleUploadedFile("more.csv", make_csv(40, seed=1), content_type="text/csv")
+        response = self.client.post(f'/api/datasets/{parent_id}/append/', {
+            'file': file,
+            'retrain_models': json.dumps([model.id]),
+            'target_columns': json.dumps(['target']),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        version = Dataset.objects.get(id=response.data['id'])
+        self.assertEqual(version.version, 2)
+        self.assertEqual(version.row_count, 120)
+        self.assertEqual(len(version.segment_paths()), 2)
+        self.assertEqual(version.profile['columns']['x1']['non_null_count'], 120)
+
+        retrained = response.data['retrained']
+        self.assertEqual(len(retrained), 1)
+        self.assertFalse(retrained[0]['warm_started'])
+        result = TrainingResult.objects.get(id=retrained[0]['id'])
+        self.assertEqual(result.target_column, 'target')
+        self.assertTrue(result.model_file)
+
+    def warm_start_retrain(self, model_type, **hyperparameters):
+        """Train model_type on an 80-row base, append 60 rows and retrain; returns both pipelines"""
+        from .artifacts import load_pipeline, load_predictions
+
+        file = SimpleUploadedFile("base.csv", make_csv(80), content_type="text/csv")
+        parent_id = self.client.post('/api/datasets/upload/', {'file': file},
+                                     format='multipart').data['id']
+        model = MLModel.objects.create(name=model_type, model_type=model_type,
+                                       hyperparameters=hyperparameters)
+        response = self.client.post(f'/api/models/{model.id}/train/', {
+            'dataset_id': parent_id, 'target_column': 'target'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        base = load_pipeline(TrainingResult.objects.get(dataset_id=parent_id))
+
+        file = SimpleUploadedFile("more.csv", make_csv(60, seed=1), content_type="text/csv")
+        response = self.client.post(f'/api/datasets/{parent_id}/append/', {
+            'file': file,
+            'retrain_models': json.dumps([model.id]),
+            'target_columns': json.dumps(['target']),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        retrained = response.data['retrained'][0]
+        self.assertTrue(retrained['warm_started'])
+        result = TrainingResult.objects.get(id=retrained['id'])
+        # Scored on the holdout of the 60 appended rows only, which follow the 80 base rows
+        holdout = load_predictions(result)
+        self.assertEqual(len(holdout['y_true']), 12)
+        self.assertGreaterEqual(holdout['index'].min(), 80)
+        self.assertLess(holdout['index'].max(), 140)
+        return base, load_pipeline(result)
+
+    def test_append_warm_starts_random_forest(self):
+        base, retrained = self.warm_start_retrain('random_forest', n_estimators=10, random_state=0)
+        old, new = base.named_steps['regressor'], retrained.named_steps['regressor']
+        self.assertEqual(len(old.estimators_), 10)
+        self.assertEqual(len(new.estimators_), 20)
+        # The first trees are the base model's, the added ones were fitted on the new rows
+        np.testing.assert_array_equal(new.estimators_[0].tree_.threshold,
+                                      old.estimators_[0].tree_.threshold)
+        self.assertTrue(all(tree.tree_.n_node_samples[0] <= 48 for tree in new.estimators_[10:]))
+
+    def test_append_warm_starts_xgboost(self):
+        base, retrained = self.warm_start_retrain('xgboost', n_estimators=5, max_depth=2)
+        self.assertEqual(base.named_steps['regressor'].get_booster().num_boosted_rounds(), 5)
+        self.assertEqual(retrained.named_steps['regressor'].get_booster().num_boosted_rounds(), 10)
+
+    def test_warm_started_results_score_subgroups(self):
+        from sklearn.metrics import mean_absolute_error
+        from .artifacts import load_predictions
+
+        self.warm_start_retrain('random_forest', n_estimators=5, random_state=0)
+        result = TrainingResult.objects.get(dataset__parent__isnull=False)
+        holdout = load_predictions(result)
+        df = pd.concat([pd.read_csv(path) for path in result.dataset.segment_paths()],
+                       ignore_index=True)
+        np.testing.assert_allclose(df['target'].to_numpy()[holdout['index']], holdout['y_true'])
+
+        # Select half of the holdout rows by their feature values
+        response = self.client.post('/api/results/metrics/', {
+            'result_ids': [result.id], 'metrics': ['mae'],
+            'where': {'x1': df['x1'].to_numpy()[holdout['index'][:6]].tolist()},
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        expected = mean_absolute_error(holdout['y_true'][:6], holdout['y_pred'][:6])
+        self.assertAlmostEqual(response.data['results'][str(result.id)]['mae'], expected, places=10)
+
+    def test_append_rejects_different_columns(self):
+        file = SimpleUploadedFile("base.csv", make_csv(10), content_type="text/csv")
+        response = self.client.post('/api/datasets/upload/', {'file': file}, format='multipart')
+        file = SimpleUploadedFile("other.csv", b"a,b\n1,2", content_type="text/csv")
+        response = self.client.post(f"/api/datasets/{response.data['id']}/append/",
+                                    {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+class LearningCurveTests(MediaTestCase):
+    def setUp(self):
+        file = SimpleUploadedFile("curve.csv", make_csv(200), content_type="text/csv")
+        response = self.client.post('/api/datasets/upload/', {'file': file}, format='multipart')
+        self.dataset_id = response.data['id']
+
+    def test_learning_curve(self):
+        for model_type in ['linear_regression', 'random_forest']:
+            response = self.client.post(f'/api/datasets/{self.dataset_id}/learning_curve/', {
+                'target_column': 'target',
+                'model_type': model_type,
+                'hyperparameters': {'n_estimators': 10} if model_type == 'random_forest' else {},
+                'fractions': [0.25, 0.5, 1.0],
+            }, format='json')
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual(response.data['incremental'], model_type == 'linear_regression')
+            points = response.data['points']
+            self.assertEqual([p['n_samples'] for p in points], [40, 80, 160])
+            self.assertGreater(points[-1]['validation']['r2_score'], 0.8)
+            self.assertIn('r2_score', points[0]['train'])
+
+    def test_incremental_linear_fits_match_sklearn(self):
+        from sklearn.linear_model import LinearRegression
+        from .ml_utils import incremental_linear_fits
+
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(300, 4))
+        X[:, 3] = 2 * X[:, 2]  # collinear columns, as one-hot encodings can be
+        y = X @ np.array([1.0, -2.0, 0.5, 0.0]) + 3 + rng.normal(size=300)
+        for n, coef, intercept in incremental_linear_fits(X, y, [30, 120, 300]):
+            expected = LinearRegression().fit(X[:n], y[:n]).predict(X)
+            np.testing.assert_allclose(X @ coef + intercept, expected, atol=1e-8)
+
+    def test_invalid_config(self):
+        response = self.client.post(f'/api/datasets/{self.dataset_id}/learning_curve/', {
+            'target_column': 'target', 'model_type': 'linear_regression', 'fractions': [0, 2],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
 class MLModelTests(TestCase):
     def test_create_model(self):
         model = MLModel.objects.create(
@@ -27,6 +223,63 @@ class MLModelTests(TestCase):
         self.assertEqual(model.name, "Test Model")
         self.assertEqual(model.model_type, "linear_regression")
 
+class EstimatorRegistryTests(TestCase):
+    def tearDown(self):
+        estimators._registry.pop('dummy', None)
+
+    def test_builtin_hyperparameters_validated(self):
+        serializer = MLModelSerializer(data={
+            'name': 'lr', 'model_type': 'linear_regression',
+            'hyperparameters': {'fit_intercept': True, 'normalize': False}
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        serializer = MLModelSerializer(data={
+            'name': 'knn', 'model_type': 'knn', 'hyperparameters': {'max_depth': 3}
+        })
+        self.assertFalse(serializer.is_valid())
+
+    def test_register_new_model_type(self):
+        spec = estimators.register_estimator(
+            'dummy', 'Dummy', 'sklearn.dummy:DummyRegressor', ['strategy']
+        )
+        self.assertIsNone(spec._estimator_class)
+
+        serializer = MLModelSerializer(data={
+            'name': 'baseline', 'model_type': 'dummy', 'hyperparameters': {'strategy': 'median'}
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        model = estimators.create_estimator('dummy', {'strategy': 'median'})
+        self.assertEqual(model.strategy, 'median')
+
+    def test_hist_gradient_boosting_uses_native_categories(self):
+        serializer = MLModelSerializer(data={
+            'name': 'hgb', 'model_type': 'hist_gradient_boosting',
+            'hyperparameters': {'max_iter': 50, 'early_stopping': True, 'n_estimators': 10}
+        })
+        self.assertFalse(serializer.is_valid())
+
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({'x': rng.normal(size=2000),
+                           'city': rng.choice([f'c{i}' for i in range(40)], size=2000)})
+        df['target'] = df['x'] + df['city'].str[1:].astype(int) / 10
+        df.loc[::9, 'city'] = np.nan
+        df.loc[::7, 'x'] = np.nan
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        df.to_csv(path, index=False)
+        try:
+            trainer = ModelTrainer(path, 'target', 'hist_gradient_boosting', {'max_iter': 50})
+            pipeline, metrics, _, _, model_info = trainer.train_and_evaluate()
+        finally:
+            os.remove(path)
+
+        # 40 cities stay one ordinal-coded column instead of being one-hot encoded
+        self.assertEqual(model_info['encodings'], {'city': 'native'})
+        self.assertEqual(model_info['n_encoded_features'], 2)
+        self.assertEqual(pipeline.named_steps['regressor'].categorical_features, [1])
+        self.assertGreater(metrics['r2_score'], 0.7)
+
 class TrainingResultTests(TestCase):
     def setUp(self):
         # Create test dataset and model
@@ -45,4 +298,1181 @@ class TrainingResultTests(TestCase):
             model=self.model,
             metrics={"r2_score": 0.95}
         )
-        self.assertEqual(result.metrics["r2_score"], 0.95) 
\ No newline at end of file
+        self.assertEqual(result.metrics["r2_score"], 0.95) 
+
+class ResultWriterTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media)
+        self.settings_override.enable()
+        self.dataset = Dataset.objects.create(name="writer.csv", file="datasets/writer.csv")
+
+    def tearDown(self):
+        import shutil
+        self.settings_override.disable()
+        shutil.rmtree(self.media)
+
+    def queue_result(self, writer):
+        from sklearn.linear_model import LinearRegression
+        from .models import FitRecord
+
+        serializer = MLModelSerializer(data={'name': 'lr', 'model_type': 'linear_regression',
+                                             'hyperparameters': {}})
+        self.assertTrue(serializer.is_valid())
+        ml_model = writer.add_model(serializer)
+        X, y = pd.DataFrame({'x': [0.0, 1.0, 2.0]}), pd.Series([1.0, 3.0, 5.0])
+        result = writer.add_result(LinearRegression().fit(X, y), predictions=(y, y.to_numpy()),
+                                   dataset=self.dataset, model=ml_model, target_column='y',
+                                   metrics={'r2_score': 1.0})
+        writer.add_fit(FitRecord(model_type='linear_regression', n_rows=3, n_features=1,
+                                 fit_seconds=0.1))
+        return result
+
+    def test_flush_writes_everything_together(self):
+        from .models import FitRecord
+        from .persistence import ResultWriter
+
+        writer = ResultWriter()
+        result = self.queue_result(writer)
+        # Nothing reaches the database before the flush
+        self.assertFalse(MLModel.objects.exists())
+        self.assertFalse(TrainingResult.objects.exists())
+        writer.flush()
+        stored = TrainingResult.objects.get()
+        self.assertEqual(stored.model, MLModel.objects.get())
+        self.assertEqual(FitRecord.objects.count(), 1)
+        # Flushed artifacts belong to saved results and survive the cleanup
+        writer.discard()
+        self.assertTrue(os.path.exists(result.model_file.path))
+        self.assertTrue(os.path.exists(result.predictions_file.path))
+
+    def test_discard_removes_unflushed_artifacts(self):
+        from .persistence import ResultWriter
+
+        writer = ResultWriter()
+        result = self.queue_result(writer)
+        paths = [result.model_file.path, result.predictions_file.path]
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+        writer.discard()
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+        self.assertEqual((writer.models, writer.results, writer.fits), ([], [], []))
+        self.assertFalse(TrainingResult.objects.exists())
+
+    def test_sqlite_connections_are_configured(self):
+        from django.db import connection
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        path = os.path.join(self.media, 'pragma.sqlite3')
+        for synchronous, expected in (('NORMAL', 1), ('FULL', 2)):
+            with override_settings(SQLITE_JOURNAL_MODE='WAL', SQLITE_SYNCHRONOUS=synchronous):
+                wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': path})
+                try:
+                    # Connecting sends connection_created, which applies the PRAGMAs
+                    with wrapper.cursor() as cursor:
+                        cursor.execute('PRAGMA journal_mode')
+                        self.assertEqual(cursor.fetchone()[0], 'wal')
+                        cursor.execute('PRAGMA synchronous')
+                        self.assertEqual(cursor.fetchone()[0], expected)
+                finally:
+                    wrapper.close()
+
+class EncodingTests(TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'Date': ['2024-10-07', '2024-10-08', '2024-10-09', None],
+            'code': ['a1', 'b2', 'c3', 'd4'],
+            'icon': ['04n', '03n', '04n', '04n'],
+        })
+
+    def test_plan_encodings(self):
+        encodings = plan_encodings(self.df, self.df.columns, cardinality_threshold=3)
+        self.assertEqual(encodings, {'Date': 'datetime', 'code': 'frequency', 'icon': 'onehot'})
+
+    def test_datetime_features(self):
+        encoder = DatetimeFeatures().fit(self.df[['Date']])
+        features = encoder.transform(self.df[['Date']])
+        names = encoder.get_feature_names_out().tolist()
+        self.assertEqual(features.shape, (4, len(names)))
+        self.assertEqual(features[0, names.index('Date_dayofweek')], 0)
+        self.assertTrue(pd.isna(features[3, names.index('Date_month')]))
+
+    def test_frequency_encoder_handles_unseen_values(self):
+        encoder = FrequencyEncoder().fit(self.df[['icon']])
+        features = encoder.transform(pd.DataFrame({'icon': ['04n', '01d']}))
+        self.assertEqual(features[:, 0].tolist(), [0.75, 0.0])
+
+
+class TrainingProgressTests(MediaTestCase):
+    def test_progress_events_and_eta(self):
+        progress = TrainingProgress('job')
+        progress.start(total_steps=2)
+        progress.iteration(5, 10, model='rf', target='y')
+        self.assertIsNotNone(progress.eta_seconds())
+        progress.step_completed(model='rf', target='y', metrics={'r2_score': 0.9})
+        progress.publish('completed', status='completed')
+
+        events = list(progress.iter_events())
+        self.assertEqual([e['event'] for e in events],
+                         ['stage', 'iteration', 'model_completed', 'completed'])
+        self.assertEqual(events[2]['completed_steps'], 1)
+        # Resuming from an event id only replays later events
+        self.assertEqual(len(list(progress.iter_events(last_event_id=2))), 1)
+
+    def test_event_stream_endpoint(self):
+        progress = start_progress('stream-job')
+        progress.start(total_steps=1)
+        progress.step_completed(model='lr', target='y', metrics={})
+        progress.publish('completed', status='completed')
+
+        response = self.client.get('/api/train/stream-job/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('event: model_completed', body)
+        self.assertTrue(body.rstrip().splitlines()[-1].startswith('data: '))
+
+        response = self.client.get('/api/train/stream-job/status/')
+        self.assertEqual(response.json()['status'], 'completed')
+
+    def test_unknown_jobs_are_not_created(self):
+        self.assertEqual(self.client.get('/api/train/no-such-job/events/').status_code, 404)
+        self.assertEqual(self.client.get('/api/train/no-such-job/status/').status_code, 404)
+        self.assertEqual(self.client.post('/api/train/no-such-job/cancel/').status_code, 404)
+        self.assertIsNone(find_progress('no-such-job'))
+
+
+class CompiledPredictorTests(MediaTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            'x1': rng.normal(size=120),
+            'x2': rng.normal(size=120),
+            'icon': rng.choice(['01d', '02d', '04n'], size=120),
+        })
+        df['target'] = 2 * df['x1'] + (df['icon'] == '04n') + rng.normal(scale=0.1, size=120)
+        df.loc[::7, 'x2'] = np.nan
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        df.to_csv(self.path, index=False)
+        self.rows = [
+            {'x1': 0.5, 'x2': None, 'icon': '04n'},
+            {'x1': -1.0, 'x2': 0.3, 'icon': 'unseen'},
+        ]
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def train(self, model_type, hyperparameters=None):
+        trainer = ModelTrainer(self.path, 'target', model_type, hyperparameters or {})
+        pipeline = trainer.train_and_evaluate()[0]
+        return trainer, pipeline
+
+    def test_compiled_matches_pipeline(self):
+        for model_type in ['linear_regression', 'random_forest', 'xgboost']:
+            _, pipeline = self.train(model_type, {'n_estimators': 10} if model_type != 'linear_regression' else {})
+            expected = pipeline.predict(pd.DataFrame(self.rows))
+            predicted = compile_pipeline(pipeline).predict(self.rows)
+            np.testing.assert_allclose(predicted, expected, rtol=1e-4, err_msg=model_type)
+
+    def test_predict_endpoint(self):
+        dataset = Dataset.objects.create(name='d.csv', file='d.csv')
+        model = MLModel.objects.create(name='lr', model_type='linear_regression')
+        for model_type, kind in [('linear_regression', 'compiled'), ('knn', 'pipeline')]:
+            trainer, pipeline = self.train(model_type)
+            result = TrainingResult.objects.create(dataset=dataset, model=model, metrics={})
+            save_pipeline(result, pipeline, X_sample=trainer.X_test)
+
+            response = self.client.post(f'/api/results/{result.id}/predict/',
+                                        {'rows': self.rows}, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['predictor'], kind)
+            np.testing.assert_allclose(response.data['predictions'],
+                                       pipeline.predict(pd.DataFrame(self.rows)))
+
+        response = self.client.post(f'/api/results/{result.id}/predict/', {'rows': 'x'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/api/results/prediction_stats/')
+        self.assertEqual(response.data[str(result.id)]['requests'], 1)
+
+    @override_settings(PREDICTION_TIMEOUT_SECONDS=0.1)
+    def test_predict_times_out_on_stuck_batcher(self):
+        from .artifacts import predictor_key
+        from .batching import _batchers, _batchers_lock
+
+        dataset = Dataset.objects.create(name='d.csv', file='d.csv')
+        model = MLModel.objects.create(name='lr', model_type='linear_regression')
+        trainer, pipeline = self.train('linear_regression')
+        result = TrainingResult.objects.create(dataset=dataset, model=model, metrics={})
+        save_pipeline(result, pipeline, X_sample=trainer.X_test)
+
+        release = threading.Event()
+        stuck = PredictionBatcher(lambda rows: release.wait() and np.zeros(len(rows)))
+        with _batchers_lock:
+            _batchers[predictor_key(result)] = stuck
+        try:
+            response = self.client.post(f'/api/results/{result.id}/predict/',
+                                        {'rows': self.rows}, format='json')
+            self.assertEqual(response.status_code, 503)
+        finally:
+            release.set()
+            stuck.close()
+            with _batchers_lock:
+                _batchers.pop(predictor_key(result), None)
+
+class PredictionBatcherTests(TestCase):
+    def test_concurrent_requests_are_coalesced(self):
+        batch_sizes = []
+
+        def predict(rows):
+            batch_sizes.append(len(rows))
+            return np.array([row['x'] * 2.0 for row in rows])
+
+        batcher = PredictionBatcher(predict, max_batch_size=8, max_wait=0.05)
+        results = {}
+
+        def call(i):
+            results[i] = batcher.predict([{'x': i}, {'x': -i}])
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        batcher.close()
+
+        for i in range(12):
+            self.assertEqual(results[i].tolist(), [2.0 * i, -2.0 * i])
+        self.assertEqual(sum(batch_sizes), 24)
+        self.assertLessEqual(max(batch_sizes), 8)
+        self.assertLess(len(batch_sizes), 12)
+        stats = batcher.snapshot()
+        self.assertEqual(stats['rows'], 24)
+        self.assertEqual(stats['queue_depth'], 0)
+
+    def test_dead_batcher_is_replaced(self):
+        from .batching import _batchers, _batchers_lock, submit_prediction
+
+        double = lambda rows: np.array([row['x'] * 2.0 for row in rows])
+        first = submit_prediction('dead-key', [{'x': 1}], double, 8, 0.001, 4)
+        self.assertEqual(first.result(timeout=5).tolist(), [2.0])
+        with _batchers_lock:
+            dead = _batchers['dead-key']
+        dead.close()
+        dead._worker.join(timeout=5)
+        self.assertFalse(dead.alive)
+        self.assertEqual(submit_prediction('dead-key', [{'x': 2}], double, 8, 0.001, 4)
+                         .result(timeout=5).tolist(), [4.0])
+        with _batchers_lock:
+            self.assertIsNot(_batchers.pop('dead-key'), dead)
+
+    def test_bad_request_does_not_fail_batch(self):
+        batcher = PredictionBatcher(lambda rows: np.array([float(row['x']) for row in rows]),
+                                    max_batch_size=8, max_wait=0.05)
+        good, bad = batcher.submit([{'x': 1}]), batcher.submit([{'y': 1}])
+        self.assertEqual(good.result().tolist(), [1.0])
+        with self.assertRaises(KeyError):
+            bad.result()
+        batcher.close()
+        self.assertEqual(batcher.snapshot()['errors'], 1)
+
+class UploadDeduplicationTests(MediaTestCase):
+    def test_identical_uploads_share_blob(self):
+        content = make_csv(60)
+        ids = []
+        for name in ['first.csv', 'second.csv']:
+            file = SimpleUploadedFile(name, content, content_type="text/csv")
+            response = self.client.post('/api/datasets/upload/', {'file': file}, format='multipart')
+            self.assertEqual(response.status_code, 201)
+            ids.append(response.data['id'])
+
+        first, second = Dataset.objects.get(id=ids[0]), Dataset.objects.get(id=ids[1])
+        self.assertEqual(second.name, 'second.csv')
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(first.content_hash, second.content_hash)
+        self.assertEqual(second.profile, first.profile)
+
+        file = SimpleUploadedFile("other.csv", make_csv(60, seed=1), content_type="text/csv")
+        response = self.client.post('/api/datasets/upload/', {'file': file}, format='multipart')
+        self.assertNotEqual(Dataset.objects.get(id=response.data['id']).file.name, first.file.name)
+
+    def test_training_reuses_stored_upload(self):
+        content = make_csv(60)
+        for _ in range(2):
+            response = self.client.post('/api/train/', {
+                'file': SimpleUploadedFile("train.csv", content, content_type="text/csv"),
+                'models': json.dumps([{'name': 'lr', 'model_type': 'linear_regression',
+                                       'hyperparameters': {}}]),
+                'target_columns': json.dumps(['target']),
+            }, format='multipart')
+            self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len({d.file.name for d in Dataset.objects.all()}), 1)
+
+class EnsembleTests(MediaTestCase):
+    def test_blend_stored_results(self):
+        response = self.client.post('/api/train/', {
+            'file': SimpleUploadedFile("blend.csv", make_csv(200), content_type="text/csv"),
+            'models': json.dumps([
+                {'name': 'lr', 'model_type': 'linear_regression', 'hyperparameters': {}},
+                {'name': 'knn', 'model_type': 'knn', 'hyperparameters': {'n_neighbors': 5}},
+            ]),
+            'target_columns': json.dumps(['target']),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        result_ids = [int(r['id']) for r in response.data]
+
+        response = self.client.post('/api/results/ensemble/', {'result_ids': result_ids}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(set(response.data['base_metrics']), {str(i) for i in result_ids})
+        self.assertGreater(response.data['metrics']['r2_score'], 0.9)
+        weights = response.data['feature_importance']
+        self.assertTrue(all(w >= 0 for w in weights.values()))
+        self.assertEqual(TrainingResult.objects.get(id=response.data['id']).model.model_type, 'ensemble')
+
+        rows = [{'x1': 1.0, 'x2': 0.0}, {'x1': -1.0, 'x2': 2.0}]
+        response = self.client.post(f"/api/results/{response.data['id']}/predict/",
+                                    {'rows': rows}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        # target = 3 * x1 - x2
+        np.testing.assert_allclose(response.data['predictions'], [3.0, -5.0], atol=0.6)
+
+    def test_rejects_mixed_targets(self):
+        dataset = Dataset.objects.create(name='d.csv', file='d.csv')
+        model = MLModel.objects.create(name='lr', model_type='linear_regression')
+        ids = [TrainingResult.objects.create(dataset=dataset, model=model, target_column=t).id
+               for t in ['a', 'b']]
+        response = self.client.post('/api/results/ensemble/', {'result_ids': ids}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+class MetricRecomputationTests(MediaTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({'x1': rng.normal(size=200), 'group': rng.choice(['a', 'b'], size=200)})
+        df['target'] = 3 * df['x1'] + 10 + rng.normal(scale=0.5, size=200)
+        response = self.client.post('/api/train/', {
+            'file': SimpleUploadedFile("groups.csv", df.to_csv(index=False).encode(),
+                                       content_type="text/csv"),
+            'models': json.dumps([
+                {'name': 'lr', 'model_type': 'linear_regression', 'hyperparameters': {}},
+                {'name': 'knn', 'model_type': 'knn', 'hyperparameters': {}},
+            ]),
+            'target_columns': json.dumps(['target']),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.df = df
+        self.results = {r['id']: r for r in response.data}
+
+    def test_recomputed_metrics_match_training(self):
+        response = self.client.post('/api/results/metrics/', {
+            'result_ids': [int(i) for i in self.results], 'metrics': ['r2_score', 'rmse', 'mape'],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        for result_id, values in response.data['results'].items():
+            trained = self.results[result_id]['metrics']
+            self.assertAlmostEqual(values['r2_score'], trained['r2_score'], places=10)
+            self.assertAlmostEqual(values['rmse'], trained['rmse'], places=10)
+
+    def test_subgroup_metrics(self):
+        from sklearn.metrics import mean_absolute_percentage_error
+        from .artifacts import load_predictions
+
+        response = self.client.post('/api/results/metrics/', {
+            'metrics': ['mape', 'quantile_loss_90'], 'where': {'group': 'a'},
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        for result_id, values in response.data['results'].items():
+            arrays = load_predictions(TrainingResult.objects.get(id=result_id))
+            keep = (self.df['group'].to_numpy() == 'a')[arrays['index']]
+            expected = mean_absolute_percentage_error(arrays['y_true'][keep], arrays['y_pred'][keep])
+            self.assertAlmostEqual(values['mape'], expected, places=10)
+
+    def test_unknown_metric(self):
+        response = self.client.post('/api/results/metrics/', {'metrics': ['nope']}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+class BootstrapTests(MediaTestCase):
+    def test_batched_resamples_match_scikit_learn(self):
+        from sklearn.metrics import mean_absolute_error, r2_score
+        from .scoring import bootstrap_values
+
+        rng = np.random.default_rng(0)
+        y_true = rng.normal(size=300) + 1000
+        y_pred = y_true + rng.normal(size=300)
+        values = bootstrap_values(y_true, [y_pred], n_resamples=5, seed=1)
+        index = np.random.default_rng(1).integers(0, 300, size=(5, 300))
+        np.testing.assert_allclose(values['r2_score'][0], [r2_score(y_true[i], y_pred[i]) for i in index])
+        np.testing.assert_allclose(values['mae'][0],
+                                   [mean_absolute_error(y_true[i], y_pred[i]) for i in index])
+        with self.assertRaises(ValueError):
+            bootstrap_values(y_true, [y_pred], ['max_error'])
+
+    def test_training_reports_intervals_and_paired_differences(self):
+        response = self.client.post('/api/train/', {
+            'file': SimpleUploadedFile("ci.csv", make_csv(300), content_type="text/csv"),
+            'models': json.dumps([
+                {'name': 'lr', 'model_type': 'linear_regression', 'hyperparameters': {}},
+                {'name': 'knn', 'model_type': 'knn', 'hyperparameters': {}},
+            ]),
+            'target_columns': json.dumps(['target']),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        cells = {cell['model']: cell for cell in response.data}
+        lr = cells['lr']['metrics']
+        interval = lr['confidence_intervals']['r2_score']
+        self.assertLessEqual(interval['low'], lr['r2_score'])
+        self.assertLessEqual(lr['r2_score'], interval['high'])
+
+        # The near-exact linear fit is the reference, and clearly ahead of knn
+        self.assertEqual(lr['paired_differences']['reference'], cells['lr']['id'])
+        self.assertEqual(lr['paired_differences']['r2_score']['difference'], 0)
+        knn = cells['knn']['metrics']['paired_differences']['r2_score']
+        self.assertLess(knn['high'], 0)
+        self.assertEqual(knn['probability_better'], 0)
+        stored = TrainingResult.objects.get(id=cells['knn']['id']).metrics
+        self.assertEqual(stored['paired_differences']['reference'], cells['lr']['id'])
+
+        response = self.client.post('/api/results/compare/', {
+            'result_ids': [int(cell['id']) for cell in response.data],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['reference'], cells['lr']['id'])
+        self.assertEqual(response.data['results'][cells['knn']['id']]['r2_score'], knn)
+
+class ExportTests(MediaTestCase):
+    def setUp(self):
+        response = self.client.post('/api/train/', {
+            'file': SimpleUploadedFile("export.csv", make_csv(100), content_type="text/csv"),
+            'models': json.dumps([
+                {'name': 'lr', 'model_type': 'linear_regression', 'hyperparameters': {}},
+                {'name': 'knn', 'model_type': 'knn', 'hyperparameters': {}},
+            ]),
+            'target_columns': json.dumps(['target']),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def read(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_and_ndjson(self):
+        import io
+
+        df = pd.read_csv(io.BytesIO(self.read('/api/results/export/csv/')))
+        self.assertEqual(len(df), 2)
+        self.assertIn('metric.r2_score', df.columns)
+        self.assertIn('metric.confidence_intervals.r2_score.low', df.columns)
+        self.assertIn('importance.x1', df.columns)
+
+        lines = self.read('/api/results/export/ndjson/?model_type=knn').decode().splitlines()
+        self.assertEqual([json.loads(line)['model_type'] for line in lines], ['knn'])
+
+        df = pd.read_csv(io.BytesIO(self.read('/api/results/export/csv/?predictions=true')))
+        self.assertEqual(len(df), 2 * 20)
+        self.assertEqual(list(df.columns[-3:]), ['row_index', 'y_true', 'y_pred'])
+
+    def test_parquet(self):
+        import io
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+
+        table = pq.read_table(io.BytesIO(self.read('/api/results/export/parquet/?predictions=true')))
+        self.assertEqual(table.num_rows, 40)
+
+        # The paired comparison's reference id is text, next to numeric metrics
+        table = pq.read_table(io.BytesIO(self.read('/api/results/export/parquet/')))
+        self.assertEqual(table.num_rows, 2)
+        self.assertEqual(str(table.schema.field('metric.paired_differences.reference').type), 'string')
+        self.assertEqual(str(table.schema.field('metric.r2_score').type), 'double')
+        lr = TrainingResult.objects.get(model__name='lr')
+        self.assertEqual(set(table.column('metric.paired_differences.reference').to_pylist()),
+                         {lr.metrics['paired_differences']['reference']})
+
+    def test_results_written_during_export_do_not_break_it(self):
+        import io
+        from .exports import stream_export
+
+        chunks = stream_export(TrainingResult.objects.order_by('id'), 'csv')
+        # The header pass has run; new results and new keys arrive before the rows are read
+        lr = TrainingResult.objects.get(model__name='lr')
+        lr.metrics = {**lr.metrics, 'late_metric': 1.0}
+        lr.save()
+        TrainingResult.objects.create(dataset=lr.dataset, model=lr.model, target_column='target',
+                                      metrics={'other_metric': 2.0})
+
+        df = pd.read_csv(io.BytesIO(''.join(chunks).encode()))
+        self.assertEqual(len(df), 2)
+        self.assertNotIn('metric.late_metric', df.columns)
+
+    def test_list_filters(self):
+        response = self.client.get('/api/results/?model_type=linear_regression')
+        self.assertEqual([r['model'] for r in response.data], ['lr'])
+        response = self.client.get('/api/results/?created_after=not-a-date')
+        self.assertEqual(response.status_code, 400)
+
+class FeatureSelectionTests(MediaTestCase):
+    def make_wide_csv(self, n_rows=300):
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            'Plot ID': np.arange(n_rows) % 100,
+            'station': ['A'] * n_rows,
+            'x1': rng.normal(size=n_rows),
+            'x2': rng.normal(size=n_rows),
+        })
+        df['x1_copy'] = df['x1'] * 2 + 1
+        df['target'] = 3 * df['x1'] - df['x2'] + rng.normal(scale=0.1, size=n_rows)
+        return df.to_csv(index=False).encode()
+
+    def test_training_drops_constant_id_and_correlated_columns(self):
+        response = self.client.post('/api/train/', {
+            'file': SimpleUploadedFile("wide.csv", self.make_wide_csv(), content_type="text/csv"),
+            'models': json.dumps([{'name': 'lr', 'model_type': 'linear_regression',
+                                   'hyperparameters': {}}]),
+            'target_columns': json.dumps(['target']),
+            'feature_selection': json.dumps(True),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        model_info = response.data[0]['model_info']
+        self.assertEqual(model_info['feature_names'], ['x1', 'x2'])
+        dropped = model_info['dropped_features']
+        self.assertEqual(dropped['Plot ID']['reason'], 'id_like')
+        self.assertEqual(dropped['station']['reason'], 'constant')
+        self.assertEqual(dropped['x1_copy'], {'reason': 'correlated', 'with': 'x1',
+                                              'correlation': 1.0})
+        self.assertGreater(response.data[0]['metrics']['r2_score'], 0.95)
+
+        # Statistics are cached with the profile and shared by later duplicate uploads
+        statistics = Dataset.objects.get().profile['feature_statistics']
+        self.assertIn(['x1', 'x1_copy', 1.0], statistics['correlated_pairs'])
+
+    def test_model_filter_uses_training_rows_only(self):
+        from .selection import model_filter, select_features, compute_feature_statistics
+
+        rng = np.random.default_rng(1)
+        df = pd.DataFrame({'signal': rng.normal(size=400), 'noise': rng.normal(size=400)})
+        df['target'] = 5 * df['signal']
+        profile = profile_dataframe(df)
+        self.assertEqual(select_features(profile, 'target',
+                                         compute_feature_statistics(df, profile)), {})
+        dropped = model_filter(df, 'target', profile, {}, min_importance=0.05)
+        self.assertEqual(list(dropped), ['noise'])
+        self.assertEqual(dropped['noise']['reason'], 'low_importance')
+
+    def test_rejects_unknown_options(self):
+        response = self.client.post('/api/train/', {
+            'file': SimpleUploadedFile("wide.csv", self.make_wide_csv(), content_type="text/csv"),
+            'models': json.dumps([{'name': 'lr', 'model_type': 'linear_regression',
+                                   'hyperparameters': {}}]),
+            'target_columns': json.dumps(['target']),
+            'feature_selection': json.dumps({'threshold': 0.9}),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('threshold', response.data['error'])
+
+class QuickCompareTests(MediaTestCase):
+    def test_only_leaders_are_trained_on_all_rows(self):
+        response = self.client.post('/api/train/', {
+            'file': SimpleUploadedFile("quick.csv", make_csv(2000), content_type="text/csv"),
+            'models': json.dumps([
+                {'name': 'stump', 'model_type': 'random_forest',
+                 'hyperparameters': {'n_estimators': 5, 'max_depth': 1}},
+                {'name': 'lr', 'model_type': 'linear_regression', 'hyperparameters': {}},
+                {'name': 'knn', 'model_type': 'knn', 'hyperparameters': {'n_neighbors': 5}},
+            ]),
+            'target_columns': json.dumps(['target']),
+            'job_id': 'quick-job',
+            'quick_compare': json.dumps({'first_rung': 200, 'leaders': 1}),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        cells = {cell['model']: cell for cell in response.data}
+        self.assertEqual(cells['lr']['status'], 'completed')
+        # Halving keeps two of three configs after the first rung, one after the second
+        self.assertEqual([rung['n_samples'] for rung in cells['lr']['rungs']], [200, 800])
+        self.assertEqual(len(cells['knn']['rungs']), 2)
+        self.assertEqual(cells['knn']['status'], 'eliminated')
+        self.assertEqual(cells['stump']['status'], 'eliminated')
+        self.assertEqual(len(cells['stump']['rungs']), 1)
+        self.assertIsNone(cells['stump']['id'])
+        self.assertLess(cells['stump']['metrics']['r2_score'],
+                        cells['lr']['rungs'][0]['metrics']['r2_score'])
+        self.assertEqual(TrainingResult.objects.count(), 1)
+        self.assertEqual(MLModel.objects.count(), 1)
+
+        rankings = [event for event in find_progress('quick-job').events
+                    if event['event'] == 'ranking']
+        self.assertEqual(rankings[0]['ranking'][0]['model'], 'lr')
+        self.assertEqual(rankings[0]['n_samples'], 200)
+
+    def test_subsample_fits_are_time_limited(self):
+        started = time.monotonic()
+        response = self.client.post('/api/train/', {
+            'file': SimpleUploadedFile("quick.csv", make_csv(2000), content_type="text/csv"),
+            'models': json.dumps([
+                {'name': 'lr', 'model_type': 'linear_regression', 'hyperparameters': {}},
+                {'name': 'huge forest', 'model_type': 'random_forest', 'time_limit': 0.2,
+                 'hyperparameters': {'n_estimators': 3000}},
+                {'name': 'knn', 'model_type': 'knn', 'hyperparameters': {}},
+            ]),
+            'target_columns': json.dumps(['target']),
+            'quick_compare': json.dumps({'first_rung': 200, 'leaders': 1}),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertLess(time.monotonic() - started, 15)
+        cells = {cell['model']: cell for cell in response.data}
+        self.assertEqual(cells['huge forest']['status'], 'eliminated')
+        self.assertIn('time limit', cells['huge forest']['rungs'][0]['error'])
+        self.assertEqual(cells['lr']['status'], 'completed')
+
+    def test_subsample_trainer_ships_only_sampled_rows(self):
+        import io
+        import pickle
+        from unittest import mock
+
+        df = pd.read_csv(io.BytesIO(make_csv(5000)))
+        trainer = ModelTrainer(dataset_path=df, target_column='target',
+                               model_type='linear_regression', hyperparameters={})
+        subsample = trainer.subsample_trainer(200)
+        payload = pickle.dumps(subsample)
+        # Sampled training rows and the validation rows, not the whole frame
+        self.assertLess(len(payload), len(pickle.dumps(df)))
+        self.assertEqual(len(subsample._subsample_data[1]), 200)
+
+        expected, _ = trainer.subsample_score(200)
+        # The copy is scored without loading or preparing the dataset again
+        with mock.patch.object(ModelTrainer, '_prepare', side_effect=AssertionError):
+            metrics, _ = pickle.loads(payload).subsample_score(200)
+        self.assertAlmostEqual(metrics['r2_score'], expected['r2_score'], places=10)
+
+    def test_eliminated_configs_release_their_rows(self):
+        from .progressive import quick_compare
+
+        class Trainer:
+            def __init__(self, r2):
+                self.r2, self.released = r2, 0
+
+            def subsample_score(self, n_samples):
+                return {'r2_score': self.r2}, 0.0
+
+            def release_subsamples(self):
+                self.released += 1
+
+        trainers = [Trainer(0.9), Trainer(0.1), Trainer(0.8)]
+        released = []
+        leaders, _ = quick_compare(trainers, 10000, {'first_rung': 100, 'growth': 4, 'max_rungs': 3,
+                                                     'leaders': 1, 'margin': 0.5},
+                                   report=lambda *args: released.append([t.released for t in trainers]))
+        self.assertEqual(leaders, [0])
+        # The dominated config lets go of its rows as soon as the first rung ranks it
+        self.assertEqual(released[0], [0, 1, 0])
+        self.assertTrue(all(trainer.released for trainer in trainers))
+
+    def test_stratified_sample_covers_target_range(self):
+        from .ml_utils import stratified_sample
+
+        y = pd.Series(np.arange(1000, dtype=float))
+        positions = stratified_sample(y, 100)
+        self.assertEqual(len(positions), 100)
+        self.assertEqual(np.histogram(y.iloc[positions], bins=np.arange(0, 1001, 100))[0].tolist(),
+                         [10] * 10)
+        self.assertEqual(len(stratified_sample(y, 995)), 1000)
+
+class MetricsTests(MediaTestCase):
+    def test_metrics_endpoint_reports_requests_and_fits(self):
+        self.client.get('/api/datasets/')
+        response = self.client.post('/api/train/', {
+            'file': SimpleUploadedFile("metrics.csv", make_csv(100), content_type="text/csv"),
+            'models': json.dumps([{'name': 'lr', 'model_type': 'linear_regression',
+                                   'hyperparameters': {}}]),
+            'target_columns': json.dumps(['target']),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{method="GET",endpoint="dataset-list",'
+                      'status="200"}', text)
+        self.assertIn('http_request_db_queries_bucket{endpoint="train-multiple-models"', text)
+        self.assertIn('training_fits_total{model_type="linear_regression",status="completed"}', text)
+        self.assertIn('training_fit_duration_seconds_count{model_type="linear_regression",'
+                      'dataset_rows="1e2"}', text)
+        self.assertIn('cache_requests_total{cache="dataset_upload",result="miss"}', text)
+        self.assertIn('training_admission_queued_jobs 0', text)
+        self.assertIn('process_resident_memory_bytes', text)
+
+    def test_fastapi_fits_are_labelled_by_dataset_size(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest import mock
+        from fastapi.testclient import TestClient
+        from app import main
+        from .metrics import FIT_DURATION
+
+        def fit_count(model_type, rows):
+            return sum(value for name, labels, value in FIT_DURATION.samples()
+                       if name.endswith('_count') and labels['model_type'] == model_type
+                       and labels['dataset_rows'] == rows)
+
+        def fit(path, target_column, model_type, hyperparameters):
+            return {'r2_score': 1.0, 'mse': 0.0, 'mae': 0.0, 'rmse': 0.0}
+
+        before = fit_count('linear_regression', '1e3')
+        executor = ThreadPoolExecutor(max_workers=1)
+        with mock.patch.object(main, 'training_executor', executor), \
+                mock.patch.object(main, 'train_model_from_csv', fit), \
+                mock.patch.object(main.db, 'save_models', mock.AsyncMock()):
+            response = TestClient(main.app).post('/train/', files={
+                'file': ('data.csv', make_csv(1500)),
+                'data': (None, json.dumps({'target_column': 'target',
+                                           'models': [{'model_type': 'linear_regression'}]})),
+            })
+        executor.shutdown(wait=True)
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(fit_count('linear_regression', '1e3') - before, 1)
+
+    def test_streaming_responses_are_measured_until_sent(self):
+        from .metrics import REQUEST_QUERIES
+
+        def export_queries():
+            return sum(value for name, labels, value in REQUEST_QUERIES.samples()
+                       if name.endswith('_sum') and 'export' in labels['endpoint'])
+
+        dataset = Dataset.objects.create(name='d.csv', file='d.csv')
+        model = MLModel.objects.create(name='lr', model_type='linear_regression')
+        TrainingResult.objects.create(dataset=dataset, model=model, metrics={'r2_score': 1.0})
+        before = export_queries()
+        response = self.client.get('/api/results/export/csv/')
+        # Nothing is recorded before the body is consumed
+        self.assertEqual(export_queries(), before)
+        b''.join(response.streaming_content)
+        # The header pass and the row query both ran while streaming
+        self.assertGreaterEqual(export_queries() - before, 2)
+
+    def test_histogram_buckets_are_cumulative(self):
+        from .metrics import Histogram, REGISTRY
+
+        histogram = Histogram('test_seconds', 'Test histogram', ['kind'], buckets=(1, 5))
+        REGISTRY.remove(histogram)
+        for value in (0.5, 2, 3, 10):
+            histogram.observe(value, kind='a')
+        samples = {(name, labels.get('le')): value for name, labels, value in histogram.samples()}
+        self.assertEqual(samples[('test_seconds_bucket', '1')], 1)
+        self.assertEqual(samples[('test_seconds_bucket', '5')], 3)
+        self.assertEqual(samples[('test_seconds_bucket', '+Inf')], 4)
+        self.assertEqual(samples[('test_seconds_sum', None)], 15.5)
+        with self.assertRaises(ValueError):
+            histogram.observe(1, kind='a', extra='b')
+
+class LoadTestTests(MediaTestCase):
+    def test_bundled_scenarios_load(self):
+        from .loadtest import SCENARIO_DIR, load_scenario
+
+        for name in sorted(os.listdir(SCENARIO_DIR)):
+            scenario = load_scenario(name[:-len('.json')])
+            self.assertTrue(scenario['stages'])
+            self.assertTrue(scenario['mix'])
+
+    def test_every_endpoint_request_is_accepted(self):
+        from .loadtest import ENDPOINTS, LoadTest
+
+        client = self.client
+
+        class TestClientLoadTest(LoadTest):
+            def request(self, method, path, data=None, files=None):
+                if files:
+                    data = {**(data or {}), **{name: SimpleUploadedFile(filename, content)
+                                               for name, (filename, content) in files.items()}}
+                    response = client.post(path, data, format='multipart')
+                elif method == 'GET':
+                    response = client.get(path)
+                else:
+                    response = client.post(path, data, format='json')
+                return response.status_code, response.content
+
+        scenario = {'name': 'test', 'concurrency': 1, 'unique_uploads': True,
+                    'dataset': {'rows': 200, 'seed': 0},
+                    'setup_models': [{'name': 'lr', 'model_type': 'linear_regression',
+                                      'hyperparameters': {}}],
+                    'stages': [], 'mix': []}
+        load_test = TestClientLoadTest(scenario, 'http://testserver')
+        load_test.setup()
+        self.assertEqual(len(load_test.result_ids), 1)
+        for endpoint in ENDPOINTS:
+            self.assertIn(load_test.send({'endpoint': endpoint, 'rows': 3}), (200, 201), endpoint)
+        # Each upload is distinct content, and the trained result joins the pool
+        self.assertEqual(len(load_test.result_ids), 2)
+
+    def test_report_percentiles_and_errors(self):
+        from .loadtest import build_report, percentile
+
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(percentile([7], 99), 7)
+        records = [{'stage': 0, 'endpoint': 'predict', 'status': 200 if i < 90 else 503,
+                    'latency': (i + 1) / 1000, 'service': 0.001, 'finished': i}
+                   for i in range(100)]
+        report = build_report({'name': 's', 'concurrency': 2, 'stages': [{'arrival_rate': 50}]},
+                              records, [2.0], 'http://x', 'now')
+        stats = report['stages'][0]['endpoints']['predict']
+        self.assertEqual(stats['throughput_rps'], 50)
+        self.assertEqual(stats['errors'], 10)
+        self.assertEqual(stats['latency_ms']['p50'], 50)
+        self.assertEqual(stats['latency_ms']['p99'], 99)
+        self.assertEqual(stats['status_codes'], {'200': 90, '503': 10})
+
+class AdmissionTests(MediaTestCase):
+    def estimate(self, memory_mb, cpu_seconds=10):
+        return {'memory_mb': memory_mb, 'cpu_seconds': cpu_seconds}
+
+    def test_admit_queue_and_reject(self):
+        from .admission import AdmissionController, AdmissionRejected
+
+        controller = AdmissionController(memory_budget_mb=100, max_jobs=4, max_wait=0)
+        first = controller.admit('a', self.estimate(60))
+        with self.assertRaises(AdmissionRejected) as ctx:
+            controller.admit('b', self.estimate(60))
+        self.assertEqual(ctx.exception.status_code, 503)
+        self.assertGreater(ctx.exception.details['estimated_start_seconds'], 9)
+        with self.assertRaises(AdmissionRejected) as ctx:
+            controller.admit('c', self.estimate(500))
+        self.assertEqual(ctx.exception.status_code, 413)
+
+        # A queued job starts as soon as memory is released
+        controller = AdmissionController(memory_budget_mb=100, max_jobs=4, max_wait=30)
+        first = controller.admit('a', self.estimate(60, cpu_seconds=0.1))
+        queued = []
+        thread = threading.Thread(target=lambda: queued.append(
+            controller.admit('b', self.estimate(60), on_queued=lambda **d: queued.append(d))))
+        thread.start()
+        time.sleep(0.05)
+        self.assertEqual(controller.snapshot()['queued_jobs'], 1)
+        controller.release(first)
+        thread.join(timeout=5)
+        self.assertEqual(queued[0]['position'], 1)
+        self.assertEqual(controller.snapshot()['running_jobs'], 1)
+
+    def test_estimate_counts_one_hot_expansion(self):
+        from .admission import estimate_job
+
+        profile = {'row_count': 1000, 'columns': {
+            'x': {'kind': 'numeric', 'n_unique': 1000},
+            'city': {'kind': 'categorical', 'n_unique': 11, 'is_datetime': False},
+            'y': {'kind': 'numeric', 'n_unique': 1000},
+        }}
+        estimate = estimate_job(profile, [{'model_type': 'random_forest', 'hyperparameters': {}},
+                                          {'model_type': 'linear_regression'}], ['y'])
+        self.assertEqual(estimate['encoded_features'], 11)
+        self.assertEqual(len(estimate['models']), 2)
+        self.assertGreater(estimate['models'][0]['memory_mb'], estimate['models'][1]['memory_mb'])
+
+    @override_settings(TRAINING_MEMORY_BUDGET_MB=0.001)
+    def test_training_rejected_over_budget(self):
+        response = self.client.post('/api/train/', {
+            'file': SimpleUploadedFile("big.csv", make_csv(60), content_type="text/csv"),
+            'models': json.dumps([{'name': 'lr', 'model_type': 'linear_regression',
+                                   'hyperparameters': {}}]),
+            'target_columns': json.dumps(['target']),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('estimate', response.data)
+        self.assertFalse(TrainingResult.objects.exists())
+
+class CellFailureTests(MediaTestCase):
+    def test_failed_config_keeps_finished_results(self):
+        response = self.client.post('/api/train/', {
+            'file': SimpleUploadedFile("fail.csv", make_csv(200), content_type="text/csv"),
+            'models': json.dumps([
+                {'name': 'lr', 'model_type': 'linear_regression', 'hyperparameters': {}},
+                # More neighbours than training rows
+                {'name': 'knn', 'model_type': 'knn', 'hyperparameters': {'n_neighbors': 1000}},
+            ]),
+            'target_columns': json.dumps(['target']),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual([cell['status'] for cell in response.data], ['completed', 'failed'])
+        self.assertIsNone(response.data[1]['id'])
+        self.assertIn('n_neighbors', response.data[1]['error'])
+        self.assertEqual(TrainingResult.objects.get().model.name, 'lr')
+        self.assertEqual(MLModel.objects.count(), 2)
+
+class RuntimeEstimatorTests(MediaTestCase):
+    def test_learns_correction_from_recorded_fits(self):
+        from .runtime import RuntimeEstimator, analytic_seconds
+
+        estimator = RuntimeEstimator()
+        self.assertAlmostEqual(estimator.predict('knn', 5000, 10),
+                               analytic_seconds('knn', 5000, 10, {}))
+
+        # Forests that consistently take ten times the analytic estimate
+        records = [('random_forest', n, p, {'n_estimators': trees},
+                    10 * analytic_seconds('random_forest', n, p, {'n_estimators': trees}))
+                   for n in (500, 2000, 8000) for p in (5, 20) for trees in (50, 200)]
+        estimator.fit(records)
+        self.assertIn('random_forest', estimator.by_type)
+        expected = 10 * analytic_seconds('random_forest', 4000, 10, {'n_estimators': 100})
+        predicted = estimator.predict('random_forest', 4000, 10, {'n_estimators': 100})
+        self.assertAlmostEqual(predicted / expected, 1, delta=0.05)
+
+    def test_schedule_summary(self):
+        from .runtime import longest_first, schedule_summary, shortest_first
+
+        cells = [{'predicted_seconds': s} for s in (4.0, 1.0, 2.0, 3.0)]
+        summary = schedule_summary(shortest_first(cells))
+        self.assertEqual(summary['predicted_first_result_seconds'], 1.0)
+        self.assertEqual(summary['predicted_total_seconds'], 10.0)
+        self.assertEqual(summary['predicted_mean_result_seconds'], 5.0)
+        # Longest first spreads the work evenly over two workers
+        self.assertEqual(schedule_summary(longest_first(cells), workers=2)['predicted_total_seconds'], 5.0)
+
+    def test_recorded_fits_drive_the_estimate(self):
+        from .models import FitRecord
+
+        data = lambda: {
+            'file': SimpleUploadedFile("estimate.csv", make_csv(200), content_type="text/csv"),
+            'models': json.dumps([
+                {'name': 'forest', 'model_type': 'random_forest',
+                 'hyperparameters': {'n_estimators': 200}},
+                {'name': 'lr', 'model_type': 'linear_regression', 'hyperparameters': {}},
+            ]),
+            'target_columns': json.dumps(['target']),
+        }
+        response = self.client.post('/api/train/', data(), format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        # Results come back in submission order whatever order the cells ran in
+        self.assertEqual([cell['model'] for cell in response.data], ['forest', 'lr'])
+        records = {r.model_type: r for r in FitRecord.objects.all()}
+        self.assertEqual(set(records), {'linear_regression', 'random_forest'})
+        self.assertEqual(records['random_forest'].hyperparameters, {'n_estimators': 200})
+        self.assertEqual((records['linear_regression'].n_rows,
+                          records['linear_regression'].n_features), (160, 2))
+
+        # Learned from those fits, the forest is predicted slower and scheduled last
+        response = self.client.post('/api/train/estimate/', data(), format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+        cells = response.data['cells']
+        self.assertEqual([cell['model'] for cell in cells], ['lr', 'forest'])
+        self.assertLess(cells[0]['predicted_seconds'], cells[1]['predicted_seconds'])
+        self.assertEqual(response.data['predicted_first_result_seconds'], cells[0]['predicted_seconds'])
+
+class CancellationTests(MediaTestCase):
+    def post_training(self, models, job_id=None):
+        data = {
+            'file': SimpleUploadedFile("cells.csv", make_csv(400), content_type="text/csv"),
+            'models': json.dumps(models),
+            'target_columns': json.dumps(['target']),
+        }
+        if job_id:
+            data['job_id'] = job_id
+        return self.client.post('/api/train/', data, format='multipart')
+
+    def test_time_limit_kills_worker_and_keeps_finished_cells(self):
+        started = time.monotonic()
+        response = self.post_training([
+            {'name': 'lr', 'model_type': 'linear_regression', 'hyperparameters': {}},
+            {'name': 'big forest', 'model_type': 'random_forest', 'time_limit': 0.5,
+             'hyperparameters': {'n_estimators': 20000}},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertLess(time.monotonic() - started, 20)
+        self.assertEqual([cell['status'] for cell in response.data], ['completed', 'timed_out'])
+        self.assertIsNone(response.data[1]['id'])
+        self.assertEqual(TrainingResult.objects.count(), 1)
+
+    @override_settings(TRAINING_FIT_ISOLATION='thread')
+    def test_thread_fit_stops_between_boosting_rounds(self):
+        response = self.post_training([
+            {'name': 'xgb', 'model_type': 'xgboost', 'time_limit': 0.5,
+             'hyperparameters': {'n_estimators': 100000}},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data[0]['status'], 'timed_out')
+        self.assertFalse(TrainingResult.objects.exists())
+
+    def test_cancel_running_job(self):
+        def cancel_when_forest_starts():
+            deadline = time.monotonic() + 10
+            while (progress := find_progress('cancel-job')) is None:
+                if time.monotonic() > deadline:
+                    return
+                time.sleep(0.01)
+            for event in progress.iter_events(heartbeat=0.1):
+                if event and event['event'] == 'model_started' and event['model'] == 'forest':
+                    self.client.post('/api/train/cancel-job/cancel/')
+                    return
+
+        canceller = threading.Thread(target=cancel_when_forest_starts)
+        canceller.start()
+        # Cells run shortest first, so the bigger forest is scheduled after the cancel
+        response = self.post_training([
+            {'name': 'lr', 'model_type': 'linear_regression', 'hyperparameters': {}},
+            {'name': 'forest', 'model_type': 'random_forest',
+             'hyperparameters': {'n_estimators': 20000}},
+            {'name': 'bigger forest', 'model_type': 'random_forest',
+             'hyperparameters': {'n_estimators': 40000}},
+        ], job_id='cancel-job')
+        canceller.join(timeout=5)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([cell['status'] for cell in response.data],
+                         ['completed', 'cancelled', 'cancelled'])
+        progress = find_progress('cancel-job')
+        self.assertEqual(progress.status, 'cancelled')
+        self.assertEqual(progress.events[-1]['result_ids'], [response.data[0]['id']])
+        # Cancelling a finished job is a conflict
+        response = self.client.post('/api/train/cancel-job/cancel/')
+        self.assertEqual(response.status_code, 409)
+
+    def test_job_ids_are_not_reused(self):
+        cancelled = start_progress('reused-job')
+        cancelled.cancel()
+        cancelled.publish('cancelled', status='cancelled')
+
+        response = self.post_training([
+            {'name': 'lr', 'model_type': 'linear_regression', 'hyperparameters': {}},
+        ], job_id='reused-job')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(TrainingResult.objects.exists())
+        # A fresh id is unaffected by the earlier cancellation
+        response = self.post_training([
+            {'name': 'lr', 'model_type': 'linear_regression', 'hyperparameters': {}},
+        ], job_id='fresh-job')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data[0]['status'], 'completed')
+
+@override_settings(TRAINING_EXECUTOR='fleet', FLEET_WORKER_TOKEN='test-token')
+class FleetTests(MediaTestCase):
+    def setUp(self):
+        from .worker import BrokerClient
+
+        test_client = self.client
+
+        class TestBrokerClient(BrokerClient):
+            """Sends worker requests through the Django test client"""
+
+            def _request(self, method, path, data=None, files=None, stream_to=None):
+                headers = {'X-Worker-Token': self.token}
+                if method == 'GET':
+                    response = test_client.get(path, headers=headers)
+                elif files:
+                    payload = dict(data)
+                    payload.update({name: SimpleUploadedFile(name, content)
+                                    for name, content in files.items()})
+                    response = test_client.post(path, payload, format='multipart', headers=headers)
+                else:
+                    response = test_client.post(path, data, format='json', headers=headers)
+                if stream_to is not None:
+                    stream_to.write(b''.join(response.streaming_content)
+                                    if response.streaming else response.content)
+                    return response.status_code, None
+                return response.status_code, response.json() if response.content else None
+
+        self.broker = TestBrokerClient('', token='test-token')
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.cache_dir)
+
+    def upload(self, name, seed=0):
+        response = self.client.post('/api/datasets/upload/', {
+            'file': SimpleUploadedFile(name, make_csv(120, seed=seed), content_type="text/csv")
+        }, format='multipart')
+        return Dataset.objects.get(id=response.data['id'])
+
+    def model(self, model_type, **hyperparameters):
+        return MLModel.objects.create(name=model_type, model_type=model_type,
+                                      hyperparameters=hyperparameters)
+
+    def test_worker_runs_tasks_and_caches_dataset(self):
+        from .fleet import enqueue_tasks, wait_for_tasks
+        from .worker import DatasetCache, Worker
+
+        dataset = self.upload('fleet.csv')
+        enqueue_tasks('fleet-job', dataset, [
+            (self.model('linear_regression'), 'target', None),
+            (self.model('random_forest', n_estimators=10), 'target', None),
+        ])
+        cache = DatasetCache(self.cache_dir)
+        worker = Worker(self.broker, cache, worker_id='w1', isolation='thread')
+        self.assertTrue(worker.run_once())
+        self.assertTrue(worker.run_once())
+        self.assertFalse(worker.run_once())
+        # The dataset crossed the wire once and is reported as cached afterwards
+        self.assertEqual(cache.downloads, 1)
+        self.assertEqual(cache.hashes(), [dataset.content_hash])
+
+        tasks = wait_for_tasks('fleet-job', TrainingProgress('fleet-job'))
+        self.assertEqual([task.status for task in tasks], ['completed', 'completed'])
+        result = tasks[0].result
+        self.assertTrue(result.model_file and result.predictions_file and result.compiled_file)
+        self.assertGreater(result.metrics['r2_score'], 0.9)
+        response = self.client.post(f'/api/results/{result.id}/predict/',
+                                    {'rows': [{'x1': 1.0, 'x2': 0.0}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_claims_prefer_workers_holding_the_dataset(self):
+        from .fleet import claim_task, enqueue_tasks
+        from .models import FleetWorker
+        from django.utils import timezone
+
+        first, second = self.upload('a.csv', seed=1), self.upload('b.csv', seed=2)
+        lr = self.model('linear_regression')
+        enqueue_tasks('job-a', first, [(lr, 'target', None)])
+        enqueue_tasks('job-b', second, [(lr, 'target', None)])
+        FleetWorker.objects.create(worker_id='holder', cached_hashes=[first.content_hash],
+                                   last_seen=timezone.now())
+
+        # The newer task is local to this worker, so it goes first
+        task = claim_task('other', [second.content_hash])
+        self.assertEqual(task.dataset_id, second.id)
+        # The older one is held back for the live worker that has its dataset
+        self.assertIsNone(claim_task('other', [second.content_hash]))
+        with override_settings(FLEET_LOCALITY_WAIT_SECONDS=0):
+            self.assertEqual(claim_task('other', [second.content_hash]).dataset_id, first.id)
+
+    def test_expired_lease_moves_task_to_another_worker(self):
+        from .fleet import claim_task, enqueue_tasks
+        from .models import TrainingTask
+
+        dataset = self.upload('lease.csv')
+        enqueue_tasks('lease-job', dataset, [(self.model('linear_regression'), 'target', None)])
+        task = claim_task('slow', [])
+        TrainingTask.objects.filter(pk=task.pk).update(lease_expires_at='2000-01-01T00:00:00Z')
+
+        self.assertEqual(claim_task('fast', []).pk, task.pk)
+        self.assertFalse(self.broker.heartbeat(task.pk, 'slow'))
+        self.assertTrue(self.broker.heartbeat(task.pk, 'fast'))
+        self.assertFalse(self.broker.fail(task.pk, 'slow', 'failed', 'late'))
+
+        self.assertEqual(self.client.post('/api/workers/claim/', {'worker_id': 'x'}, format='json',
+                                          headers={'X-Worker-Token': 'wrong'}).status_code, 403)
+
+    def test_worker_endpoints_refused_without_fleet(self):
+        from django.core.exceptions import ImproperlyConfigured
+        from .fleet import enqueue_tasks
+        from .models import TrainingTask
+
+        dataset = self.upload('closed.csv')
+        enqueue_tasks('closed-job', dataset, [(self.model('linear_regression'), 'target', None)])
+        task = TrainingTask.objects.get(job_id='closed-job')
+        complete = {'worker_id': 'x', 'model_file': SimpleUploadedFile('model.pkl', b'not a model')}
+        with override_settings(TRAINING_EXECUTOR='local', FLEET_WORKER_TOKEN=''):
+            # Under the default settings there are no worker endpoints at all
+            self.assertEqual(self.client.post('/api/workers/claim/', {'worker_id': 'x'},
+                                              format='json').status_code, 404)
+            self.assertEqual(self.client.post(f'/api/workers/tasks/{task.pk}/complete/', complete,
+                                              format='multipart').status_code, 404)
+            self.assertEqual(self.client.get(f'/api/workers/datasets/{dataset.content_hash}/')
+                             .status_code, 404)
+        # Unauthenticated requests never reach the task either
+        self.assertEqual(self.client.post('/api/workers/claim/', {'worker_id': 'x'},
+                                          format='json').status_code, 403)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'pending')
+        self.assertFalse(TrainingResult.objects.exists())
+        # The fleet will not run without a token
+        with override_settings(FLEET_WORKER_TOKEN=''):
+            with self.assertRaises(ImproperlyConfigured):
+                self.client.post('/api/workers/claim/', {'worker_id': 'x'}, format='json')
@@ -0,0 +1,77 @@
+import hashlib
+import pandas as pd
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from .metrics import cache_lookup
+from .models import Dataset
+from .profiling import profile_dataframe
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Spool uploads to a uniquely named temporary file, hashing them on the way.
+
+    FileSystemStorage moves temporary uploads into place instead of copying
+    them, so the body is written to disk exactly once.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.content_hash = self.hasher.hexdigest()
+        return file
+
+def content_hash(file):
+    """SHA-256 of an uploaded file, read again only if no handler hashed it"""
+    digest = getattr(file, 'content_hash', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        for chunk in file.chunks():
+            hasher.update(chunk)
+        file.seek(0)
+        digest = hasher.hexdigest()
+    return digest
+
+def find_duplicate(digest):
+    """An earlier, still stored upload with identical content, if any"""
+    for dataset in Dataset.objects.filter(content_hash=digest, parent__isnull=True,
+                                          profile__isnull=False).order_by('uploaded_at'):
+        if dataset.file.storage.exists(dataset.file.name):
+            return dataset
+    return None
+
+def inspect_upload(file):
+    """
+    Return (content_hash, profile, duplicate) for an uploaded CSV.
+
+    The file is only parsed when no identical dataset has been stored yet;
+    otherwise the earlier dataset's profile is reused.
+    """
+    digest = content_hash(file)
+    duplicate = find_duplicate(digest)
+    cache_lookup('dataset_upload', duplicate is not None)
+    if duplicate is not None:
+        return digest, duplicate.profile, duplicate
+
+    if hasattr(file, 'temporary_file_path'):
+        df = pd.read_csv(file.temporary_file_path())
+    else:
+        df = pd.read_csv(file)
+        file.seek(0)
+    return digest, profile_dataframe(df), None
+
+def create_dataset(file, digest, profile, duplicate):
+    """Create a Dataset for an upload, pointing duplicates at the stored blob"""
+    return Dataset.objects.create(
+        name=file.name,
+        file=duplicate.file.name if duplicate is not None else file,
+        columns=list(profile['columns']),
+        row_count=profile['row_count'],
+        profile=profile,
+        content_hash=digest
+    )
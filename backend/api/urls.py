@@ -5,6 +5,15 @@ from .views import (
     MLModelViewSet, 
     TrainingResultViewSet,
     train_multiple_models,
+    estimate_training,
+    training_events,
+    training_status,
+    cancel_training,
+    worker_claim,
+    worker_dataset,
+    worker_heartbeat,
+    worker_complete,
+    worker_fail,
     debug_database
 )
 
@@ -16,5 +25,14 @@ router.register(r'results', TrainingResultViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('train/', train_multiple_models, name='train-multiple-models'),
+    path('train/estimate/', estimate_training, name='estimate-training'),
+    path('train/<str:job_id>/events/', training_events, name='training-events'),
+    path('train/<str:job_id>/status/', training_status, name='training-status'),
+    path('train/<str:job_id>/cancel/', cancel_training, name='cancel-training'),
+    path('workers/claim/', worker_claim, name='worker-claim'),
+    path('workers/datasets/<str:content_hash>/', worker_dataset, name='worker-dataset'),
+    path('workers/tasks/<int:task_id>/heartbeat/', worker_heartbeat, name='worker-heartbeat'),
+    path('workers/tasks/<int:task_id>/complete/', worker_complete, name='worker-complete'),
+    path('workers/tasks/<int:task_id>/fail/', worker_fail, name='worker-fail'),
     path('debug/', debug_database, name='debug-database'),
 ] 
\ No newline at end of file
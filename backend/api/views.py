@@ -1,13 +1,31 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from django.db import transaction
 import pandas as pd
+import hmac
 import json
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from .models import Dataset, MLModel, TrainingResult
 from .serializers import DatasetSerializer, MLModelSerializer, TrainingResultSerializer
-from .ml_utils import ModelTrainer
+from .estimators import registered_model_types, get_estimator_spec
+from .profiling import profile_dataframe, merge_profiles
+from .artifacts import save_pipeline, load_pipeline, load_predictions, get_predictor, predictor_key
+from .progress import find_progress, format_sse, start_progress
+from .batching import submit_prediction, batcher_stats
+from .uploads import inspect_upload, create_dataset
+from .persistence import ResultWriter
+from .admission import AdmissionRejected, admission_controller, estimate_job
+from .fitting import TrainingInterrupted, fit_cell
+from .selection import parse_selection_options, plan_feature_selection
+from .progressive import parse_quick_compare_options
+from .fleet import fleet_enabled
+from .runtime import estimate_cells, longest_first, record_fit, schedule_summary, shortest_first
 import logging
 
 logger = logging.getLogger(__name__)
@@ -52,16 +70,8 @@ class DatasetViewSet(BaseViewSet):
                           status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            # Read CSV file
-            df = pd.read_csv(file_obj)
-            
-            # Create dataset instance
-            dataset = Dataset.objects.create(
-                name=file_obj.name,
-                file=file_obj,
-                columns=df.columns.tolist(),
-                row_count=len(df)
-            )
+            # Identical files are stored once; later uploads reuse the blob and profile
+            dataset = create_dataset(file_obj, *inspect_upload(file_obj))
             
             serializer = self.get_serializer(dataset)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -69,6 +79,193 @@ class DatasetViewSet(BaseViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['GET'])
+    def profile(self, request, pk=None):
+        dataset = self.get_object()
+        
+        # Datasets uploaded before profiling existed are profiled on first access
+        if dataset.profile is None:
+            try:
+                df = pd.concat([pd.read_csv(path) for path in dataset.segment_paths()],
+                               ignore_index=True)
+            except Exception as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            dataset.profile = profile_dataframe(df)
+            dataset.save(update_fields=['profile'])
+        
+        return Response(dataset.profile, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['POST'])
+    def append(self, request, pk=None):
+        """
+        Create a new version of a dataset from appended rows.
+
+        Only the new rows are stored and profiled; the new version links to
+        its parent's segments. Optionally retrains the given MLModel configs
+        on the new version, warm-starting where the model type supports it.
+        """
+        parent = self.get_object()
+        file_obj = request.FILES.get('file')
+        if not file_obj:
+            return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
+        if not file_obj.name.endswith('.csv'):
+            return Response({'error': 'Only CSV files are supported'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            df = pd.read_csv(file_obj)
+            if set(df.columns) != set(parent.columns or []):
+                return Response(
+                    {'error': f'Appended rows must have the same columns as the dataset: {parent.columns}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # Statistics grow with the appended rows, not with the history
+            segment_profile = profile_dataframe(df)
+            profile = merge_profiles(parent.profile, segment_profile) if parent.profile else None
+            if profile is None:
+                history = [pd.read_csv(path) for path in parent.segment_paths()]
+                profile = profile_dataframe(pd.concat(history + [df], ignore_index=True))
+
+            file_obj.seek(0)
+            dataset = Dataset.objects.create(
+                name=parent.name,
+                file=file_obj,
+                columns=parent.columns,
+                row_count=profile['row_count'],
+                profile=profile,
+                parent=parent,
+                version=parent.version + 1
+            )
+
+            model_ids = json.loads(request.data.get('retrain_models', '[]'))
+            target_columns = json.loads(request.data.get('target_columns', '[]'))
+            warm_start = str(request.data.get('warm_start', 'true')).lower() != 'false'
+            results = _retrain_on_version(dataset, segment_profile, model_ids,
+                                          target_columns, warm_start)
+
+            data = self.get_serializer(dataset).data
+            data['retrained'] = results
+            return Response(data, status=status.HTTP_201_CREATED)
+
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['POST'])
+    def learning_curve(self, request, pk=None):
+        """
+        Train/validation metrics of one model config on growing subsamples.
+
+        Takes a target_column and either a stored model_id or a model_type
+        with hyperparameters; fractions defaults to 10%, 20% ... 100%.
+        """
+        from .ml_utils import ModelTrainer, LEARNING_CURVE_FRACTIONS
+
+        dataset = self.get_object()
+        target_column = request.data.get('target_column')
+        if target_column not in (dataset.columns or []):
+            return Response({'error': f'Target column not found in dataset: {target_column}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if request.data.get('model_id') is not None:
+            try:
+                ml_model = MLModel.objects.get(id=request.data['model_id'])
+            except MLModel.DoesNotExist:
+                return Response({'error': 'Model not found'}, status=status.HTTP_404_NOT_FOUND)
+            model_type, hyperparameters = ml_model.model_type, ml_model.hyperparameters
+        else:
+            serializer = MLModelSerializer(data={
+                'name': request.data.get('model_type', ''),
+                'model_type': request.data.get('model_type'),
+                'hyperparameters': request.data.get('hyperparameters', {})
+            })
+            if not serializer.is_valid():
+                return Response({'error': f"Invalid model configuration: {serializer.errors}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            model_type = serializer.validated_data['model_type']
+            hyperparameters = serializer.validated_data['hyperparameters']
+
+        fractions = request.data.get('fractions', LEARNING_CURVE_FRACTIONS)
+        if (not isinstance(fractions, list) or not fractions
+                or not all(isinstance(f, (int, float)) and 0 < f <= 1 for f in fractions)):
+            return Response({'error': 'fractions must be a list of numbers in (0, 1]'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            trainer = ModelTrainer(
+                dataset_path=dataset.segment_paths(),
+                target_column=target_column,
+                model_type=model_type,
+                hyperparameters=hyperparameters,
+                profile=dataset.profile,
+                cardinality_threshold=settings.ML_HIGH_CARDINALITY_THRESHOLD,
+                high_cardinality_encoder=settings.ML_HIGH_CARDINALITY_ENCODER
+            )
+            curve = trainer.learning_curve(fractions)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = Response(curve, status=status.HTTP_200_OK)
+        response["Access-Control-Allow-Origin"] = "*"
+        return response
+
+def _retrain_on_version(dataset, segment_profile, model_ids, target_columns, warm_start):
+    """Retrain MLModel configs on a new dataset version"""
+    from .ml_utils import ModelTrainer
+
+    results = []
+    writer = ResultWriter()
+    ancestors = dataset.lineage()[1:]
+    for ml_model in MLModel.objects.filter(id__in=model_ids):
+        spec = get_estimator_spec(ml_model.model_type)
+        for target in target_columns:
+            previous = None
+            if warm_start and spec.supports_warm_start:
+                previous_result = (TrainingResult.objects
+                                   .filter(model=ml_model, target_column=target,
+                                           dataset__in=ancestors)
+                                   .exclude(model_file='')
+                                   .order_by('-created_at')
+                                   .first())
+                previous = load_pipeline(previous_result) if previous_result else None
+
+            # Warm starts only see the appended rows; full retrains read every segment
+            trainer = ModelTrainer(
+                dataset_path=dataset.file.path if previous is not None else dataset.segment_paths(),
+                target_column=target,
+                model_type=ml_model.model_type,
+                hyperparameters=ml_model.hyperparameters,
+                profile=segment_profile if previous is not None else dataset.profile,
+                cardinality_threshold=settings.ML_HIGH_CARDINALITY_THRESHOLD,
+                high_cardinality_encoder=settings.ML_HIGH_CARDINALITY_ENCODER,
+                warm_start_from=previous
+            )
+            pipeline, metrics, feature_importance, scatter_data, model_info = trainer.train_and_evaluate()
+
+            y_test = trainer.y_test
+            if previous is not None:
+                # Stored holdout indices count rows across every segment of the version
+                y_test = y_test.set_axis(y_test.index + dataset.row_count - segment_profile['row_count'])
+            result = writer.add_result(
+                pipeline, X_sample=trainer.X_test,
+                predictions=(y_test, trainer.y_pred),
+                dataset=dataset,
+                model=ml_model,
+                target_column=target,
+                metrics=metrics,
+                feature_importance=feature_importance
+            )
+            writer.add_fit(record_fit(ml_model.model_type, ml_model.hyperparameters, model_info))
+            results.append((result, {
+                'model': ml_model.name,
+                'target': target,
+                'warm_started': model_info['warm_started'],
+                'metrics': metrics
+            }))
+
+    writer.flush()
+    return [{'id': str(result.id), **data} for result, data in results]
+
 class MLModelViewSet(BaseViewSet):
     queryset = MLModel.objects.all()
     serializer_class = MLModelSerializer
@@ -80,31 +277,36 @@ class MLModelViewSet(BaseViewSet):
         target_column = request.data.get('target_column')
         
         try:
+            from .ml_utils import ModelTrainer
+
             dataset = Dataset.objects.get(id=dataset_id)
             trainer = ModelTrainer(
-                dataset_path=dataset.file.path,
+                dataset_path=dataset.segment_paths(),
                 target_column=target_column,
                 model_type=model.model_type,
-                hyperparameters=model.hyperparameters
+                hyperparameters=model.hyperparameters,
+                profile=dataset.profile,
+                cardinality_threshold=settings.ML_HIGH_CARDINALITY_THRESHOLD,
+                high_cardinality_encoder=settings.ML_HIGH_CARDINALITY_ENCODER
             )
             
-            # Train and evaluate the model
-            trained_model, metrics, feature_importance, scatter_data, model_info = trainer.train_and_evaluate()
-            
-            # Save the trained model
-            model_filename = f'trained_models/{model.name}_{dataset.name}.pkl'
-            os.makedirs('trained_models', exist_ok=True)
-            with open(model_filename, 'wb') as f:
-                pickle.dump(trained_model, f)
+            # Train and evaluate the model within the per-fit time limit
+            trained_model, metrics, feature_importance, scatter_data, model_info = fit_cell(
+                trainer, time_limit=settings.TRAINING_FIT_TIME_LIMIT_SECONDS or None)
             
-            # Create training result
+            # Create training result and save the trained model
             result = TrainingResult.objects.create(
                 dataset=dataset,
                 model=model,
+                target_column=target_column,
                 metrics=metrics,
-                feature_importance=feature_importance,
-                model_file=model_filename
+                feature_importance=feature_importance
             )
+            save_pipeline(result, trained_model, X_sample=trainer.X_test,
+                          predictions=(trainer.y_test, trainer.y_pred))
+            fit_record = record_fit(model.model_type, model.hyperparameters, model_info)
+            if fit_record is not None:
+                fit_record.save()
             
             # Prepare response data
             response_data = {
@@ -122,10 +324,39 @@ class MLModelViewSet(BaseViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['GET'])
+    def types(self, request):
+        """List registered model types with their accepted hyperparameters"""
+        return Response([get_estimator_spec(name).describe() for name in registered_model_types()])
+
 class TrainingResultViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = TrainingResult.objects.all().order_by('-created_at')
     serializer_class = TrainingResultSerializer
 
+    def get_queryset(self):
+        """
+        Results, optionally filtered by the dataset, model, model_type,
+        target_column, created_after and created_before query parameters.
+        """
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'export'):
+            return queryset
+
+        params = self.request.query_params
+        for param, lookup in [('dataset', 'dataset_id'), ('model', 'model_id'),
+                              ('model_type', 'model__model_type'),
+                              ('target_column', 'target_column')]:
+            if params.get(param):
+                queryset = queryset.filter(**{lookup: params[param]})
+        for param, lookup in [('created_after', 'created_at__gte'),
+                              ('created_before', 'created_at__lt')]:
+            if params.get(param):
+                value = parse_datetime(params[param]) or parse_date(params[param])
+                if value is None:
+                    raise ValidationError({param: 'Expected an ISO 8601 date or datetime'})
+                queryset = queryset.filter(**{lookup: value})
+        return queryset
+
     def list(self, request, *args, **kwargs):
         try:
             queryset = self.get_queryset()
@@ -140,6 +371,8 @@ class TrainingResultViewSet(viewsets.ReadOnlyModelViewSet):
             response["Access-Control-Allow-Methods"] = "GET, OPTIONS"
             response["Access-Control-Allow-Headers"] = "*"
             return response
+        except ValidationError as e:
+            return Response({'error': e.detail}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error in list view: {str(e)}")
             return Response(
@@ -164,6 +397,224 @@ class TrainingResultViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=True, methods=['POST'])
+    def predict(self, request, pk=None):
+        """Score rows (a list of column -> value objects) with a stored model"""
+        result = self.get_object()
+        rows = request.data.get('rows')
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            return Response({'error': 'rows must be a list of objects'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        predictor, kind = get_predictor(result)
+        if predictor is None:
+            return Response({'error': 'No stored model for this result'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        if kind == 'compiled':
+            predict_fn = predictor.predict
+        else:
+            columns = getattr(predictor, 'feature_names_in_', None)
+            predict_fn = lambda batch: predictor.predict(pd.DataFrame(batch, columns=columns))
+
+        # Concurrent requests for the same result share one vectorized predict
+        max_wait = settings.PREDICTION_MAX_WAIT_MS / 1000
+        try:
+            predictions = submit_prediction(
+                predictor_key(result), rows, predict_fn,
+                max_batch_size=settings.PREDICTION_MAX_BATCH_SIZE,
+                max_wait=max_wait,
+                max_batchers=settings.PREDICTOR_CACHE_SIZE
+            ).result(timeout=max_wait + settings.PREDICTION_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            return Response({'error': 'Prediction timed out, retry later'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = Response({
+            'predictions': [float(p) for p in predictions],
+            'predictor': kind
+        })
+        response["Access-Control-Allow-Origin"] = "*"
+        return response
+
+    @action(detail=False, methods=['POST'])
+    def metrics(self, request):
+        """
+        Recompute metrics from stored holdout predictions, without retraining.
+
+        Optional result_ids (default: all results), metrics (default: every
+        registered metric) and where, e.g. {"Location": ["A", "B"]}, to
+        score only a subgroup of the holdout rows.
+        """
+        from .scoring import registered_metrics, score_results
+
+        result_ids = request.data.get('result_ids')
+        metric_names = request.data.get('metrics') or registered_metrics()
+        where = request.data.get('where') or None
+        if where is not None and not isinstance(where, dict):
+            return Response({'error': 'where must map column names to values'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = TrainingResult.objects.select_related('dataset').exclude(predictions_file='')
+        if result_ids is not None:
+            results = results.filter(id__in=result_ids)
+        try:
+            scores, missing = score_results(list(results), metric_names, where)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if result_ids is not None:
+            missing = sorted(set(map(int, result_ids)) - set(scores))
+        response = Response({
+            'metrics': metric_names,
+            'results': {str(result_id): values for result_id, values in scores.items()},
+            'missing_predictions': missing
+        })
+        response["Access-Control-Allow-Origin"] = "*"
+        return response
+
+    @action(detail=False, methods=['POST'])
+    def compare(self, request):
+        """
+        Paired bootstrap differences between results scored on the same holdout rows.
+
+        result_ids (at least two) are compared against the one with the best
+        R²; optional n_resamples and confidence.
+        """
+        from .scoring import BOOTSTRAP_CONFIDENCE, BOOTSTRAP_RESAMPLES, compare_results
+
+        result_ids = request.data.get('result_ids') or []
+        results = list(TrainingResult.objects.filter(id__in=result_ids))
+        if len(results) < 2:
+            return Response({'error': 'result_ids must name at least two results'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            comparisons, reference = compare_results(
+                results,
+                n_resamples=int(request.data.get('n_resamples', BOOTSTRAP_RESAMPLES)),
+                confidence=float(request.data.get('confidence', BOOTSTRAP_CONFIDENCE))
+            )
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = Response({
+            'reference': str(reference),
+            'results': {str(result_id): values for result_id, values in comparisons.items()}
+        })
+        response["Access-Control-Allow-Origin"] = "*"
+        return response
+
+    @action(detail=False, methods=['GET'], url_path=r'export/(?P<export_format>csv|ndjson|parquet)')
+    def export(self, request, export_format=None):
+        """
+        Stream results as CSV, NDJSON or Parquet, with metrics and feature
+        importances flattened into columns. predictions=true exports the
+        stored holdout predictions instead, one row per prediction.
+        """
+        from .exports import EXPORT_FORMATS, stream_export
+
+        if export_format == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                return Response({'error': 'Parquet export requires pyarrow to be installed'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        predictions = request.query_params.get('predictions', 'false').lower() == 'true'
+        content_type, extension = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            stream_export(self.get_queryset(), export_format, predictions),
+            content_type=content_type
+        )
+        name = 'predictions' if predictions else 'results'
+        response['Content-Disposition'] = f'attachment; filename="{name}.{extension}"'
+        response["Access-Control-Allow-Origin"] = "*"
+        return response
+
+    @action(detail=False, methods=['GET'])
+    def prediction_stats(self, request):
+        """Queue depth and batch-size counters for each model being served"""
+        response = Response(batcher_stats())
+        response["Access-Control-Allow-Origin"] = "*"
+        return response
+
+    @action(detail=False, methods=['POST'])
+    def ensemble(self, request):
+        """
+        Blend stored results for one dataset and target into a new result.
+
+        Base pipelines are not refitted: their predictions on the shared
+        holdout rows are stacked with non-negative weights, and the blend is
+        scored out-of-fold on those rows.
+        """
+        from .ml_utils import holdout_split, regression_metrics
+        from .ensembles import (StackedEnsemble, base_predictions, cross_validated_blend,
+                                fit_blender)
+
+        result_ids = request.data.get('result_ids')
+        if not isinstance(result_ids, list) or len(result_ids) < 2:
+            return Response({'error': 'result_ids must list at least two results'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result_ids = [int(result_id) for result_id in result_ids]
+        except (TypeError, ValueError):
+            return Response({'error': 'result_ids must be integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        found = TrainingResult.objects.select_related('model', 'dataset').in_bulk(result_ids)
+        missing = [result_id for result_id in result_ids if result_id not in found]
+        if missing:
+            return Response({'error': f'Results not found: {missing}'},
+                            status=status.HTTP_404_NOT_FOUND)
+        results = [found[result_id] for result_id in result_ids]
+        if len({(r.dataset_id, r.target_column) for r in results}) != 1 or not results[0].target_column:
+            return Response({'error': 'Results must share one dataset and target column'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if any(r.model.model_type == 'ensemble' or not r.model_file for r in results):
+            return Response({'error': 'Only results with a stored, non-ensemble model can be blended'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        dataset, target = results[0].dataset, results[0].target_column
+        try:
+            X_holdout, y_holdout = holdout_split(dataset.segment_paths(), target)
+            y_holdout = y_holdout.to_numpy(dtype=float)
+            predictions = base_predictions(results, X_holdout)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        blended = cross_validated_blend(predictions, y_holdout)
+        metrics = regression_metrics(y_holdout, blended)
+        weights, intercept = fit_blender(predictions, y_holdout)
+        ensemble = StackedEnsemble(result_ids, weights, intercept, X_holdout.columns)
+
+        ml_model = MLModel.objects.create(
+            name=request.data.get('name') or f'Ensemble of {len(results)} models',
+            model_type='ensemble',
+            hyperparameters={'base_results': result_ids, 'blender': 'nnls'}
+        )
+        result = TrainingResult.objects.create(
+            dataset=dataset,
+            model=ml_model,
+            target_column=target,
+            metrics=metrics,
+            # The blend weights play the role of feature importances
+            feature_importance={f'{r.model.name} (#{r.id})': float(w)
+                                for r, w in zip(results, weights)}
+        )
+        save_pipeline(result, ensemble,
+                      predictions=(pd.Series(y_holdout, index=X_holdout.index), blended))
+
+        data = self.get_serializer(result).data
+        data['base_metrics'] = {
+            str(r.id): regression_metrics(y_holdout, predictions[:, i])
+            for i, r in enumerate(results)
+        }
+        response = Response(data, status=status.HTTP_201_CREATED)
+        response["Access-Control-Allow-Origin"] = "*"
+        return response
+
 @api_view(['POST', 'OPTIONS'])
 def train_multiple_models(request):
     if request.method == 'OPTIONS':
@@ -174,6 +625,36 @@ def train_multiple_models(request):
         }
         return Response({}, status=status.HTTP_200_OK, headers=headers)
 
+    # Clients may pick the job id up front so they can subscribe to
+    # /api/train/<job_id>/events/ while this request is still running
+    job_id = request.POST.get('job_id') or str(uuid.uuid4())
+    progress = start_progress(job_id)
+    if progress is None:
+        return Response({'error': f'Training job {job_id} already exists'},
+                        status=status.HTTP_409_CONFLICT,
+                        headers={'Access-Control-Allow-Origin': '*'})
+    progress.publish('stage', stage='validating', status='running')
+
+    response = _train_multiple_models(request, progress)
+    if progress.cancel_requested:
+        result_ids = ([result['id'] for result in response.data if result['id']]
+                      if response.status_code < 400 else [])
+        progress.publish('cancelled', status='cancelled', n_results=len(result_ids),
+                         result_ids=result_ids)
+    elif response.status_code >= 400:
+        progress.publish('failed', status='failed', error=response.data.get('error'))
+    else:
+        result_ids = [result['id'] for result in response.data if result['id']]
+        progress.publish('completed', status='completed', n_results=len(result_ids),
+                         result_ids=result_ids)
+    response['X-Training-Job-Id'] = job_id
+    response['Access-Control-Expose-Headers'] = 'X-Training-Job-Id'
+    return response
+
+def _train_multiple_models(request, progress):
+    # Imported here so only training requests pay for loading scikit-learn
+    from .ml_utils import ModelTrainer
+
     try:
         # Handle file upload
         file = request.FILES.get('file')
@@ -184,16 +665,15 @@ def train_multiple_models(request):
         if not file.name.endswith('.csv'):
             return Response({'error': 'Only CSV files are supported'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Save file temporarily
-        path = default_storage.save('tmp/dataset.csv', ContentFile(file.read()))
-        
+        writer = ResultWriter()
+        ticket = None
         try:
-            # Read the dataset first to validate
-            df = pd.read_csv(default_storage.path(path))
+            # Hashed while spooled; an identical earlier upload is reused as is
+            digest, profile, duplicate = inspect_upload(file)
             
             # Validate target columns exist in dataset
             target_columns = json.loads(request.POST.get('target_columns', '[]'))
-            missing_columns = [col for col in target_columns if col not in df.columns]
+            missing_columns = [col for col in target_columns if col not in profile['columns']]
             if missing_columns:
                 return Response(
                     {'error': f'Target columns not found in dataset: {missing_columns}'}, 
@@ -202,33 +682,74 @@ def train_multiple_models(request):
             
             # Check if target columns have enough non-null values
             for col in target_columns:
-                non_null_count = df[col].count()
+                non_null_count = profile['columns'][col]['non_null_count']
                 if non_null_count < 50:  # You can adjust this threshold
                     return Response(
                         {'error': f'Insufficient data for target column {col}. Only {non_null_count} non-null values available.'}, 
                         status=status.HTTP_400_BAD_REQUEST
                     )
 
-            # Read the models and target columns from the request
+            # Read the models from the request
             models = json.loads(request.POST.get('models', '[]'))
-            target_columns = json.loads(request.POST.get('target_columns', '[]'))
+            # Per-fit wall-clock limit in seconds; a model config may override it
+            default_time_limit = float(request.POST.get('time_limit')
+                                       or settings.TRAINING_FIT_TIME_LIMIT_SECONDS)
+            # true/false or an object of options; see selection.SELECTION_OPTIONS
+            selection_options = parse_selection_options(
+                request.POST.get('feature_selection', settings.ML_FEATURE_SELECTION))
+            # Rank configs on subsamples first and fully train only the leaders
+            quick_options = parse_quick_compare_options(request.POST.get('quick_compare'))
             
             print("Models config:", models)
-            
-            # Read the dataset
-            df = pd.read_csv(default_storage.path(path))
+
+            if fleet_enabled():
+                if quick_options:
+                    return Response({'error': 'quick_compare is not available with the fleet executor'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+                # Workers on other nodes do the fitting; this node only waits
+                dataset = create_dataset(file, digest, profile, duplicate)
+                print(f"Dataset created: {dataset.id}")
+                dropped_features = _select_features(progress, dataset, target_columns,
+                                                    selection_options)
+                return _train_on_fleet(progress, dataset, models, target_columns,
+                                       default_time_limit, dropped_features)
+
+            # Reserve memory for the job before any fitting; waits in the
+            # queue or returns backpressure when the node is saturated
+            estimate = estimate_job(profile, models, target_columns,
+                                    quick_compare=bool(quick_options))
+            print("Estimated job cost:", estimate)
+            try:
+                ticket = admission_controller.admit(
+                    progress.job_id, estimate,
+                    on_queued=lambda **data: progress.publish('stage', stage='queued', **data),
+                    cancelled=lambda: progress.cancel_requested
+                )
+            except AdmissionRejected as e:
+                response = Response({'error': str(e), **e.details}, status=e.status_code)
+                if e.retry_after:
+                    response['Retry-After'] = str(e.retry_after)
+                return response
             
             results = []
+            # Holdout arrays of each saved result, for the paired comparison
+            holdouts = []
             # Create dataset record
-            dataset = Dataset.objects.create(
-                name=file.name,
-                file=file,
-                columns=df.columns.tolist(),
-                row_count=len(df)
-            )
+            dataset = create_dataset(file, digest, profile, duplicate)
             print(f"Dataset created: {dataset.id}")
+            dropped_features = _select_features(progress, dataset, target_columns,
+                                                selection_options)
+            leaders, rungs = None, {}
+            if quick_options:
+                leaders, rungs = _quick_compare(progress, dataset, profile, models, target_columns,
+                                                dropped_features, quick_options,
+                                                default_time_limit)
+            progress.start(total_steps=sum(len(leaders[target]) for target in target_columns)
+                           if leaders is not None else len(models) * len(target_columns))
 
-            for model_config in models:
+            # Validate every config first; the cells are then run by predicted runtime
+            queued = {}
+            for index, model_config in enumerate(models):
                 # Validate hyperparameters before creating model
                 serializer = MLModelSerializer(data={
                     'name': model_config['name'],
@@ -242,45 +763,137 @@ def train_multiple_models(request):
                         status=status.HTTP_400_BAD_REQUEST
                     )
                 
-                ml_model = serializer.save()
-                print(f"ML Model created: {ml_model.id} ({ml_model.name})")
-
-                for target in target_columns:
-                    print(f"Training for target: {target}")
-                    trainer = ModelTrainer(
-                        dataset_path=default_storage.path(path),
-                        target_column=target,
-                        model_type=model_config['model_type'],
-                        hyperparameters=model_config['hyperparameters']
-                    )
-                    
-                    model, metrics, feature_importance, scatter_data, model_info = trainer.train_and_evaluate()
-                    
-                    result = TrainingResult.objects.create(
-                        dataset=dataset,
-                        model=ml_model,
-                        metrics=metrics,
-                        feature_importance=feature_importance
+                # Configs a quick comparison ruled out keep their subsample metrics only
+                targets = target_columns
+                if leaders is not None:
+                    targets = [target for target in target_columns if index in leaders[target]]
+                    for target in target_columns:
+                        if target in targets:
+                            continue
+                        history = rungs[target][index]
+                        results.append(((index, target_columns.index(target)), None, {
+                            'status': 'cancelled' if progress.cancel_requested else 'eliminated',
+                            'dataset': dataset.name,
+                            'model': model_config['name'],
+                            'target_column': target,
+                            'metrics': next((rung['metrics'] for rung in reversed(history)
+                                             if 'metrics' in rung), None),
+                            'rungs': history
+                        }))
+                    if not targets:
+                        continue
+
+                ml_model = writer.add_model(serializer)
+                print(f"ML Model queued: {ml_model.name}")
+                time_limit = float(model_config.get('time_limit', default_time_limit)) or None
+                queued[index] = (ml_model, time_limit, targets)
+
+            # Cheapest predicted fits first (shortest job first), so quick
+            # results come back while slow ones are still training
+            schedule = shortest_first([
+                cell for cell in estimate_cells(profile, models, target_columns,
+                                                dropped_features=dropped_features)
+                if cell['index'] in queued and cell['target'] in queued[cell['index']][2]
+            ])
+            progress.publish('stage', stage='scheduled', schedule=schedule,
+                             **schedule_summary(schedule))
+
+            for cell in schedule:
+                index, target = cell['index'], cell['target']
+                model_config = models[index]
+                ml_model, time_limit, _ = queued[index]
+                print(f"Training for target: {target}")
+                if not progress.cancel_requested:
+                    progress.publish('model_started', model=ml_model.name,
+                                     model_type=ml_model.model_type, target=target)
+
+                def report(event, model_name=ml_model.name, target=target, **data):
+                    if event == 'iteration':
+                        progress.iteration(model=model_name, target=target, **data)
+                    else:
+                        progress.publish(event, model=model_name, target=target, **data)
+
+                trainer = ModelTrainer(
+                    dataset_path=dataset.file.path,
+                    target_column=target,
+                    model_type=model_config['model_type'],
+                    hyperparameters=model_config['hyperparameters'],
+                    profile=profile,
+                    cardinality_threshold=settings.ML_HIGH_CARDINALITY_THRESHOLD,
+                    high_cardinality_encoder=settings.ML_HIGH_CARDINALITY_ENCODER,
+                    progress_callback=report,
+                    dropped_features=dropped_features.get(target)
+                )
+                
+                # Runs in a worker process that is killed on timeout or cancellation
+                try:
+                    model, metrics, feature_importance, scatter_data, model_info = fit_cell(
+                        trainer, time_limit=time_limit,
+                        cancelled=lambda: progress.cancel_requested
                     )
-                    print(f"Training result created: {result.id}")
-                    
-                    results.append({
-                        'id': str(result.id),
+                except Exception as e:
+                    # A config that fails is reported like an interrupted one, so
+                    # the cells that did finish are still saved
+                    cell_status = e.status if isinstance(e, TrainingInterrupted) else 'failed'
+                    print(f"Training {cell_status} for {ml_model.name} on {target}: {e}")
+                    progress.step_interrupted(cell_status, model=ml_model.name,
+                                              model_type=ml_model.model_type, target=target,
+                                              error=str(e))
+                    results.append(((index, target_columns.index(target)), None, {
+                        'status': cell_status,
                         'dataset': dataset.name,
                         'model': ml_model.name,
-                        'metrics': metrics,
-                        'feature_importance': feature_importance,
-                        'model_info': model_info
-                    })
+                        'target_column': target,
+                        'error': str(e)
+                    }))
+                    continue
+                
+                result = writer.add_result(
+                    model, X_sample=trainer.X_test,
+                    predictions=(trainer.y_test, trainer.y_pred),
+                    dataset=dataset,
+                    model=ml_model,
+                    target_column=target,
+                    metrics=metrics,
+                    feature_importance=feature_importance
+                )
+                writer.add_fit(record_fit(ml_model.model_type, ml_model.hyperparameters, model_info))
+                holdouts.append((result, {'index': trainer.y_test.index.to_numpy(),
+                                          'y_true': trainer.y_test.to_numpy(),
+                                          'y_pred': trainer.y_pred}))
+                progress.step_completed(model=ml_model.name,
+                                        model_type=ml_model.model_type, target=target,
+                                        metrics=metrics)
+                
+                results.append(((index, target_columns.index(target)), result, {
+                    'status': 'completed',
+                    'dataset': dataset.name,
+                    'model': ml_model.name,
+                    'metrics': metrics,
+                    'feature_importance': feature_importance,
+                    'model_info': model_info,
+                    **({'rungs': rungs[target][index]} if leaders is not None else {})
+                }))
             
-            print(f"Total results created: {len(results)}")
+            # All models and results of the request are written in one transaction
+            writer.flush()
+            _attach_paired_differences(holdouts)
+            # Cancelled, timed-out and failed cells are reported with their status and no id
+            # Reported in submission order, whatever order the cells ran in
+            results = [{'id': str(result.id) if result is not None else None, **data}
+                       for _, result, data in sorted(results, key=lambda item: item[0])]
+            print(f"Total results created: {sum(1 for result in results if result['id'])}")
             response = Response(results, status=status.HTTP_201_CREATED)
             response['Access-Control-Allow-Origin'] = '*'
             return response
             
         finally:
-            # Clean up temporary file
-            default_storage.delete(path)
+            if ticket is not None:
+                admission_controller.release(ticket)
+            # Remove artifacts of results that were not saved
+            writer.discard()
+            # Release the spool file; it is deleted unless storage moved it into place
+            file.close()
             
     except Exception as e:
         print(f"Error in train_multiple_models: {str(e)}")
@@ -289,6 +902,376 @@ def train_multiple_models(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+def _quick_compare(progress, dataset, profile, models, target_columns, dropped_features,
+                   options, default_time_limit):
+    """
+    Rank every config on growing subsamples of each target's training rows.
+
+    Returns ({target: config indices to train on all rows}, {target: {index: rung metrics}}).
+    Provisional rankings are published as 'ranking' events after every rung.
+    """
+    from .ml_utils import ModelTrainer, TEST_SIZE, load_dataset
+    from .progressive import quick_compare
+
+    progress.publish('stage', stage='quick_compare')
+    # Loaded once and shared by every trainer; training never modifies it
+    df = load_dataset(dataset.file.path)
+    leaders, rungs = {}, {}
+    for target in target_columns:
+        trainers = [
+            ModelTrainer(
+                dataset_path=df,
+                target_column=target,
+                model_type=model_config['model_type'],
+                hyperparameters=model_config['hyperparameters'],
+                profile=profile,
+                cardinality_threshold=settings.ML_HIGH_CARDINALITY_THRESHOLD,
+                high_cardinality_encoder=settings.ML_HIGH_CARDINALITY_ENCODER,
+                dropped_features=dropped_features.get(target)
+            )
+            for model_config in models
+        ]
+        n_train = int(profile['columns'][target]['non_null_count'] * (1 - TEST_SIZE))
+
+        def report(rung, n_samples, ranking, target=target):
+            progress.publish('ranking', target=target, rung=rung, n_samples=n_samples,
+                             ranking=[{'model': models[entry['index']]['name'],
+                                       'model_type': models[entry['index']]['model_type'],
+                                       **entry} for entry in ranking])
+
+        # Subsample fits get the same time limit, isolation and cancellation as
+        # full fits; the rows are sampled here so a worker receives only those
+        def score(index, n_samples, trainers=trainers):
+            time_limit = float(models[index].get('time_limit', default_time_limit)) or None
+            return fit_cell(trainers[index].subsample_trainer(n_samples), time_limit=time_limit,
+                            cancelled=lambda: progress.cancel_requested,
+                            method='subsample_score', args=(n_samples,))
+
+        try:
+            leaders[target], rungs[target] = quick_compare(
+                trainers, n_train, options, report=report,
+                cancelled=lambda: progress.cancel_requested, score=score)
+        except TrainingInterrupted:
+            # A cancelled job trains nothing further
+            leaders[target], rungs[target] = [], {index: [] for index in range(len(models))}
+        print(f"Quick compare leaders for {target}:",
+              [models[index]['name'] for index in leaders[target]])
+    return leaders, rungs
+
+def _select_features(progress, dataset, target_columns, options):
+    """Columns to leave out per target, decided once before the model grid"""
+    if not options:
+        return {}
+    progress.publish('stage', stage='feature_selection')
+    dropped_features = plan_feature_selection(dataset, dataset.file.path, target_columns, options)
+    print("Dropped features:", dropped_features)
+    progress.publish('stage', stage='features_selected', dropped_features=dropped_features)
+    return dropped_features
+
+def _train_on_fleet(progress, dataset, models, target_columns, default_time_limit,
+                    dropped_features=None):
+    """Queue every model x target cell for fleet workers and wait for them to finish"""
+    from .fleet import enqueue_tasks, live_workers, wait_for_tasks
+
+    serializers = []
+    for model_config in models:
+        serializer = MLModelSerializer(data={
+            'name': model_config['name'],
+            'model_type': model_config['model_type'],
+            'hyperparameters': model_config['hyperparameters']
+        })
+        if not serializer.is_valid():
+            return Response(
+                {'error': f"Invalid model configuration: {serializer.errors}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializers.append((serializer, model_config))
+
+    # Workers claim a job's tasks in queue order; queueing the longest fits
+    # first keeps them from starting last and leaving the other workers idle
+    schedule = longest_first(estimate_cells(dataset.profile, models, target_columns,
+                                            dropped_features=dropped_features))
+    with transaction.atomic():
+        ml_models = []
+        for serializer, model_config in serializers:
+            time_limit = float(model_config.get('time_limit', default_time_limit)) or None
+            ml_models.append((serializer.save(), time_limit))
+        cells = [(ml_models[cell['index']][0], cell['target'], ml_models[cell['index']][1])
+                 for cell in schedule]
+        enqueue_tasks(progress.job_id, dataset, cells, dropped_features)
+    progress.start(total_steps=len(cells))
+    progress.publish('stage', stage='queued_on_fleet', schedule=schedule,
+                     **schedule_summary(schedule, max(live_workers().count(), 1)))
+
+    results = []
+    # Reported in submission order, whatever order the workers ran them in
+    position = {(ml_model.pk, target): (i, j) for i, (ml_model, _) in enumerate(ml_models)
+                for j, target in enumerate(target_columns)}
+    tasks = sorted(wait_for_tasks(progress.job_id, progress),
+                   key=lambda task: position[(task.model_id, task.target_column)])
+    _attach_paired_differences([
+        (task.result, load_predictions(task.result)) for task in tasks
+        if task.status == 'completed' and task.result.predictions_file
+    ])
+    for task in tasks:
+        if task.status == 'completed':
+            results.append({
+                'id': str(task.result_id),
+                'status': 'completed',
+                'dataset': dataset.name,
+                'model': task.model.name,
+                'metrics': task.result.metrics,
+                'feature_importance': task.result.feature_importance,
+                'model_info': task.model_info,
+                'worker': task.worker_id
+            })
+        else:
+            results.append({
+                'id': None,
+                'status': task.status,
+                'dataset': dataset.name,
+                'model': task.model.name,
+                'target_column': task.target_column,
+                'error': task.error
+            })
+    print(f"Total results created: {sum(1 for result in results if result['id'])}")
+    response = Response(results, status=status.HTTP_201_CREATED)
+    response['Access-Control-Allow-Origin'] = '*'
+    return response
+
+def _attach_paired_differences(holdouts):
+    """
+    Compare each target's saved results against its best model by paired bootstrap.
+
+    holdouts are (TrainingResult, holdout arrays) pairs of one job. The
+    comparison goes into each result's metrics as paired_differences, so
+    users can see whether a lead over the runner-up is more than noise.
+    """
+    from .scoring import compare_predictions
+
+    by_target = {}
+    for result, arrays in holdouts:
+        by_target.setdefault(result.target_column, []).append((result, arrays))
+    updated = []
+    for target, group in by_target.items():
+        if len(group) < 2:
+            continue
+        try:
+            reference, comparisons = compare_predictions([arrays for _, arrays in group])
+        except ValueError as e:
+            print(f"Skipping paired comparison for {target}: {e}")
+            continue
+        for (result, _), comparison in zip(group, comparisons):
+            result.metrics['paired_differences'] = {'reference': str(group[reference][0].id),
+                                                    **comparison}
+            updated.append(result)
+    TrainingResult.objects.bulk_update(updated, ['metrics'])
+
+def _unknown_job(job_id):
+    response = JsonResponse({'error': f'Unknown training job {job_id}'}, status=404)
+    response['Access-Control-Allow-Origin'] = '*'
+    return response
+
+def training_events(request, job_id):
+    """Stream a training job's progress as server-sent events"""
+    progress = find_progress(job_id)
+    if progress is None:
+        return _unknown_job(job_id)
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', -1))
+    except ValueError:
+        last_event_id = -1
+    response = StreamingHttpResponse(
+        (format_sse(event) for event in progress.iter_events(last_event_id)),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    response['Access-Control-Allow-Origin'] = '*'
+    return response
+
+def training_status(request, job_id):
+    progress = find_progress(job_id)
+    if progress is None:
+        return _unknown_job(job_id)
+    response = JsonResponse(progress.snapshot())
+    response['Access-Control-Allow-Origin'] = '*'
+    return response
+
+@api_view(['POST', 'OPTIONS'])
+def estimate_training(request):
+    """
+    Predicted runtime of a training grid, before it is submitted.
+
+    Takes the same file (or a stored dataset_id), models and target_columns
+    as /api/train/ and returns every cell's predicted seconds in the order
+    it would run, with the expected total and time to the first result.
+    """
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+        'Access-Control-Allow-Headers': '*',
+    }
+    if request.method == 'OPTIONS':
+        return Response({}, status=status.HTTP_200_OK, headers=headers)
+
+    try:
+        models = request.data.get('models', '[]')
+        target_columns = request.data.get('target_columns', '[]')
+        models = json.loads(models) if isinstance(models, str) else models
+        target_columns = json.loads(target_columns) if isinstance(target_columns, str) else target_columns
+
+        if request.data.get('dataset_id'):
+            profile = Dataset.objects.get(id=request.data['dataset_id']).profile
+        elif request.FILES.get('file'):
+            # Profiled without storing; an identical earlier upload is not read again
+            _, profile, _ = inspect_upload(request.FILES['file'])
+        else:
+            return Response({'error': 'Provide a file or a dataset_id'},
+                            status=status.HTTP_400_BAD_REQUEST, headers=headers)
+        missing_columns = [col for col in target_columns if col not in profile['columns']]
+        if missing_columns:
+            return Response({'error': f'Target columns not found in dataset: {missing_columns}'},
+                            status=status.HTTP_400_BAD_REQUEST, headers=headers)
+
+        cells = estimate_cells(profile, models, target_columns)
+        if fleet_enabled():
+            from .fleet import live_workers
+
+            workers = max(live_workers().count(), 1)
+            schedule = longest_first(cells)
+        else:
+            workers = 1
+            schedule = shortest_first(cells)
+        summary = schedule_summary(schedule, workers)
+    except Dataset.DoesNotExist:
+        return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND,
+                        headers=headers)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST, headers=headers)
+
+    return Response({'executor': settings.TRAINING_EXECUTOR, 'workers': workers,
+                     'cells': schedule, **summary}, headers=headers)
+
+@api_view(['POST', 'OPTIONS'])
+def cancel_training(request, job_id):
+    """Ask a running training job to stop; finished cells keep their results"""
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+        'Access-Control-Allow-Headers': '*',
+    }
+    if request.method == 'OPTIONS':
+        return Response({}, status=status.HTTP_200_OK, headers=headers)
+
+    progress = find_progress(job_id)
+    if progress is None:
+        return Response({'error': f'Unknown training job {job_id}'},
+                        status=status.HTTP_404_NOT_FOUND, headers=headers)
+    if progress.finished:
+        return Response({'error': f'Job {job_id} has already finished', **progress.snapshot()},
+                        status=status.HTTP_409_CONFLICT, headers=headers)
+    progress.cancel()
+    return Response(progress.snapshot(), status=status.HTTP_202_ACCEPTED, headers=headers)
+
+def _worker_auth_error(request):
+    """(body, status) when a worker request must be refused, or None"""
+    if not fleet_enabled():
+        return {'error': 'Not found'}, status.HTTP_404_NOT_FOUND
+    token = request.headers.get('X-Worker-Token', '')
+    if not hmac.compare_digest(token.encode(), settings.FLEET_WORKER_TOKEN.encode()):
+        return {'error': 'Invalid worker token'}, status.HTTP_403_FORBIDDEN
+    return None
+
+@api_view(['POST'])
+def worker_claim(request):
+    """Lease the next training task to a fleet worker; 204 when the queue is empty"""
+    from .fleet import claim_task, task_payload
+
+    error = _worker_auth_error(request)
+    if error:
+        return Response(*error)
+    worker_id = request.data.get('worker_id')
+    if not worker_id:
+        return Response({'error': 'worker_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    task = claim_task(worker_id, request.data.get('cached_hashes') or [])
+    if task is None:
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(task_payload(task), status=status.HTTP_200_OK)
+
+def worker_dataset(request, content_hash):
+    """Stream a stored dataset to a fleet worker by its content hash"""
+    error = _worker_auth_error(request)
+    if error:
+        return JsonResponse(error[0], status=error[1])
+    for dataset in Dataset.objects.filter(content_hash=content_hash,
+                                          parent__isnull=True).order_by('uploaded_at'):
+        if dataset.file.storage.exists(dataset.file.name):
+            return FileResponse(dataset.file.open('rb'), content_type='text/csv')
+    return JsonResponse({'error': f'No dataset with hash {content_hash}'}, status=404)
+
+@api_view(['POST'])
+def worker_heartbeat(request, task_id):
+    """Extend a worker's lease; 'continue' is false once the task was cancelled or reassigned"""
+    from .fleet import heartbeat
+
+    error = _worker_auth_error(request)
+    if error:
+        return Response(*error)
+    return Response({'continue': heartbeat(task_id, request.data.get('worker_id'))})
+
+@api_view(['POST'])
+def worker_complete(request, task_id):
+    """Store a worker's metrics and artifacts for a task as a TrainingResult"""
+    from .fleet import complete_task
+
+    error = _worker_auth_error(request)
+    if error:
+        return Response(*error)
+    if 'model_file' not in request.FILES:
+        return Response({'error': 'model_file is required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        result = complete_task(
+            task_id, request.data.get('worker_id'),
+            metrics=json.loads(request.data.get('metrics', '{}')),
+            feature_importance=json.loads(request.data.get('feature_importance', '{}')),
+            model_info=json.loads(request.data.get('model_info', '{}')),
+            model_file=request.FILES['model_file'],
+            compiled_file=request.FILES.get('compiled_file'),
+            predictions_file=request.FILES.get('predictions_file')
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if result is None:
+        return Response({'error': 'Task is no longer leased to this worker'},
+                        status=status.HTTP_409_CONFLICT)
+    return Response({'result_id': result.id}, status=status.HTTP_201_CREATED)
+
+@api_view(['POST'])
+def worker_fail(request, task_id):
+    """Record that a worker could not finish a task"""
+    from .fleet import fail_task
+
+    error = _worker_auth_error(request)
+    if error:
+        return Response(*error)
+    task_status = request.data.get('status', 'failed')
+    if task_status not in ('failed', 'timed_out', 'cancelled'):
+        return Response({'error': f'Invalid status {task_status}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not fail_task(task_id, request.data.get('worker_id'), task_status,
+                     request.data.get('error', '')):
+        return Response({'error': 'Task is no longer leased to this worker'},
+                        status=status.HTTP_409_CONFLICT)
+    return Response({'status': task_status})
+
+def metrics(request):
+    """Operational metrics of this process in Prometheus text format"""
+    from .metrics import CONTENT_TYPE, render, training_service_metrics
+
+    return HttpResponse(render(training_service_metrics), content_type=CONTENT_TYPE)
+
 @api_view(['GET', 'OPTIONS'])
 def debug_database(request):
     if request.method == 'OPTIONS':
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import pickle
+import socket
+import threading
+import uuid
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from .artifacts import predictions_npz
+from .fitting import TrainingInterrupted, fit_cell
+
+# Parsed datasets a worker keeps in memory, on top of the files on disk
+FRAME_CACHE_SIZE = 4
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+class BrokerError(Exception):
+    pass
+
+def _dumps(value):
+    # Training output can hold NumPy scalars, e.g. in missing-value counts
+    return json.dumps(value, default=lambda o: o.tolist() if hasattr(o, 'tolist') else str(o))
+
+def _encode_multipart(fields, files):
+    """
+    Body and content type of a multipart/form-data request.
+
+    File values are bytes, or (filename, bytes) where the server checks the name.
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                     .encode() + str(value).encode() + b'\r\n')
+    for name, content in files.items():
+        filename, content = content if isinstance(content, tuple) else (name, content)
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                     f'filename="{filename}"\r\nContent-Type: application/octet-stream\r\n\r\n'
+                     .encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+class BrokerClient:
+    """HTTP client for the worker endpoints of a training server"""
+
+    def __init__(self, base_url, token=None, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    def _request(self, method, path, data=None, files=None, stream_to=None):
+        """Return (status code, decoded JSON body), or write the body to stream_to"""
+        headers = {}
+        body = None
+        if self.token:
+            headers['X-Worker-Token'] = self.token
+        if files:
+            body, headers['Content-Type'] = _encode_multipart(data or {}, files)
+        elif data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+
+        request = urllib.request.Request(f'{self.base_url}{path}', data=body, headers=headers,
+                                         method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                if stream_to is not None:
+                    while chunk := response.read(DOWNLOAD_CHUNK_SIZE):
+                        stream_to.write(chunk)
+                    return response.status, None
+                content = response.read()
+                return response.status, json.loads(content) if content else None
+        except urllib.error.HTTPError as e:
+            content = e.read()
+            try:
+                return e.code, json.loads(content) if content else None
+            except ValueError:
+                return e.code, None
+
+    def claim(self, worker_id, cached_hashes):
+        """The next task for this worker, or None when the queue is empty"""
+        code, body = self._request('POST', '/api/workers/claim/', {
+            'worker_id': worker_id, 'cached_hashes': list(cached_hashes)})
+        if code == 204:
+            return None
+        if code != 200:
+            raise BrokerError(f'Claim failed ({code}): {body}')
+        return body
+
+    def download_dataset(self, digest, f):
+        code, body = self._request('GET', f'/api/workers/datasets/{digest}/', stream_to=f)
+        if code != 200:
+            raise BrokerError(f'Dataset {digest} could not be downloaded ({code}): {body}')
+
+    def heartbeat(self, task_id, worker_id):
+        """Whether the worker should keep going with the task"""
+        code, body = self._request('POST', f'/api/workers/tasks/{task_id}/heartbeat/',
+                                   {'worker_id': worker_id})
+        return code == 200 and body['continue']
+
+    def complete(self, task_id, worker_id, metrics, feature_importance, model_info, files):
+        code, body = self._request('POST', f'/api/workers/tasks/{task_id}/complete/', {
+            'worker_id': worker_id,
+            'metrics': _dumps(metrics),
+            'feature_importance': _dumps(feature_importance),
+            'model_info': _dumps(model_info),
+        }, files=files)
+        return code == 201
+
+    def fail(self, task_id, worker_id, task_status, error):
+        code, body = self._request('POST', f'/api/workers/tasks/{task_id}/fail/', {
+            'worker_id': worker_id, 'status': task_status, 'error': error})
+        return code == 200
+
+class DatasetCache:
+    """
+    Datasets by content hash: files on local disk, parsed frames in memory.
+
+    A dataset is downloaded only the first time a task needs it, and its
+    CSV is parsed and profiled only once while it stays in the frame cache.
+    """
+
+    def __init__(self, directory, max_frames=FRAME_CACHE_SIZE):
+        self.directory = directory
+        self.max_frames = max_frames
+        self.frames = OrderedDict()
+        self.downloads = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.directory, f'{digest}.csv')
+
+    def hashes(self):
+        return [name[:-4] for name in os.listdir(self.directory) if name.endswith('.csv')]
+
+    def fetch(self, digest, client):
+        """Local path of a dataset, downloading and verifying it if needed"""
+        path = self.path(digest)
+        if os.path.exists(path):
+            return path
+        partial = f'{path}.{uuid.uuid4().hex}.part'
+        try:
+            with open(partial, 'wb') as f:
+                client.download_dataset(digest, f)
+            hasher = hashlib.sha256()
+            with open(partial, 'rb') as f:
+                while chunk := f.read(DOWNLOAD_CHUNK_SIZE):
+                    hasher.update(chunk)
+            if hasher.hexdigest() != digest:
+                raise BrokerError(f'Dataset {digest} arrived corrupted')
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        self.downloads += 1
+        return path
+
+    def frame(self, digest, client):
+        """(DataFrame, profile) of a dataset, from memory when possible"""
+        if digest in self.frames:
+            self.frames.move_to_end(digest)
+            return self.frames[digest]
+
+        import pandas as pd
+        from .profiling import profile_dataframe
+
+        df = pd.read_csv(self.fetch(digest, client))
+        self.frames[digest] = (df, profile_dataframe(df))
+        while len(self.frames) > self.max_frames:
+            self.frames.popitem(last=False)
+        return self.frames[digest]
+
+class Worker:
+    """Pull model x target tasks from a training server and run them"""
+
+    def __init__(self, client, cache, worker_id=None, isolation=None, heartbeat_seconds=5):
+        self.client = client
+        self.cache = cache
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.isolation = isolation
+        self.heartbeat_seconds = heartbeat_seconds
+
+    def run(self, idle_seconds=2, stop=None):
+        """Work until stop (a threading.Event) is set, sleeping while the queue is empty"""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                worked = self.run_once()
+            except (BrokerError, OSError) as e:
+                print(f"Worker {self.worker_id}: {e}")
+                worked = False
+            if not worked:
+                stop.wait(idle_seconds)
+
+    def run_once(self):
+        """Claim and run one task; False when there was nothing to do"""
+        task = self.client.claim(self.worker_id, self.cache.hashes())
+        if task is None:
+            return False
+        print(f"Worker {self.worker_id}: training {task['model_type']} on {task['target_column']}")
+        self._run_task(task)
+        return True
+
+    def _keep_leased(self, task, lost, done):
+        """Heartbeat until done; sets lost if the server wants the task stopped"""
+        interval = min(self.heartbeat_seconds, task['lease_seconds'] / 3)
+        while not done.wait(interval):
+            try:
+                if not self.client.heartbeat(task['id'], self.worker_id):
+                    lost.set()
+                    return
+            except (BrokerError, OSError) as e:
+                print(f"Worker {self.worker_id}: heartbeat failed: {e}")
+
+    def _run_task(self, task):
+        # Imported here so the worker starts without loading scikit-learn
+        from .compiled import compile_and_verify
+        from .ml_utils import ModelTrainer
+
+        try:
+            df, profile = self.cache.frame(task['dataset_hash'], self.client)
+        except BrokerError as e:
+            self.client.fail(task['id'], self.worker_id, 'failed', str(e))
+            return
+
+        trainer = ModelTrainer(
+            dataset_path=df,
+            target_column=task['target_column'],
+            model_type=task['model_type'],
+            hyperparameters=task['hyperparameters'],
+            profile=profile,
+            cardinality_threshold=task['cardinality_threshold'],
+            high_cardinality_encoder=task['high_cardinality_encoder'],
+            dropped_features=task.get('dropped_features')
+        )
+        lost, done = threading.Event(), threading.Event()
+        heartbeats = threading.Thread(target=self._keep_leased, args=(task, lost, done),
+                                      daemon=True)
+        heartbeats.start()
+        try:
+            pipeline, metrics, feature_importance, _, model_info = fit_cell(
+                trainer, time_limit=task['time_limit'], cancelled=lost.is_set,
+                isolation=self.isolation)
+        except TrainingInterrupted as e:
+            # A task the server took back has nothing left to report
+            if not lost.is_set():
+                self.client.fail(task['id'], self.worker_id, e.status, str(e))
+            return
+        except Exception as e:
+            self.client.fail(task['id'], self.worker_id, 'failed', str(e))
+            return
+        finally:
+            done.set()
+            heartbeats.join()
+
+        files = {
+            'model_file': pickle.dumps(pipeline, protocol=pickle.HIGHEST_PROTOCOL),
+            'predictions_file': predictions_npz(trainer.y_test, trainer.y_pred),
+        }
+        compiled = compile_and_verify(pipeline, trainer.X_test)
+        if compiled is not None:
+            files['compiled_file'] = pickle.dumps(compiled, protocol=pickle.HIGHEST_PROTOCOL)
+        if not self.client.complete(task['id'], self.worker_id, metrics, feature_importance,
+                                    model_info, files):
+            print(f"Worker {self.worker_id}: result of task {task['id']} was not accepted")
@@ -1,31 +1,92 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import List
-from .models import TrainedModel
+from pymongo import ASCENDING, DESCENDING
+from bson import ObjectId
+from typing import Any, Dict, List, Optional, Tuple
+from .schemas import TrainedModel
+import os
+
+MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '100'))
+MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '0'))
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Fields read for each listed model: exactly those of TrainedModel
+MODEL_PROJECTION = {**{field: 1 for field in TrainedModel.model_fields}, "_id": 0}
 
 class Database:
     client: AsyncIOMotorClient = None
 
-    async def connect_to_database(self, url: str):
-        self.client = AsyncIOMotorClient(url)
+    def __init__(self, client_class=AsyncIOMotorClient):
+        self.client_class = client_class
+
+    @property
+    def collection(self):
+        return self.client.ml_models.trained_models
+
+    async def connect_to_database(self, url: str, max_pool_size: int = MAX_POOL_SIZE,
+                                  min_pool_size: int = MIN_POOL_SIZE):
+        self.client = self.client_class(url, maxPoolSize=max_pool_size, minPoolSize=min_pool_size)
+        await self.ensure_indexes()
         
     async def close_database_connection(self):
         if self.client:
             self.client.close()
 
-    async def get_all_models(self) -> List[TrainedModel]:
-        models = []
-        cursor = self.client.ml_models.trained_models.find({})
-        async for document in cursor:
-            models.append(TrainedModel(**document))
-        return models
+    async def ensure_indexes(self):
+        await self.collection.create_index([("id", ASCENDING)], unique=True)
+        await self.collection.create_index([("trainId", ASCENDING)])
+        await self.collection.create_index([("feature", ASCENDING)])
+        await self.collection.create_index([("modelType", ASCENDING)])
+
+    async def get_models_page(
+        self,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Return one page of raw model documents, newest first, and the cursor
+        for the next page (None on the last page).
+
+        Pages are keyed on _id rather than skip/offset so every page is an
+        index range scan. Only the TrainedModel fields are fetched; the _id
+        of the page's last model is looked up by its unique id when there
+        is a next page. Raises ValueError for a cursor this method did not
+        hand out.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        query = dict(filters or {})
+        if cursor:
+            if not ObjectId.is_valid(cursor):
+                raise ValueError(f"Invalid cursor: {cursor}")
+            query["_id"] = {"$lt": ObjectId(cursor)}
+
+        documents = await (self.collection.find(query, MODEL_PROJECTION)
+                           .sort("_id", DESCENDING)
+                           .limit(limit + 1)
+                           .to_list(length=limit + 1))
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            last = await self.collection.find_one({"id": documents[-1]["id"]}, {"_id": 1})
+            next_cursor = str(last["_id"])
+        return documents, next_cursor
+
+    async def get_all_models(self, limit: int = DEFAULT_PAGE_SIZE) -> List[TrainedModel]:
+        documents, _ = await self.get_models_page(limit=limit)
+        return [TrainedModel(**document) for document in documents]
 
     async def get_model(self, model_id: str) -> TrainedModel:
-        model = await self.client.ml_models.trained_models.find_one({"id": model_id})
+        model = await self.collection.find_one({"id": model_id}, MODEL_PROJECTION)
         if model:
             return TrainedModel(**model)
         return None
 
     async def save_model(self, model: TrainedModel):
-        await self.client.ml_models.trained_models.insert_one(model.dict())
+        await self.collection.insert_one(model.model_dump())
+
+    async def save_models(self, models: List[TrainedModel]):
+        """Insert all results of one training run in a single round trip"""
+        if models:
+            await self.collection.insert_many([model.model_dump() for model in models], ordered=False)
 
-db = Database() 
\ No newline at end of file
+db = Database()
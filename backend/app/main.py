@@ -1,15 +1,32 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from .models import TrainingRequest, TrainingResponse, TrainedModel, ModelMetrics
-from .database import db
-from .ml_utils import train_model
+from fastapi.responses import StreamingResponse
+from .schemas import TrainingRequest, TrainingResponse, TrainedModel, ModelMetrics
+from .database import db, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from .ml_utils import train_model_from_csv
+from api.progress import find_progress, format_sse, start_progress
+from api.metrics import (CONTENT_TYPE, FIT_DURATION, FITS, FITS_IN_FLIGHT, REQUEST_LATENCY,
+                         render, rows_label)
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import os
+import tempfile
+import time
 import pandas as pd
 import uuid
 from datetime import datetime
 import json
-from typing import List
+from typing import List, Optional, Tuple
+
+# Fits run in worker processes so they never hold the event loop or the GIL
+TRAINING_WORKERS = int(os.getenv('TRAINING_WORKERS', os.cpu_count() or 1))
+# Training requests admitted at once; further requests get a 503 instead of queueing unbounded
+MAX_ACTIVE_TRAININGS = int(os.getenv('MAX_ACTIVE_TRAININGS', TRAINING_WORKERS))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 app = FastAPI()
+training_executor: Optional[ProcessPoolExecutor] = None
+training_slots = asyncio.Semaphore(MAX_ACTIVE_TRAININGS)
 
 # Configure CORS
 app.add_middleware(
@@ -20,79 +37,223 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template so ids in paths do not create new series
+    route = request.scope.get("route")
+    REQUEST_LATENCY.observe(time.perf_counter() - started, method=request.method,
+                            endpoint=route.path if route is not None else "unmatched",
+                            status=response.status_code)
+    return response
+
+@app.get("/metrics")
+async def metrics():
+    return Response(render(), media_type=CONTENT_TYPE)
+
 @app.on_event("startup")
 async def startup_db_client():
+    global training_executor
     await db.connect_to_database("mongodb://localhost:27017")
+    training_executor = ProcessPoolExecutor(max_workers=TRAINING_WORKERS)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     await db.close_database_connection()
+    if training_executor is not None:
+        training_executor.shutdown(cancel_futures=True)
+
+async def spool_upload(file: UploadFile) -> Tuple[str, int]:
+    """
+    Copy the upload to a uniquely named temp file chunk by chunk, off the
+    event loop. Returns the path and the number of data rows, counted as
+    lines after the header (close enough for the size label of fit metrics).
+    """
+    loop = asyncio.get_running_loop()
+    spool = tempfile.NamedTemporaryFile(prefix='upload_', suffix='.csv', delete=False)
+    lines, last = 0, b'\n'
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            lines += chunk.count(b'\n')
+            last = chunk[-1:]
+            await loop.run_in_executor(None, spool.write, chunk)
+    finally:
+        spool.close()
+    # The last line may lack its newline
+    if last != b'\n':
+        lines += 1
+    return spool.name, max(lines - 1, 0)
 
 @app.post("/train/", response_model=TrainingResponse)
 async def train_models(file: UploadFile = File(...), data: str = File(...)):
-    try:
-        # Parse the training request
-        training_data = json.loads(data)
-        training_request = TrainingRequest(**training_data)
-        
-        # Read CSV file
-        df = pd.read_csv(file.file)
-        
-        # Generate training ID
-        training_id = str(uuid.uuid4())
-        
-        # Train models and save results
-        for model_config in training_request.models:
-            # Train the model
-            metrics = await train_model(
-                data=df,
-                target_column=training_request.target_column,
-                model_type=model_config.model_type,
-                hyperparameters=model_config.hyperparameters
+    # Admission control: reject rather than pile fits onto a saturated pool
+    if training_slots.locked():
+        raise HTTPException(
+            status_code=503,
+            detail="Training capacity exhausted, retry later",
+            headers={"Retry-After": "30"}
+        )
+
+    async with training_slots:
+        loop = asyncio.get_running_loop()
+        progress = None
+        path = None
+        try:
+            # Parse the training request
+            training_data = json.loads(data)
+            training_request = TrainingRequest(**training_data)
+            
+            # Stream the CSV to disk; workers parse it themselves
+            path, rows = await spool_upload(file)
+            columns = await loop.run_in_executor(
+                None, lambda: pd.read_csv(path, nrows=0).columns.tolist()
             )
+            if training_request.target_column not in columns:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Target column not found in dataset: {training_request.target_column}"
+                )
             
-            # Create and save trained model record
-            trained_model = TrainedModel(
-                id=str(uuid.uuid4()),
-                trainId=training_id,
-                feature=training_request.target_column,
-                modelType=model_config.model_type,
-                metrics=ModelMetrics(**metrics),
-                timestamp=datetime.now()
+            # Clients may pass their own training ID to subscribe to events early
+            training_id = training_data.get('training_id') or str(uuid.uuid4())
+            progress = start_progress(training_id)
+            if progress is None:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Training job {training_id} already exists"
+                )
+            progress.start(total_steps=len(training_request.models))
+            
+            # Independent model configs are fitted concurrently in the process pool
+            submitted = []
+
+            async def run(model_config):
+                progress.publish('model_started', model_type=model_config.model_type,
+                                 target=training_request.target_column)
+                started = time.perf_counter()
+                fit_status = 'failed'
+                try:
+                    with FITS_IN_FLIGHT.track_inprogress():
+                        future = training_executor.submit(
+                            train_model_from_csv,
+                            path,
+                            training_request.target_column,
+                            model_config.model_type,
+                            model_config.hyperparameters
+                        )
+                        submitted.append(future)
+                        metrics = await asyncio.wrap_future(future)
+                    FIT_DURATION.observe(time.perf_counter() - started,
+                                         model_type=model_config.model_type,
+                                         dataset_rows=rows_label(rows))
+                    fit_status = 'completed'
+                except asyncio.CancelledError:
+                    fit_status = 'cancelled'
+                    raise
+                finally:
+                    FITS.inc(model_type=model_config.model_type, status=fit_status)
+                return model_config, metrics
+            
+            # Report each model as soon as it finishes instead of waiting for the slowest
+            trained_models = []
+            tasks = [asyncio.ensure_future(run(config)) for config in training_request.models]
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    model_config, metrics = await finished
+                    trained_model = TrainedModel(
+                        id=str(uuid.uuid4()),
+                        trainId=training_id,
+                        feature=training_request.target_column,
+                        modelType=model_config.model_type,
+                        metrics=ModelMetrics(**metrics),
+                        timestamp=datetime.now()
+                    )
+                    trained_models.append(trained_model)
+                    progress.step_completed(result_id=trained_model.id,
+                                            model_type=model_config.model_type,
+                                            target=training_request.target_column,
+                                            metrics=metrics)
+            finally:
+                # After a failed fit, drop the fits still queued and wait for the
+                # running ones, which read the spool file and hold this slot
+                for future in submitted:
+                    future.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+            
+            # Persist the whole run in one batch
+            await db.save_models(trained_models)
+            
+            progress.publish('completed', status='completed')
+            return TrainingResponse(
+                training_id=training_id,
+                status="success",
+                message=f"Successfully trained {len(training_request.models)} models"
             )
             
-            await db.save_model(trained_model)
-        
-        return TrainingResponse(
-            training_id=training_id,
-            status="success",
-            message=f"Successfully trained {len(training_request.models)} models"
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        except HTTPException:
+            raise
+        except Exception as e:
+            if progress is not None:
+                progress.publish('failed', status='failed', error=str(e))
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            if path is not None:
+                await loop.run_in_executor(None, os.remove, path)
 
 @app.get("/models", response_model=List[TrainedModel])
-async def get_trained_models():
+async def get_trained_models(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    feature: Optional[str] = None,
+    modelType: Optional[str] = None,
+    trainId: Optional[str] = None
+):
     try:
-        models = await db.get_all_models()
+        filters = {key: value for key, value in
+                   {"feature": feature, "modelType": modelType, "trainId": trainId}.items()
+                   if value is not None}
+        models, next_cursor = await db.get_models_page(limit=limit, cursor=cursor, filters=filters)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         return models
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/train/{training_id}/status", response_model=TrainingResponse)
 async def get_training_status(training_id: str):
+    progress = find_progress(training_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"Unknown training job {training_id}")
     try:
-        # In a real application, you would check the actual training status
-        # For now, we'll just return a dummy response
+        snapshot = progress.snapshot()
         return TrainingResponse(
             training_id=training_id,
-            status="completed",
-            message="Training completed successfully"
+            status=snapshot['status'],
+            message=f"{snapshot['completed_steps']} of {snapshot['total_steps']} models trained"
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/train/{training_id}/events")
+async def stream_training_events(training_id: str, last_event_id: Optional[str] = Header(None)):
+    try:
+        last_id = int(last_event_id) if last_event_id is not None else -1
+    except ValueError:
+        last_id = -1
+    progress = find_progress(training_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"Unknown training job {training_id}")
+    # The event iterator blocks between events, so Starlette runs it in its threadpool
+    return StreamingResponse(
+        (format_sse(event) for event in progress.iter_events(last_id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/models/{model_id}", response_model=TrainedModel)
 async def get_model_details(model_id: str):
     try:
@@ -1,21 +1,9 @@
 from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LinearRegression
-from sklearn.svm import SVR
-from sklearn.ensemble import RandomForestRegressor
-from xgboost import XGBRegressor
-from sklearn.neighbors import KNeighborsRegressor
 from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error
 import numpy as np
 import pandas as pd
 from typing import Dict, Any
-
-MODEL_CLASSES = {
-    'linear_regression': LinearRegression,
-    'svr': SVR,
-    'random_forest': RandomForestRegressor,
-    'xgboost': XGBRegressor,
-    'knn': KNeighborsRegressor
-}
+from api.estimators import create_estimator
 
 def train_model(
     data: pd.DataFrame,
@@ -29,9 +17,8 @@ def train_model(
     
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
-    # Get model class and instantiate with hyperparameters
-    model_class = MODEL_CLASSES[model_type]
-    model = model_class(**hyperparameters)
+    # Get model class from the shared registry and instantiate with hyperparameters
+    model = create_estimator(model_type, hyperparameters)
     
     # Train model
     model.fit(X_train, y_train)
@@ -47,4 +34,14 @@ def train_model(
         'rmse': float(np.sqrt(mean_squared_error(y_test, y_pred)))
     }
     
-    return metrics 
\ No newline at end of file
+    return metrics 
+
+def train_model_from_csv(
+    path: str,
+    target_column: str,
+    model_type: str,
+    hyperparameters: Dict[str, Any]
+) -> Dict[str, float]:
+    """Process-pool entry point: parse the spooled CSV in the worker and train"""
+    data = pd.read_csv(path)
+    return train_model(data, target_column, model_type, hyperparameters)
@@ -0,0 +1,31 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+class ModelConfig(BaseModel):
+    model_type: str
+    hyperparameters: Dict[str, Any] = Field(default_factory=dict)
+
+class TrainingRequest(BaseModel):
+    target_column: str
+    models: List[ModelConfig]
+    training_id: Optional[str] = None
+
+class TrainingResponse(BaseModel):
+    training_id: str
+    status: str
+    message: str
+
+class ModelMetrics(BaseModel):
+    r2_score: float
+    mse: float
+    mae: float
+    rmse: float
+
+class TrainedModel(BaseModel):
+    id: str
+    trainId: str
+    feature: str
+    modelType: str
+    metrics: ModelMetrics
+    timestamp: datetime
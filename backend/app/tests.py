@@ -0,0 +1,164 @@
+import json
+import unittest
+from datetime import datetime
+
+try:
+    from mongomock_motor import AsyncMongoMockClient
+except ImportError:
+    AsyncMongoMockClient = None
+
+@unittest.skipIf(AsyncMongoMockClient is None, "mongomock-motor is not installed")
+class DatabaseTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        from .database import Database
+        from .schemas import TrainedModel, ModelMetrics
+
+        self.db = Database(client_class=AsyncMongoMockClient)
+        await self.db.connect_to_database("mongodb://localhost:27017")
+        metrics = ModelMetrics(r2_score=0.9, mse=1.0, mae=0.5, rmse=1.0)
+        self.models = [
+            TrainedModel(
+                id=f"model-{i}",
+                trainId="run-1",
+                feature="yield",
+                modelType="knn" if i % 2 else "svr",
+                metrics=metrics,
+                timestamp=datetime.now()
+            )
+            for i in range(5)
+        ]
+        await self.db.save_models(self.models)
+
+    async def asyncTearDown(self):
+        await self.db.close_database_connection()
+
+    async def test_indexes_created(self):
+        indexes = await self.db.collection.index_information()
+        keys = {key for index in indexes.values() for key, _ in index['key']}
+        self.assertTrue({'id', 'trainId', 'feature', 'modelType'} <= keys)
+
+    async def test_cursor_pagination(self):
+        first, cursor = await self.db.get_models_page(limit=2)
+        self.assertEqual([m['id'] for m in first], ['model-4', 'model-3'])
+        self.assertIsNotNone(cursor)
+
+        rest, cursor = await self.db.get_models_page(limit=10, cursor=cursor)
+        self.assertEqual([m['id'] for m in rest], ['model-2', 'model-1', 'model-0'])
+        self.assertIsNone(cursor)
+
+    async def test_pages_fetch_only_model_fields(self):
+        from .schemas import TrainedModel
+
+        await self.db.collection.update_many({}, {'$set': {'debug': 'x' * 100}})
+        models, cursor = await self.db.get_models_page(limit=2)
+        self.assertEqual([set(m) for m in models], [set(TrainedModel.model_fields)] * 2)
+        rest, _ = await self.db.get_models_page(limit=10, cursor=cursor)
+        self.assertEqual([m['id'] for m in rest], ['model-2', 'model-1', 'model-0'])
+
+    async def test_filters(self):
+        models, _ = await self.db.get_models_page(filters={'modelType': 'knn'})
+        self.assertEqual([m['id'] for m in models], ['model-3', 'model-1'])
+
+    async def test_malformed_cursor(self):
+        with self.assertRaises(ValueError):
+            await self.db.get_models_page(cursor='not-an-object-id')
+
+    async def test_models_endpoint_rejects_malformed_cursor(self):
+        from unittest import mock
+        from fastapi.testclient import TestClient
+        from . import main
+
+        with mock.patch.object(main, 'db', self.db):
+            client = TestClient(main.app)
+            response = client.get('/models', params={'cursor': 'not-an-object-id'})
+            self.assertEqual(response.status_code, 400)
+            response = client.get('/models', params={'limit': 2})
+            self.assertEqual([m['id'] for m in response.json()], ['model-4', 'model-3'])
+            self.assertIn('x-next-cursor', response.headers)
+
+    async def test_get_model(self):
+        model = await self.db.get_model('model-2')
+        self.assertEqual(model.modelType, 'svr')
+        self.assertIsNone(await self.db.get_model('missing'))
+
+
+class TrainingEndpointTests(unittest.TestCase):
+    def test_failed_config_settles_other_fits_before_cleanup(self):
+        import os
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest import mock
+        from fastapi.testclient import TestClient
+        from . import main
+
+        running, finished = set(), []
+        lock = threading.Lock()
+
+        def fit(path, target_column, model_type, hyperparameters):
+            with lock:
+                running.add(model_type)
+            try:
+                if model_type == 'broken':
+                    raise ValueError('broken config')
+                time.sleep(0.3)
+                with open(path) as f:
+                    f.read()
+                finished.append(model_type)
+                return {'r2_score': 1.0, 'mse': 0.0, 'mae': 0.0, 'rmse': 0.0}
+            finally:
+                with lock:
+                    running.discard(model_type)
+
+        remove = os.remove
+        running_at_cleanup = []
+
+        def cleanup(path):
+            running_at_cleanup.append(set(running))
+            remove(path)
+
+        executor = ThreadPoolExecutor(max_workers=2)
+        saved = mock.AsyncMock()
+        with mock.patch.object(main, 'training_executor', executor), \
+                mock.patch.object(main, 'train_model_from_csv', fit), \
+                mock.patch.object(main.db, 'save_models', saved), \
+                mock.patch.object(main.os, 'remove', cleanup):
+            response = TestClient(main.app).post('/train/', files={
+                'file': ('data.csv', b'x,y\n1,2\n'),
+                'data': (None, json.dumps({'target_column': 'y', 'models': [
+                    {'model_type': 'slow'}, {'model_type': 'broken'}, {'model_type': 'queued'}
+                ]})),
+            })
+        executor.shutdown(wait=True)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('broken config', response.json()['detail'])
+        # The spool file was removed only once no fit was reading it any more
+        self.assertEqual(running_at_cleanup, [set()])
+        self.assertIn('slow', finished)
+        saved.assert_not_called()
+        self.assertFalse(main.training_slots.locked())
+
+    def test_unknown_jobs_are_not_created(self):
+        from fastapi.testclient import TestClient
+        from api.progress import find_progress
+        from . import main
+
+        client = TestClient(main.app)
+        self.assertEqual(client.get('/train/no-such-job/status').status_code, 404)
+        self.assertEqual(client.get('/train/no-such-job/events').status_code, 404)
+        self.assertIsNone(find_progress('no-such-job'))
+
+    def test_job_ids_are_not_reused(self):
+        from fastapi.testclient import TestClient
+        from api.progress import start_progress
+        from . import main
+
+        start_progress('taken-job')
+        response = TestClient(main.app).post('/train/', files={
+            'file': ('data.csv', b'x,y\n1,2\n'),
+            'data': (None, json.dumps({'target_column': 'y', 'training_id': 'taken-job',
+                                       'models': [{'model_type': 'linear_regression'}]})),
+        })
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(main.training_slots.locked())
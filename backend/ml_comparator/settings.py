@@ -24,6 +24,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so latency covers the rest of the middleware stack
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -58,17 +60,92 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Seconds a writer waits for the lock before "database is locked"
+            'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', '20')),
+        },
     }
 }
 
+# Applied to every SQLite connection (see api.apps): WAL lets reads proceed
+# during a write, and NORMAL sync is durable enough in WAL mode
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+# Drop-in PostgreSQL backend (requires psycopg). Connections are kept open
+# and health-checked between requests instead of reconnecting every time.
+if os.getenv('DB_ENGINE') == 'postgresql':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('POSTGRES_DB', 'ml_comparator'),
+        'USER': os.getenv('POSTGRES_USER', 'postgres'),
+        'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+        'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+        'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+    }
+
 # Media files configuration
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are always spooled to disk and hashed while they are received
+FILE_UPLOAD_HANDLERS = ['api.uploads.HashingUploadHandler']
+
 # Static files configuration
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Feature encoding: categorical columns with more distinct values than the
+# threshold get a compact encoder ('frequency' or 'target') instead of one-hot
+ML_HIGH_CARDINALITY_THRESHOLD = int(os.getenv('ML_HIGH_CARDINALITY_THRESHOLD', '20'))
+ML_HIGH_CARDINALITY_ENCODER = os.getenv('ML_HIGH_CARDINALITY_ENCODER', 'frequency')
+# Drop constant, ID-like and highly correlated columns before training when
+# a request does not set 'feature_selection' itself
+ML_FEATURE_SELECTION = os.getenv('ML_FEATURE_SELECTION', 'False') == 'True'
+
+# Admission control for training jobs: estimated peak memory of all running
+# jobs must stay within the budget (default: half of physical memory), and
+# jobs that cannot start within the queue wait get a 503 with Retry-After
+try:
+    _default_budget_mb = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 2 / 1024 / 1024
+except (ValueError, OSError, AttributeError):
+    _default_budget_mb = 2048
+TRAINING_MEMORY_BUDGET_MB = float(os.getenv('TRAINING_MEMORY_BUDGET_MB', _default_budget_mb))
+TRAINING_MAX_CONCURRENT_JOBS = int(os.getenv('TRAINING_MAX_CONCURRENT_JOBS', os.cpu_count() or 1))
+TRAINING_MAX_QUEUE_SECONDS = float(os.getenv('TRAINING_MAX_QUEUE_SECONDS', '60'))
+
+# Wall-clock limit of each model x target fit (0 disables it; requests and
+# model configs may set their own 'time_limit'). With 'process' isolation
+# fits run in worker processes that are killed on timeout or cancellation;
+# 'thread' fits run in the request thread and stop at checkpoints only
+TRAINING_FIT_TIME_LIMIT_SECONDS = float(os.getenv('TRAINING_FIT_TIME_LIMIT_SECONDS', '600'))
+TRAINING_FIT_ISOLATION = os.getenv('TRAINING_FIT_ISOLATION', 'process')
+
+# 'local' trains /api/train/ cells in the request; 'fleet' queues them for
+# workers started with `manage.py train_worker --server <url>`
+TRAINING_EXECUTOR = os.getenv('TRAINING_EXECUTOR', 'local')
+# Shared secret workers send as X-Worker-Token; required with the fleet executor
+FLEET_WORKER_TOKEN = os.getenv('FLEET_WORKER_TOKEN', '')
+# A task whose worker has not heartbeated for this long is given to another worker
+FLEET_LEASE_SECONDS = float(os.getenv('FLEET_LEASE_SECONDS', '30'))
+FLEET_MAX_ATTEMPTS = int(os.getenv('FLEET_MAX_ATTEMPTS', '3'))
+# Tasks wait this long for a worker that already caches their dataset
+FLEET_LOCALITY_WAIT_SECONDS = float(os.getenv('FLEET_LOCALITY_WAIT_SECONDS', '2'))
+FLEET_MAX_PENDING_SECONDS = float(os.getenv('FLEET_MAX_PENDING_SECONDS', '600'))
+
+# Number of loaded prediction models kept in memory per process
+PREDICTOR_CACHE_SIZE = int(os.getenv('PREDICTOR_CACHE_SIZE', '32'))
+
+# Concurrent prediction requests for a model are coalesced into batches of
+# up to this many rows, waiting at most this long for a batch to fill
+PREDICTION_MAX_BATCH_SIZE = int(os.getenv('PREDICTION_MAX_BATCH_SIZE', '64'))
+PREDICTION_MAX_WAIT_MS = float(os.getenv('PREDICTION_MAX_WAIT_MS', '2'))
+# Seconds a request waits for its batch to be scored (on top of the batch
+# wait) before it gets a 503
+PREDICTION_TIMEOUT_SECONDS = float(os.getenv('PREDICTION_TIMEOUT_SECONDS', '30'))
+
 # CORS configuration
 CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:3000').split(',')
 
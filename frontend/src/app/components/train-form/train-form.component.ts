@@ -1,9 +1,9 @@
-import { Component, OnInit } from '@angular/core';
+import { Component, HostListener, OnInit } from '@angular/core';
 import { FormBuilder, FormGroup, FormArray } from '@angular/forms';
-import { TrainDataService } from '../../services/train-data.service';
+import { RuntimeEstimate, TrainDataService } from '../../services/train-data.service';
 import { MessageService } from 'primeng/api';
 
-type ModelType = 'linear_regression' | 'random_forest' | 'knn' | 'svr' | 'xgboost';
+type ModelType = 'linear_regression' | 'random_forest' | 'knn' | 'svr' | 'xgboost' | 'hist_gradient_boosting';
 
 interface HyperParameter {
   name: string;
@@ -31,13 +31,17 @@ export class TrainFormComponent implements OnInit {
   selectedFile: File | null = null;
   availableColumns: { label: string; value: string }[] = [];
   loading = false;
+  jobId: string | null = null;
+  estimating = false;
+  estimate: RuntimeEstimate | null = null;
 
   modelTypes = [
     { label: 'Linear Regression', value: 'linear_regression' },
     { label: 'Random Forest', value: 'random_forest' },
     { label: 'K-Nearest Neighbors', value: 'knn' },
     { label: 'Support Vector Regression', value: 'svr' },
-    { label: 'XGBoost', value: 'xgboost' }
+    { label: 'XGBoost', value: 'xgboost' },
+    { label: 'Histogram Gradient Boosting', value: 'hist_gradient_boosting' }
   ];
 
   maxFeaturesOptions: DropdownOption[] = [
@@ -46,6 +50,12 @@ export class TrainFormComponent implements OnInit {
     { label: 'Log2', value: 'log2' }
   ];
 
+  earlyStoppingOptions: DropdownOption[] = [
+    { label: 'Auto (over 10k rows)', value: 'auto' },
+    { label: 'On', value: true },
+    { label: 'Off', value: false }
+  ];
+
   weightsOptions: DropdownOption[] = [
     { label: 'Uniform', value: 'uniform' },
     { label: 'Distance', value: 'distance' }
@@ -96,6 +106,15 @@ export class TrainFormComponent implements OnInit {
       { name: 'learning_rate', type: 'number', default: 0.3, min: 0.01, max: 1.0, step: 0.01 },
       { name: 'subsample', type: 'number', default: 1.0, min: 0.1, max: 1.0, step: 0.1 },
       { name: 'colsample_bytree', type: 'number', default: 1.0, min: 0.1, max: 1.0, step: 0.1 }
+    ],
+    hist_gradient_boosting: [
+      { name: 'max_iter', type: 'number', default: 200, min: 10, max: 2000 },
+      { name: 'learning_rate', type: 'number', default: 0.1, min: 0.01, max: 1.0, step: 0.01 },
+      { name: 'max_leaf_nodes', type: 'number', default: 31, min: 2, max: 255 },
+      { name: 'min_samples_leaf', type: 'number', default: 20, min: 1, max: 200 },
+      { name: 'l2_regularization', type: 'number', default: 0.0, min: 0.0, max: 10.0, step: 0.1 },
+      { name: 'early_stopping', type: 'select', default: 'auto', options: this.earlyStoppingOptions },
+      { name: 'random_state', type: 'number', default: 42, min: 0, max: 100 }
     ]
   };
 
@@ -107,6 +126,8 @@ export class TrainFormComponent implements OnInit {
     this.trainForm = this.fb.group({
       models: this.fb.array([]),
       target_columns: [[]],
+      feature_selection: [false],
+      quick_compare: [false],
       file: [null]
     });
   }
@@ -194,24 +215,34 @@ export class TrainFormComponent implements OnInit {
     }
 
     this.loading = true;
+    this.jobId = crypto.randomUUID();
     console.log('Submitting form with values:', formValue);
 
     this.trainDataService.trainMultipleModels(
       this.selectedFile,
       formValue.models,
-      formValue.target_columns
+      formValue.target_columns,
+      this.jobId,
+      formValue.feature_selection,
+      formValue.quick_compare
     ).subscribe({
       next: (response: any) => {
         this.loading = false;
+        this.jobId = null;
+        // Configs a quick comparison ruled out are expected, not failures
+        const interrupted = response.filter((cell: any) => !['completed', 'eliminated'].includes(cell.status));
         this.messageService.add({
-          severity: 'success',
-          summary: 'Success',
-          detail: 'Models trained successfully'
+          severity: interrupted.length ? 'warn' : 'success',
+          summary: interrupted.length ? 'Partially trained' : 'Success',
+          detail: interrupted.length
+            ? `${interrupted.length} model(s) were cancelled, timed out or failed`
+            : 'Models trained successfully'
         });
         console.log('Training response:', response);
       },
       error: (error: any) => {
         this.loading = false;
+        this.jobId = null;
         this.messageService.add({
           severity: 'error',
           summary: 'Error',
@@ -222,6 +253,58 @@ export class TrainFormComponent implements OnInit {
     });
   }
 
+  // Shows the predicted runtime of the grid before it is submitted
+  estimateRuntime(): void {
+    const formValue = this.trainForm.value;
+    if (!this.selectedFile || !formValue.target_columns?.length) {
+      this.messageService.add({
+        severity: 'error',
+        summary: 'Error',
+        detail: 'Please select a file and at least one target column'
+      });
+      return;
+    }
+
+    this.estimating = true;
+    this.trainDataService.estimateTraining(
+      this.selectedFile,
+      formValue.models,
+      formValue.target_columns
+    ).subscribe({
+      next: (estimate: RuntimeEstimate) => {
+        this.estimating = false;
+        this.estimate = estimate;
+      },
+      error: (error: any) => {
+        this.estimating = false;
+        this.estimate = null;
+        this.messageService.add({
+          severity: 'error',
+          summary: 'Error',
+          detail: error.message || 'Failed to estimate runtime'
+        });
+      }
+    });
+  }
+
+  formatSeconds(seconds: number): string {
+    return seconds < 60 ? `${seconds.toFixed(1)}s` : `${Math.floor(seconds / 60)}m ${Math.round(seconds % 60)}s`;
+  }
+
+  cancelTraining(): void {
+    if (this.jobId) {
+      this.trainDataService.cancelTraining(this.jobId).subscribe();
+    }
+  }
+
+  // Closing the tab should not leave the server training for nobody
+  @HostListener('window:beforeunload')
+  onUnload(): void {
+    if (this.jobId) {
+      this.trainDataService.cancelTrainingOnUnload(this.jobId);
+    }
+  }
+
   getParamMin(param: HyperParameter): number {
     return param.min ?? 0;
   }
@@ -4,11 +4,40 @@ import { Observable, throwError } from 'rxjs';
 import { catchError, tap } from 'rxjs/operators';
 import { environment } from '../../environments/environment';
 
+export interface MetricInterval {
+  low: number | null;
+  high: number | null;
+}
+
+export interface MetricDifference extends MetricInterval {
+  difference: number | null;
+  probability_better: number;
+}
+
 export interface ModelMetrics {
   r2_score: number;
   mse: number;
   mae: number;
   rmse: number;
+  // Bootstrap intervals over the holdout rows
+  confidence_intervals?: {
+    level: number;
+    n_resamples: number;
+    r2_score: MetricInterval;
+    mse: MetricInterval;
+    mae: MetricInterval;
+    rmse: MetricInterval;
+  };
+  // Paired bootstrap comparison with the best model trained on the same split
+  paired_differences?: {
+    reference: string;
+    level: number;
+    n_resamples: number;
+    r2_score: MetricDifference;
+    mse: MetricDifference;
+    mae: MetricDifference;
+    rmse: MetricDifference;
+  };
 }
 
 export interface TrainedModel {
@@ -51,10 +80,55 @@ export interface TrainingResponse {
   };
 }
 
+export interface TrainingEvent {
+  id: number;
+  event: 'stage' | 'ranking' | 'model_started' | 'model_stage' | 'iteration' | 'model_completed' | 'model_interrupted' | 'completed' | 'cancelled' | 'failed';
+  job_id: string;
+  status: string;
+  completed_steps: number;
+  total_steps: number;
+  eta_seconds: number | null;
+  stage?: string;
+  model?: string;
+  target?: string;
+  iteration?: number;
+  total_iterations?: number;
+  metrics?: ModelMetrics;
+  reason?: 'cancelled' | 'timed_out' | 'failed';
+  error?: string;
+  // Provisional quick-compare ranking after each subsample rung, best first
+  rung?: number;
+  n_samples?: number;
+  ranking?: {
+    model: string;
+    model_type: string;
+    metrics: ModelMetrics;
+    fit_seconds: number;
+    status: 'running' | 'eliminated';
+  }[];
+}
+
+export interface RuntimeEstimate {
+  executor: 'local' | 'fleet';
+  workers: number;
+  // Model x target cells in the order they would run
+  cells: {
+    index: number;
+    model: string;
+    model_type: string;
+    target: string;
+    predicted_seconds: number;
+    expected_finish_seconds: number;
+  }[];
+  predicted_total_seconds: number;
+  predicted_first_result_seconds: number;
+  predicted_mean_result_seconds: number;
+}
+
 interface ModelConfig {
   name: string;
-  model_type: 'linear_regression' | 'random_forest' | 'knn' | 'svr' | 'xgboost';
-  hyperparameters: LinearRegressionHyperparameters | RandomForestHyperparameters | KNNHyperparameters | SVRHyperparameters | XGBoostHyperparameters;
+  model_type: 'linear_regression' | 'random_forest' | 'knn' | 'svr' | 'xgboost' | 'hist_gradient_boosting';
+  hyperparameters: LinearRegressionHyperparameters | RandomForestHyperparameters | KNNHyperparameters | SVRHyperparameters | XGBoostHyperparameters | HistGradientBoostingHyperparameters;
 }
 
 interface LinearRegressionHyperparameters {
@@ -95,6 +169,20 @@ interface XGBoostHyperparameters {
   colsample_bytree?: number;
 }
 
+interface HistGradientBoostingHyperparameters {
+  max_iter?: number;
+  learning_rate?: number;
+  max_leaf_nodes?: number;
+  max_depth?: number;
+  min_samples_leaf?: number;
+  l2_regularization?: number;
+  max_bins?: number;
+  early_stopping?: 'auto' | boolean;
+  validation_fraction?: number;
+  n_iter_no_change?: number;
+  random_state?: number;
+}
+
 @Injectable({
   providedIn: 'root'
 })
@@ -150,13 +238,29 @@ export class TrainDataService {
     );
   }
 
+  // Streamed server-side export, meant to be used as a download link
+  exportResultsUrl(format: 'csv' | 'ndjson' | 'parquet', predictions = false): string {
+    const query = predictions ? '?predictions=true' : '';
+    return `${this.apiUrl}/results/export/${format}/${query}`;
+  }
+
   // Multi-model training endpoint
-  trainMultipleModels(file: File, models: ModelConfig[], targetColumns: string[]): Observable<any> {
+  trainMultipleModels(file: File, models: ModelConfig[], targetColumns: string[], jobId?: string,
+                      featureSelection?: boolean, quickCompare?: boolean): Observable<any> {
     console.log('Training models with:', { file, models, targetColumns });
     const formData = new FormData();
     formData.append('file', file);
     formData.append('models', JSON.stringify(models));
     formData.append('target_columns', JSON.stringify(targetColumns));
+    if (jobId) {
+      formData.append('job_id', jobId);
+    }
+    if (featureSelection !== undefined) {
+      formData.append('feature_selection', JSON.stringify(featureSelection));
+    }
+    if (quickCompare) {
+      formData.append('quick_compare', 'true');
+    }
 
     return this.http.post(`${this.apiUrl}/train/`, formData).pipe(
       tap(response => console.log('Training response:', response)),
@@ -167,6 +271,50 @@ export class TrainDataService {
     );
   }
 
+  // Predicted runtime of a training grid, learned from earlier fits
+  estimateTraining(file: File, models: ModelConfig[], targetColumns: string[]): Observable<RuntimeEstimate> {
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('models', JSON.stringify(models));
+    formData.append('target_columns', JSON.stringify(targetColumns));
+    return this.http.post<RuntimeEstimate>(`${this.apiUrl}/train/estimate/`, formData).pipe(
+      catchError(this.handleError('estimate training'))
+    );
+  }
+
+  // Stops a running training job; cells that already finished keep their results
+  cancelTraining(jobId: string): Observable<any> {
+    return this.http.post(`${this.apiUrl}/train/${jobId}/cancel/`, {}).pipe(
+      catchError(this.handleError('cancel training'))
+    );
+  }
+
+  // Fire-and-forget cancel that still goes out while the page is unloading
+  cancelTrainingOnUnload(jobId: string): void {
+    navigator.sendBeacon(`${this.apiUrl}/train/${jobId}/cancel/`);
+  }
+
+  // Progress events for a training job, streamed while trainMultipleModels runs
+  trainingEvents(jobId: string): Observable<TrainingEvent> {
+    return new Observable<TrainingEvent>(observer => {
+      const source = new EventSource(`${this.apiUrl}/train/${jobId}/events/`);
+      const eventTypes = ['stage', 'ranking', 'model_started', 'model_stage', 'iteration', 'model_completed', 'model_interrupted', 'completed', 'cancelled', 'failed'];
+      eventTypes.forEach(type => source.addEventListener(type, (message: MessageEvent) => {
+        const event: TrainingEvent = JSON.parse(message.data);
+        observer.next(event);
+        if (event.event === 'completed' || event.event === 'cancelled' || event.event === 'failed') {
+          source.close();
+          observer.complete();
+        }
+      }));
+      source.onerror = () => {
+        source.close();
+        observer.error(new Error('Lost connection to training progress stream'));
+      };
+      return () => source.close();
+    });
+  }
+
   private handleError(operation: string) {
     return (error: any): Observable<never> => {
       console.error(`Error during ${operation}:`, error);